@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+固定容量 PCM 環形緩衝區
+取代無上限的 queue.Queue：預先配置記憶體、讀取端取得 memoryview 不複製，
+並提供溢出策略（丟棄最舊 / 阻塞 / 溢寫到磁碟）與水位、丟幀計數；
+另有多個讀取端共用的 BroadcastBuffer（同一段音頻同時送給多個串流時只保存一份）
+"""
+
+import tempfile
+import threading
+import time
+
+DROP_OLDEST = "drop_oldest"
+BLOCK = "block"
+SPILL = "spill"
+OVERFLOW_POLICIES = (DROP_OLDEST, BLOCK, SPILL)
+
+
+class PCMRingBuffer:
+    """
+    預先配置的 PCM 環形緩衝區
+
+    寫入端（PyAudio 回調）把資料複製進固定的 bytearray；
+    讀取端以 read() 取得指向內部緩衝區的 memoryview。
+    該區段在下一次 read() 或 release() 之前不會被覆寫。
+    """
+
+    def __init__(self, capacity, overflow=DROP_OLDEST, frame_size=2, block_timeout=None, spill_dir=None):
+        if capacity <= 0:
+            raise ValueError("capacity 必須大於 0")
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"未知的溢出策略: {overflow}（可用: {', '.join(OVERFLOW_POLICIES)}）")
+
+        # 容量對齊到整數幀，確保繞回時不會切開樣本
+        self.capacity = max(frame_size, capacity - capacity % frame_size)
+        self.overflow = overflow
+        self.frame_size = frame_size
+        self.block_timeout = block_timeout
+        self.spill_dir = spill_dir
+
+        self._buffer = bytearray(self.capacity)
+        self._view = memoryview(self._buffer)
+        self._read_pos = 0   # 最舊未釋放資料的位置
+        self._size = 0       # 緩衝區中的位元組數（包含讀取端持有的區段）
+        self._leased = 0     # 讀取端目前持有、尚未釋放的位元組數
+        self._closed = False
+        self._cond = threading.Condition()
+
+        # 溢寫檔案：緩衝區滿時依序追加，讀取端釋放空間後再搬回環形緩衝區
+        self._spill = None
+        self._spill_read = 0
+        self._spill_write = 0
+
+        # 統計
+        self.bytes_written = 0
+        self.bytes_read = 0
+        self.dropped_bytes = 0
+        self.spilled_bytes = 0
+        self.high_watermark = 0
+
+    # ---- 狀態 ----
+
+    @property
+    def closed(self):
+        return self._closed
+
+    @property
+    def available(self):
+        """可讀取（尚未被讀取端持有）的位元組數，包含溢寫檔案中的資料"""
+        with self._cond:
+            return self._size - self._leased + self._spill_pending()
+
+    @property
+    def fill_level(self):
+        """緩衝區使用率（0.0 - 1.0）"""
+        with self._cond:
+            return self._size / self.capacity
+
+    @property
+    def dropped_frames(self):
+        return self.dropped_bytes // self.frame_size
+
+    def stats(self):
+        """回傳統計數據"""
+        with self._cond:
+            return {
+                "capacity": self.capacity,
+                "fill_level": self._size / self.capacity,
+                "high_watermark": self.high_watermark / self.capacity,
+                "bytes_written": self.bytes_written,
+                "bytes_read": self.bytes_read,
+                "dropped_bytes": self.dropped_bytes,
+                "dropped_frames": self.dropped_bytes // self.frame_size,
+                "spilled_bytes": self.spilled_bytes,
+                "spill_pending": self._spill_pending(),
+            }
+
+    # ---- 寫入 ----
+
+    def write(self, data):
+        """寫入 PCM 資料，回傳實際寫入（含溢寫）的位元組數"""
+        data = memoryview(data).cast("B")
+        with self._cond:
+            if self._closed:
+                return 0
+            self.bytes_written += len(data)
+
+            # 溢寫檔案還有資料時，新資料必須接在後面以保持順序
+            if self._spill_pending():
+                return self._spill_write_locked(data)
+
+            free = self.capacity - self._size
+            if len(data) > free:
+                if self.overflow == DROP_OLDEST:
+                    self._drop_oldest_locked(len(data) - free)
+                elif self.overflow == BLOCK:
+                    self._wait_for_space_locked(len(data))
+                elif self.overflow == SPILL:
+                    written = self._copy_in_locked(data[:free])
+                    return written + self._spill_write_locked(data[free:])
+
+            free = self.capacity - self._size
+            if len(data) > free:
+                # 讀取端持有的區段不能覆寫：丟棄放不下的最新資料
+                self.dropped_bytes += len(data) - free
+                data = data[:free]
+            return self._copy_in_locked(data)
+
+    def _copy_in_locked(self, data):
+        """把資料複製進環形緩衝區（必要時分兩段繞回）"""
+        n = len(data)
+        if n == 0:
+            return 0
+        start = (self._read_pos + self._size) % self.capacity
+        first = min(n, self.capacity - start)
+        self._view[start:start + first] = data[:first]
+        if first < n:
+            self._view[0:n - first] = data[first:]
+        self._size += n
+        self.high_watermark = max(self.high_watermark, self._size)
+        self._cond.notify_all()
+        return n
+
+    def _drop_oldest_locked(self, needed):
+        """丟棄最舊且未被持有的資料，騰出空間"""
+        droppable = self._size - self._leased
+        drop = min(needed, droppable)
+        if drop <= 0:
+            return
+        # 持有的區段位於最前面，因此從持有區段之後開始丟棄並把剩餘資料往前接
+        keep_start = (self._read_pos + self._leased + drop) % self.capacity
+        remaining = droppable - drop
+        if self._leased:
+            # 把剩下的未讀資料搬到持有區段後面
+            dest = (self._read_pos + self._leased) % self.capacity
+            self._move_locked(keep_start, dest, remaining)
+        else:
+            self._read_pos = keep_start
+        self._size -= drop
+        self.dropped_bytes += drop
+
+    def _move_locked(self, src, dest, length):
+        """在環形緩衝區內搬移資料（src 在 dest 之後，逐段向前搬）"""
+        moved = 0
+        while moved < length:
+            s = (src + moved) % self.capacity
+            d = (dest + moved) % self.capacity
+            step = min(length - moved, self.capacity - s, self.capacity - d)
+            self._view[d:d + step] = self._view[s:s + step]
+            moved += step
+
+    def _wait_for_space_locked(self, needed):
+        """阻塞直到有足夠空間、緩衝區關閉或逾時"""
+        needed = min(needed, self.capacity)
+        deadline = None if self.block_timeout is None else time.monotonic() + self.block_timeout
+        while not self._closed and self.capacity - self._size < needed:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return
+            self._cond.wait(remaining)
+
+    # ---- 溢寫到磁碟 ----
+
+    def _spill_pending(self):
+        return self._spill_write - self._spill_read
+
+    def _spill_write_locked(self, data):
+        if not len(data):
+            return 0
+        if self._spill is None:
+            self._spill = tempfile.TemporaryFile(prefix="pcm_spill_", dir=self.spill_dir)
+        self._spill.seek(self._spill_write)
+        self._spill.write(data)
+        self._spill_write += len(data)
+        self.spilled_bytes += len(data)
+        self._cond.notify_all()
+        return len(data)
+
+    def _refill_from_spill_locked(self):
+        """把溢寫檔案中的資料搬回環形緩衝區的空閒空間"""
+        while self._spill_pending() and self._size < self.capacity:
+            start = (self._read_pos + self._size) % self.capacity
+            length = min(self.capacity - self._size, self.capacity - start, self._spill_pending())
+            self._spill.seek(self._spill_read)
+            n = self._spill.readinto(self._view[start:start + length])
+            if not n:
+                break
+            self._spill_read += n
+            self._size += n
+        if not self._spill_pending() and self._spill is not None:
+            self._spill.seek(0)
+            self._spill.truncate()
+            self._spill_read = self._spill_write = 0
+
+    # ---- 讀取 ----
+
+    def _release_locked(self):
+        if self._leased:
+            self._read_pos = (self._read_pos + self._leased) % self.capacity
+            self._size -= self._leased
+            self._leased = 0
+            if self._spill_pending():
+                self._refill_from_spill_locked()
+            self._cond.notify_all()
+
+    def release(self):
+        """釋放上一次 read() 取得的區段"""
+        with self._cond:
+            self._release_locked()
+
+    def read(self, max_bytes, timeout=None, min_bytes=1):
+        """
+        讀取最多 max_bytes 的連續資料，回傳 memoryview（不複製）
+
+        回傳的區段在下一次 read()/release() 前保持有效。
+        逾時回傳空的 memoryview；緩衝區關閉且已讀完時回傳 None。
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._release_locked()
+            if self._spill_pending():
+                self._refill_from_spill_locked()
+            while self._size < min_bytes and not self._closed:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            if self._size == 0:
+                return None if self._closed else self._view[0:0]
+
+            # 只回傳連續區段，繞回的部分留待下一次讀取
+            length = min(max_bytes, self._size, self.capacity - self._read_pos)
+            self._leased = length
+            self.bytes_read += length
+            return self._view[self._read_pos:self._read_pos + length]
+
+    def chunks(self, max_bytes, timeout=1.0, should_stop=None):
+        """
+        音頻塊生成器 - 逐段產生 memoryview，直到緩衝區關閉或 should_stop() 為真
+        """
+        try:
+            while should_stop is None or not should_stop():
+                chunk = self.read(max_bytes, timeout=timeout)
+                if chunk is None:
+                    return
+                if len(chunk):
+                    yield chunk
+        finally:
+            self.release()
+
+    def close(self):
+        """關閉緩衝區並喚醒等待中的讀寫端"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            if self._spill is not None and not self._spill_pending():
+                self._spill.close()
+                self._spill = None
+
+
+class BroadcastBuffer:
+    """
+    多讀取端共用的音頻塊緩衝區
+
+    寫入端每塊只保存一份（固定數量的槽位循環使用）；每個讀取端有自己的游標，
+    讀到的是同一個 bytes 物件，不為每個讀取端複製。
+    新的讀取端可以從最近幾塊開始（重播）；落後超過容量的讀取端跳到最舊的塊並計入丟棄數。
+    """
+
+    def __init__(self, capacity_chunks):
+        if capacity_chunks <= 0:
+            raise ValueError("capacity_chunks 必須大於 0")
+        self.capacity = capacity_chunks
+        self._slots = [None] * capacity_chunks  # (資料, 錄音時間, 此塊結尾的字節位置)
+        self._end = 0        # 下一塊的編號（已寫入的塊數）
+        self._end_bytes = 0  # 已寫入的字節數
+        self._closed = False
+        self._cond = threading.Condition()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    @property
+    def bytes_written(self):
+        return self._end_bytes
+
+    def append(self, data, captured_at=None):
+        """寫入一塊音頻（bytes，寫入後不可再修改）"""
+        with self._cond:
+            if self._closed:
+                return
+            self._end_bytes += len(data)
+            self._slots[self._end % self.capacity] = (data, captured_at, self._end_bytes)
+            self._end += 1
+            self._cond.notify_all()
+
+    def reader(self, replay_bytes=0):
+        """建立讀取端，從包含最近 replay_bytes 字節的塊開始（0 表示只讀之後寫入的音頻）"""
+        with self._cond:
+            start = self._end
+            oldest = max(self._end - self.capacity, 0)
+            while start > oldest and self._end_bytes - self._start_bytes_locked(start) < replay_bytes:
+                start -= 1
+            return BroadcastReader(self, start, self._start_bytes_locked(start))
+
+    def _start_bytes_locked(self, position):
+        """第 position 塊開頭的字節位置"""
+        if position >= self._end:
+            return self._end_bytes
+        data, _, end_bytes = self._slots[position % self.capacity]
+        return end_bytes - len(data)
+
+    def _read(self, position, timeout):
+        """
+        讀取第 position 塊：回傳 (塊, 實際讀到的編號)；逾時回傳 (None, position)，
+        已關閉且讀完時回傳 (None, None)
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while position >= self._end and not self._closed:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None, position
+                self._cond.wait(remaining)
+            if position >= self._end:
+                return None, None
+            # 已被覆寫：跳到最舊仍保存的塊
+            position = max(position, self._end - self.capacity)
+            return self._slots[position % self.capacity], position
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class BroadcastReader:
+    """BroadcastBuffer 的讀取端：依序產生音頻塊，close() 後停止"""
+
+    def __init__(self, buffer, position, start_bytes):
+        self.buffer = buffer
+        self.position = position
+        self.start_bytes = start_bytes  # 第一塊開頭在整體音頻中的字節位置
+        self.bytes_read = 0
+        self.dropped_chunks = 0
+        self.last_capture_time = None
+        self.closed = False
+
+    def chunks(self, timeout=0.1):
+        """產生 bytes 音頻塊，直到讀取端或緩衝區關閉（緩衝區關閉時先讀完剩餘音頻）"""
+        while not self.closed:
+            chunk, position = self.buffer._read(self.position, timeout)
+            if position is None:
+                return
+            if chunk is None:
+                continue
+            self.dropped_chunks += position - self.position
+            self.position = position + 1
+            data, self.last_capture_time, _ = chunk
+            self.bytes_read += len(data)
+            yield data
+
+    def close(self):
+        self.closed = True
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+音頻來源抽象層
+讓同一條流式管線可以從麥克風、WAV/FLAC 檔案、stdin 原始 PCM 或 TCP/Unix socket 取得音頻，
+方便在沒有麥克風的 Linux 伺服器上執行，或以錄音檔重播做吞吐量測試
+
+所有來源都輸出 16-bit 單聲道 PCM，並以 callback(data) 逐塊送出
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+import wave
+
+RATE = 16000
+CHUNK = int(RATE / 10)  # 100ms
+SAMPLE_WIDTH = 2
+
+
+class AudioSource:
+    """
+    音頻來源基類
+    start(callback, on_end) 開始產生音頻：callback(data) 收到每一塊 PCM，來源結束時呼叫 on_end()
+    """
+
+    # 即時來源（麥克風、socket）無法暫停；非即時來源（檔案）可以被下游背壓
+    live = True
+
+    def __init__(self, rate=RATE, chunk=CHUNK):
+        self.rate = rate
+        self.chunk = chunk
+        self.chunk_bytes = chunk * SAMPLE_WIDTH
+        self.finished = threading.Event()
+        self._stopping = False
+        self._thread = None
+
+    def describe(self):
+        return self.__class__.__name__
+
+    def start(self, callback, on_end=None):
+        """在背景執行緒中讀取音頻"""
+        self._stopping = False
+        self.finished.clear()
+
+        def run():
+            try:
+                self._run(callback)
+            except Exception as e:
+                if not self._stopping:
+                    print(f"\n❌ 音頻來源錯誤 ({self.describe()}): {e}")
+            finally:
+                self.finished.set()
+                if on_end:
+                    on_end()
+
+        self._thread = threading.Thread(target=run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self, callback):
+        raise NotImplementedError
+
+    def stop(self):
+        self._stopping = True
+
+    def wait(self, timeout=None):
+        return self.finished.wait(timeout)
+
+
+class MicrophoneSource(AudioSource):
+    """PyAudio 麥克風來源（使用回調模式）"""
+
+    def __init__(self, rate=RATE, chunk=CHUNK, device_index=None):
+        super().__init__(rate, chunk)
+        self.device_index = device_index
+        self.device_name = None
+        self._audio_interface = None
+        self._stream = None
+        self._on_end = None
+
+    def describe(self):
+        return f"麥克風: {self.device_name or '預設裝置'}"
+
+    @staticmethod
+    def list_devices():
+        """列出可用的輸入裝置 [(index, name, channels)]"""
+        import pyaudio
+        audio_interface = pyaudio.PyAudio()
+        try:
+            devices = []
+            for i in range(audio_interface.get_device_count()):
+                info = audio_interface.get_device_info_by_index(i)
+                if info['maxInputChannels'] > 0:
+                    devices.append((i, info['name'], info['maxInputChannels']))
+            return devices
+        finally:
+            audio_interface.terminate()
+
+    def start(self, callback, on_end=None):
+        import pyaudio
+
+        self._stopping = False
+        self.finished.clear()
+        self._on_end = on_end
+
+        def fill_buffer(in_data, frame_count, time_info, status_flags):
+            callback(in_data)
+            return None, pyaudio.paContinue
+
+        self._audio_interface = pyaudio.PyAudio()
+        try:
+            # open() 會直接開始錄音，不需要再呼叫 start_stream()
+            self._stream = self._audio_interface.open(
+                format=pyaudio.paInt16,
+                channels=1,
+                rate=self.rate,
+                input=True,
+                frames_per_buffer=self.chunk,
+                input_device_index=self.device_index,
+                stream_callback=fill_buffer,
+            )
+            if self.device_index is None:
+                device = self._audio_interface.get_default_input_device_info()
+            else:
+                device = self._audio_interface.get_device_info_by_index(self.device_index)
+            self.device_name = device['name']
+        except Exception:
+            if self._stream:
+                self._stream.close()
+                self._stream = None
+            self._audio_interface.terminate()
+            self._audio_interface = None
+            raise
+
+    def stop(self):
+        self._stopping = True
+        if self._stream:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._stream = None
+        if self._audio_interface:
+            self._audio_interface.terminate()
+            self._audio_interface = None
+        if not self.finished.is_set():
+            self.finished.set()
+            if self._on_end:
+                self._on_end()
+
+
+class FileSource(AudioSource):
+    """
+    WAV / FLAC 檔案來源
+    speed=1.0 以即時速度重播，speed=2.0 為兩倍速，speed=0 則盡可能快地輸出
+    """
+
+    live = False
+
+    def __init__(self, path, rate=RATE, chunk=CHUNK, speed=1.0, loop=False):
+        super().__init__(rate, chunk)
+        self.path = path
+        self.speed = speed
+        self.loop = loop
+
+    def describe(self):
+        pace = "最快速度" if not self.speed else f"{self.speed:g}x 速度"
+        return f"檔案: {os.path.basename(self.path)} ({pace})"
+
+    def frames(self):
+        """逐塊產生檔案中的 16-bit 單聲道 PCM（串流解碼，不一次載入整個檔案）"""
+        if self.path.lower().endswith(".wav"):
+            with wave.open(self.path, "rb") as wav:
+                if wav.getsampwidth() != SAMPLE_WIDTH:
+                    raise ValueError("只支持 16-bit PCM WAV")
+                channels = wav.getnchannels()
+                source_rate = wav.getframerate()
+                frames_per_read = max(1, int(self.chunk * source_rate / self.rate))
+                while True:
+                    data = wav.readframes(frames_per_read)
+                    if not data:
+                        return
+                    yield _to_mono16(data, channels, source_rate, self.rate)
+        else:
+            try:
+                import soundfile
+            except ImportError:
+                raise ImportError("讀取 FLAC 等格式需要安裝 soundfile: pip install soundfile")
+            with soundfile.SoundFile(self.path) as f:
+                frames_per_read = max(1, int(self.chunk * f.samplerate / self.rate))
+                for block in f.blocks(blocksize=frames_per_read, dtype="int16", always_2d=True):
+                    yield _to_mono16(block[:, 0].tobytes(), 1, f.samplerate, self.rate)
+
+    def _run(self, callback):
+        bytes_per_second = self.rate * SAMPLE_WIDTH
+        while True:
+            start = time.monotonic()
+            sent = 0
+            for data in self.frames():
+                if self._stopping:
+                    return
+                callback(data)
+                sent += len(data)
+                if self.speed:
+                    # 依播放速度節流，維持穩定的即時節奏
+                    delay = start + sent / bytes_per_second / self.speed - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+            if not self.loop or self._stopping:
+                return
+
+
+class StdinSource(AudioSource):
+    """
+    標準輸入的原始 PCM（16-bit little-endian 單聲道），例如：
+    arecord -f S16_LE -r 16000 -c 1 -t raw | python realtime_chirp2_fixed.py --source stdin
+    """
+
+    def __init__(self, rate=RATE, chunk=CHUNK, stream=None):
+        super().__init__(rate, chunk)
+        self.stream = stream or sys.stdin.buffer
+
+    def describe(self):
+        return "標準輸入 (raw PCM s16le)"
+
+    def _run(self, callback):
+        while not self._stopping:
+            data = self.stream.read(self.chunk_bytes)
+            if not data:
+                return
+            callback(data)
+
+
+class SocketSource(AudioSource):
+    """
+    TCP / Unix socket 原始 PCM 來源：監聽並接受一個連線，讀取 16-bit 單聲道 PCM
+    位址格式：tcp://0.0.0.0:9000 或 unix:///tmp/audio.sock
+    """
+
+    def __init__(self, address, rate=RATE, chunk=CHUNK):
+        super().__init__(rate, chunk)
+        self.address = address
+        self._server = None
+        self._conn = None
+
+    def describe(self):
+        return f"Socket: {self.address}"
+
+    def _listen(self):
+        if self.address.startswith("unix://"):
+            path = self.address[len("unix://"):]
+            if os.path.exists(path):
+                os.unlink(path)
+            server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            server.bind(path)
+        elif self.address.startswith("tcp://"):
+            host, _, port = self.address[len("tcp://"):].rpartition(":")
+            server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            server.bind((host or "0.0.0.0", int(port)))
+        else:
+            raise ValueError(f"不支持的 socket 位址: {self.address}")
+        server.listen(1)
+        return server
+
+    def _run(self, callback):
+        self._server = self._listen()
+        print(f"🔌 等待音頻連線: {self.address}")
+        self._conn, peer = self._server.accept()
+        print(f"✅ 音頻連線來自: {peer or 'unix socket'}")
+        with self._conn:
+            # 固定大小讀取，避免把樣本切成兩半
+            pending = b""
+            while not self._stopping:
+                data = self._conn.recv(self.chunk_bytes)
+                if not data:
+                    break
+                pending += data
+                usable = len(pending) - len(pending) % SAMPLE_WIDTH
+                if usable:
+                    callback(pending[:usable])
+                    pending = pending[usable:]
+
+    def stop(self):
+        super().stop()
+        for sock in (self._conn, self._server):
+            if sock is not None:
+                try:
+                    sock.close()
+                except OSError:
+                    pass
+
+
+def _to_mono16(data, channels, source_rate, target_rate):
+    """轉成單聲道並重新取樣到目標採樣率（線性插值）"""
+    if channels == 1 and source_rate == target_rate:
+        return data
+
+    import numpy as np
+
+    samples = np.frombuffer(data, dtype=np.int16)
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    if source_rate != target_rate and len(samples):
+        target_len = max(1, int(round(len(samples) * target_rate / source_rate)))
+        positions = np.linspace(0, len(samples) - 1, target_len)
+        samples = np.interp(positions, np.arange(len(samples)), samples)
+    return samples.astype(np.int16).tobytes()
+
+
+def open_source(spec="mic", rate=RATE, chunk=CHUNK, speed=1.0, loop=False):
+    """
+    依描述字串建立音頻來源：
+      mic / mic:<裝置編號>       麥克風
+      <路徑>.wav / .flac         檔案（speed 控制重播速度）
+      - / stdin                  標準輸入原始 PCM
+      tcp://host:port            TCP socket
+      unix:///path/to.sock       Unix socket
+    """
+    if spec in (None, "", "mic"):
+        return MicrophoneSource(rate, chunk)
+    if spec.startswith("mic:"):
+        return MicrophoneSource(rate, chunk, device_index=int(spec[len("mic:"):]))
+    if spec in ("-", "stdin"):
+        return StdinSource(rate, chunk)
+    if spec.startswith(("tcp://", "unix://")):
+        return SocketSource(spec, rate, chunk)
+    if os.path.exists(spec):
+        return FileSource(spec, rate, chunk, speed=speed, loop=loop)
+    raise ValueError(f"無法識別的音頻來源: {spec}")
+
+
+def add_source_arguments(parser):
+    """為命令列加入音頻來源參數"""
+    parser.add_argument("--source", default="mic",
+                        help="音頻來源: mic、mic:<編號>、檔案路徑、stdin、tcp://host:port、unix:///path")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="檔案重播速度（1 = 即時，0 = 盡可能快）")
+    parser.add_argument("--loop", action="store_true", help="檔案播放完後從頭重播")
+    return parser
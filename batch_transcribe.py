@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+批次檔案轉錄
+以 chirp_transcribe 的 recognize 請求平行轉錄整個目錄或清單中的音頻檔：
+- 共用一個 SpeechClient，以固定大小的工作池同時送出請求，並以令牌桶限制每秒請求數
+- 暫時性錯誤（UNAVAILABLE、DEADLINE_EXCEEDED 等）以指數退避重試；RESOURCE_EXHAUSTED 只在配額或速率限制時重試
+- 超過同步 recognize 上限（約 60 秒音頻、10 MB）的檔案不送出請求，直接記為失敗並建議改用 long_transcribe.py
+- 每完成一個檔案就寫入一行 JSONL；輸出檔同時是檢查點，中斷後以相同輸出檔重新執行即可從中斷處繼續
+
+    python batch_transcribe.py recordings/ -o transcripts.jsonl --workers 8 --rate 5
+    python batch_transcribe.py --manifest files.txt -o transcripts.jsonl --language auto
+"""
+
+import argparse
+import json
+import os
+import random
+import threading
+import time
+import wave
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from google.api_core import exceptions as api_exceptions
+
+from chirp_transcribe import build_recognize_request
+from speech_connection import DEFAULT_REGION, get_speech_client
+
+AUDIO_EXTENSIONS = (".wav", ".flac", ".mp3", ".m4a", ".ogg", ".opus", ".webm", ".aac")
+DEFAULT_WORKERS = 4
+DEFAULT_RATE = 5.0  # 每秒請求數上限
+MAX_RETRIES = 5
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 32.0
+MAX_SYNC_AUDIO_SECONDS = 60          # 同步 recognize 的音頻長度上限
+MAX_SYNC_BYTES = 10 * 1024 * 1024    # 同步 recognize 的內嵌音頻大小上限
+
+# 可重試的暫時性錯誤
+TRANSIENT_ERRORS = (
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.DeadlineExceeded,
+    api_exceptions.InternalServerError,
+    api_exceptions.Aborted,
+)
+# RESOURCE_EXHAUSTED 同時用於配額 / 速率限制與酬載、時長超過上限；只有前者重試才有意義
+QUOTA_ERRORS = (api_exceptions.TooManyRequests, api_exceptions.ResourceExhausted)
+QUOTA_HINTS = ("quota", "rate limit", "rate exceeded", "too many requests")
+
+
+class RateLimiter:
+    """令牌桶限速器（執行緒安全）：平均每秒 rate 個請求，最多累積 burst 個"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_seconds = (1 - self._tokens) / self.rate
+            time.sleep(wait_seconds)
+
+
+def retry_info_delay(error):
+    """錯誤詳情中 RetryInfo 建議的等待秒數；沒有時回傳 None"""
+    for detail in getattr(error, "details", None) or []:
+        if type(detail).__name__ == "RetryInfo":
+            delay = detail.retry_delay
+            return delay.seconds + delay.nanos / 1e9
+    return None
+
+
+def is_transient(error):
+    """是否值得重試：暫時性錯誤，或配額 / 速率限制造成的 RESOURCE_EXHAUSTED"""
+    if isinstance(error, TRANSIENT_ERRORS):
+        return True
+    if isinstance(error, QUOTA_ERRORS):
+        if retry_info_delay(error) is not None:
+            return True
+        if any(type(detail).__name__ == "QuotaFailure" for detail in getattr(error, "details", None) or []):
+            return True
+        message = str(error).lower()
+        return any(hint in message for hint in QUOTA_HINTS)
+    return False
+
+
+def audio_duration(path):
+    """音頻長度（秒）；WAV 讀標頭，其他格式有 soundfile 時讀取，無法判斷時回傳 None"""
+    if path.lower().endswith(".wav"):
+        try:
+            with wave.open(path, "rb") as wav:
+                return wav.getnframes() / wav.getframerate()
+        except (wave.Error, EOFError):
+            return None
+    try:
+        import soundfile
+        return soundfile.info(path).duration
+    except Exception:
+        return None
+
+
+def check_sync_limits(path):
+    """檢查檔案是否在同步 recognize 的上限內；超過時回傳錯誤訊息"""
+    size = os.path.getsize(path)
+    if size > MAX_SYNC_BYTES:
+        return f"檔案 {size / 1024 / 1024:.1f} MB 超過同步識別上限 {MAX_SYNC_BYTES // 1024 // 1024} MB，請改用 long_transcribe.py"
+    duration = audio_duration(path)
+    if duration is not None and duration > MAX_SYNC_AUDIO_SECONDS:
+        return f"音頻 {duration:.0f} 秒超過同步識別上限 {MAX_SYNC_AUDIO_SECONDS} 秒，請改用 long_transcribe.py"
+    return None
+
+
+def find_audio_files(directory):
+    """遞迴列出目錄中的音頻檔（排序後回傳，確保每次執行順序相同）"""
+    files = []
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if name.lower().endswith(AUDIO_EXTENSIONS):
+                files.append(os.path.join(root, name))
+    return sorted(files)
+
+
+def read_manifest(path):
+    """
+    讀取清單：每行一個路徑，或 JSONL（{"path": ..., "language": ...}）
+    回傳 [(路徑, 語言或 None)]
+    """
+    entries = []
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                item = json.loads(line)
+                audio_path, language = item["path"], item.get("language")
+            else:
+                audio_path, language = line, None
+            if not os.path.isabs(audio_path):
+                audio_path = os.path.join(base, audio_path)
+            entries.append((audio_path, language))
+    return entries
+
+
+def load_checkpoint(output_path):
+    """讀取已完成的檔案（輸出檔中 status 為 ok 的路徑）"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # 中斷時寫到一半的最後一行
+                continue
+            if record.get("status") == "ok":
+                done.add(record["path"])
+    return done
+
+
+def recognize_with_retries(client, make_request, limiter, max_retries=MAX_RETRIES, timeout=120):
+    """
+    送出 recognize 請求，暫時性錯誤以指數退避重試（伺服器以 RetryInfo 建議等待時間時至少等那麼久）
+    make_request() 在每次嘗試前才建立請求（讀檔等工作延到真正需要時）
+    回傳 (response, 嘗試次數)；重試用盡或非暫時性錯誤時拋出例外，嘗試次數記在 e.attempts
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            request = make_request()
+            limiter.acquire()
+            return client.recognize(request=request, timeout=timeout), attempt
+        except Exception as e:
+            if not is_transient(e) or attempt > max_retries:
+                e.attempts = attempt
+                raise
+            # 指數退避 + 隨機抖動，避免所有工作同時重試
+            delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempt - 1))
+            time.sleep(max(delay * random.uniform(0.5, 1.0), retry_info_delay(e) or 0))
+
+
+def transcribe_file(client, path, language, args, limiter):
+    """轉錄單一檔案（含重試），回傳 JSONL 記錄"""
+    started = time.time()
+    record = {"path": path, "language": language}
+
+    def make_request():
+        # 每次請求前才讀檔，工作池大小即為同時佔用記憶體的檔案數
+        with open(path, "rb") as f:
+            return build_recognize_request(f.read(), [language], model=args.model, region=args.region)
+
+    try:
+        error = check_sync_limits(path)
+    except OSError as e:
+        error = f"{type(e).__name__}: {e}"
+    if error:
+        # 送出也只會被拒絕：不佔用請求名額，直接記為失敗
+        record.update(status="error", error=error, attempts=0, elapsed_ms=round((time.time() - started) * 1000))
+        return record
+
+    try:
+        response, attempt = recognize_with_retries(client, make_request, limiter, args.max_retries, args.timeout)
+    except Exception as e:
+        record.update(status="error", error=f"{type(e).__name__}: {e}")
+        record.update(attempts=getattr(e, "attempts", 1), elapsed_ms=round((time.time() - started) * 1000))
+        return record
+
+    results = []
+    for result in response.results:
+        if not result.alternatives:
+            continue
+        alternative = result.alternatives[0]
+        results.append({
+            "transcript": alternative.transcript,
+            "confidence": round(alternative.confidence, 4),
+            "language_code": result.language_code,
+            "end_offset": result.result_end_offset.total_seconds() if result.result_end_offset else None,
+        })
+    record.update(
+        status="ok",
+        transcript=" ".join(r["transcript"].strip() for r in results).strip(),
+        results=results,
+        attempts=attempt,
+        elapsed_ms=round((time.time() - started) * 1000),
+    )
+    return record
+
+
+def run_batch(entries, args):
+    """平行轉錄並把結果逐行寫入輸出檔，回傳統計"""
+    done = load_checkpoint(args.output) if args.resume else set()
+    pending = [(path, language or args.language) for path, language in entries if path not in done]
+    stats = {"total": len(entries), "skipped": len(entries) - len(pending), "ok": 0, "error": 0, "retries": 0}
+
+    print(f"📂 共 {len(entries)} 個檔案，已完成 {stats['skipped']} 個，待處理 {len(pending)} 個")
+    print(f"⚙️ 工作數 {args.workers}，速率上限 {args.rate:g} 請求/秒，最多重試 {args.max_retries} 次")
+    if not pending:
+        return stats
+
+    client = get_speech_client(args.region)
+    limiter = RateLimiter(args.rate)
+    started = time.time()
+    mode = "a" if args.resume else "w"
+
+    with open(args.output, mode, encoding="utf-8") as output, \
+            ThreadPoolExecutor(max_workers=args.workers) as pool:
+        items = iter(pending)
+        in_flight = set()
+        try:
+            while True:
+                # 只預先提交有限數量的工作，檔案再多也不會一次建立全部 future
+                while len(in_flight) < args.workers * 2:
+                    item = next(items, None)
+                    if item is None:
+                        break
+                    in_flight.add(pool.submit(transcribe_file, client, item[0], item[1], args, limiter))
+                if not in_flight:
+                    break
+
+                completed, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in completed:
+                    record = future.result()
+                    output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    output.flush()
+                    stats[record["status"]] += 1
+                    stats["retries"] += max(0, record["attempts"] - 1)
+                    finished = stats["ok"] + stats["error"]
+                    icon = "✅" if record["status"] == "ok" else "❌"
+                    print(f"{icon} [{finished}/{len(pending)}] {os.path.basename(record['path'])} "
+                          f"({record['elapsed_ms']} ms){'' if record['status'] == 'ok' else ' ' + record['error']}")
+        except KeyboardInterrupt:
+            print("\n⏹️ 中斷：等待進行中的請求完成後停止...")
+            for future in in_flight:
+                future.cancel()
+            for future in in_flight:
+                if not future.cancelled():
+                    record = future.result()
+                    output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    stats[record["status"]] += 1
+            output.flush()
+            stats["interrupted"] = True
+
+    stats["elapsed"] = time.time() - started
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批次平行轉錄音頻檔")
+    parser.add_argument("inputs", nargs="*", help="音頻檔或目錄")
+    parser.add_argument("--manifest", help="清單檔：每行一個路徑，或 JSONL {\"path\", \"language\"}")
+    parser.add_argument("-o", "--output", default="transcripts.jsonl", help="輸出 JSONL（同時作為檢查點）")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="每秒請求數上限（0 表示不限制）")
+    parser.add_argument("--max-retries", type=int, default=MAX_RETRIES)
+    parser.add_argument("--timeout", type=float, default=120, help="單一請求逾時（秒）")
+    parser.add_argument("--language", default="en-US", help="語言代碼，auto 表示自動檢測")
+    parser.add_argument("--model", default="chirp")
+    parser.add_argument("--region", default=DEFAULT_REGION)
+    parser.add_argument("--no-resume", dest="resume", action="store_false", help="忽略檢查點並覆寫輸出檔")
+    args = parser.parse_args()
+
+    if not os.getenv("GOOGLE_CLOUD_PROJECT"):
+        print("❌ 錯誤: 請設置 GOOGLE_CLOUD_PROJECT 環境變量")
+        return
+
+    entries = []
+    if args.manifest:
+        entries.extend(read_manifest(args.manifest))
+    for path in args.inputs:
+        if os.path.isdir(path):
+            entries.extend((p, None) for p in find_audio_files(path))
+        else:
+            entries.append((path, None))
+    if not entries:
+        parser.error("請提供音頻檔、目錄或 --manifest")
+
+    # 去除重複的路徑（保留第一次出現的語言設定）
+    seen = set()
+    entries = [(os.path.abspath(p), lang) for p, lang in entries]
+    entries = [e for e in entries if not (e[0] in seen or seen.add(e[0]))]
+
+    print("🎯 Chirp 批次轉錄")
+    print("=" * 60)
+    stats = run_batch(entries, args)
+    print("=" * 60)
+    elapsed = stats.get("elapsed")
+    rate = f"，{(stats['ok'] + stats['error']) / elapsed:.2f} 檔/秒" if elapsed else ""
+    print(f"📊 成功 {stats['ok']}，失敗 {stats['error']}，略過 {stats['skipped']}，重試 {stats['retries']} 次{rate}")
+    print(f"📝 結果: {args.output}")
+    if stats.get("interrupted") or stats["error"]:
+        print("💡 以相同的 --output 重新執行即可繼續處理未完成或失敗的檔案")
+
+
+if __name__ == "__main__":
+    main()
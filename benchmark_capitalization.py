@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+大小寫修正效能測試
+比較舊版逐詞 re.sub 與已編譯單次掃描引擎在 100 / 1k / 10k 詞彙下的每個最終結果延遲
+"""
+
+import argparse
+import json
+import random
+import re
+import string
+import time
+
+from capitalization import PhraseCorrector
+
+SAMPLE_TRANSCRIPT = (
+    "today at hon hai tech day 2024 terry gou and the nvidia team talked about "
+    "machine learning on kubernetes, ge vernova and autocore.ai joined the panel "
+    "while bmw i ventures explained how openai and chatgpt change the saas roi story"
+)
+
+
+def legacy_fix_capitalization(text, custom_phrases):
+    """舊版實作：每個詞彙各自建立正則並掃描整段文字（僅供比較）"""
+    result = text
+    for phrase in custom_phrases:
+        words = phrase.split()
+        if len(words) == 1:
+            pattern = r'\b' + re.escape(phrase.lower()) + r'\b'
+        else:
+            pattern = r'\b' + r'\s+'.join(re.escape(word.lower()) for word in words) + r'\b'
+        result = re.sub(pattern, lambda match: phrase, result, flags=re.IGNORECASE)
+    return result
+
+
+def load_base_phrases(path="custom_vocabulary.json"):
+    """載入現有詞彙作為測試基礎"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return list(json.load(f).get("phrases", []))
+    except (OSError, ValueError):
+        return []
+
+
+def build_vocabulary(size, base_phrases, rng):
+    """以現有詞彙為基礎，補上隨機產生的詞彙直到指定數量"""
+    phrases = list(base_phrases[:size])
+    while len(phrases) < size:
+        words = [
+            "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9))).capitalize()
+            for _ in range(rng.randint(1, 3))
+        ]
+        phrases.append(" ".join(words))
+    return phrases
+
+
+def time_per_call(func, iterations):
+    """回傳每次呼叫的平均耗時（毫秒）"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) * 1000 / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="大小寫修正效能測試")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--skip-legacy", action="store_true", help="略過舊版實作（10k 詞彙時很慢）")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    base_phrases = load_base_phrases()
+
+    print("🔤 大小寫修正效能測試")
+    print("=" * 72)
+    print(f"{'詞彙數':>8} {'編譯(ms)':>10} {'新版/次(ms)':>12} {'舊版/次(ms)':>12} {'加速':>8}")
+    print("-" * 72)
+
+    for size in args.sizes:
+        phrases = build_vocabulary(size, base_phrases, rng)
+
+        start = time.perf_counter()
+        corrector = PhraseCorrector(phrases)
+        compile_ms = (time.perf_counter() - start) * 1000
+
+        compiled_ms = time_per_call(lambda: corrector.fix(SAMPLE_TRANSCRIPT), args.iterations)
+
+        if args.skip_legacy:
+            print(f"{size:>8} {compile_ms:>10.2f} {compiled_ms:>12.4f} {'-':>12} {'-':>8}")
+            continue
+
+        legacy_iterations = max(1, args.iterations * 100 // size)
+        legacy_ms = time_per_call(
+            lambda: legacy_fix_capitalization(SAMPLE_TRANSCRIPT, phrases), legacy_iterations
+        )
+        speedup = legacy_ms / compiled_ms if compiled_ms else float("inf")
+        print(f"{size:>8} {compile_ms:>10.2f} {compiled_ms:>12.4f} {legacy_ms:>12.4f} {speedup:>7.0f}x")
+
+    print("=" * 72)
+    print(f"📝 範例輸出: {PhraseCorrector(base_phrases).fix(SAMPLE_TRANSCRIPT)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+終端顯示效能測試
+以模擬的中間結果串流（逐字增長、偶爾改寫結尾）比較舊版整行 \\r 重寫與 TerminalRenderer 增量顯示的
+每次更新輸出字節數與耗時；輸出寫入計數用的假終端，不影響螢幕
+"""
+
+import argparse
+import random
+import time
+
+from terminal_renderer import TerminalRenderer, display_width
+
+SAMPLE_WORDS = (
+    "today at hon hai tech day terry gou and the nvidia team talked about machine learning on "
+    "kubernetes while bmw i ventures explained how openai and chatgpt change the saas roi story"
+).split()
+SAMPLE_CHINESE = "今天的會議討論了供應鏈與電動車的發展計畫".split()
+
+
+class CountingStream:
+    """只計算寫入量的假終端"""
+
+    def __init__(self):
+        self.bytes = 0
+        self.writes = 0
+
+    def write(self, data):
+        self.bytes += len(data.encode("utf-8"))
+        self.writes += 1
+
+    def flush(self):
+        pass
+
+
+def build_updates(utterances, words_per_utterance, chinese, rng):
+    """產生 (是否最終, 文字) 序列：每個單詞出現一次中間結果，20% 機率改寫最後一個單詞"""
+    updates = []
+    vocabulary = SAMPLE_WORDS + (list("".join(SAMPLE_CHINESE)) if chinese else [])
+    for _ in range(utterances):
+        words = []
+        for _ in range(words_per_utterance):
+            words.append(rng.choice(vocabulary))
+            updates.append((False, " ".join(words)))
+            if rng.random() < 0.2:
+                words[-1] = rng.choice(vocabulary)
+                updates.append((False, " ".join(words)))
+        updates.append((True, " ".join(words)))
+    return updates
+
+
+def legacy_render(stream, updates):
+    """舊版：每次以 \\r 重寫整行，再以 len() 計算的空白覆蓋剩餘部分"""
+    last_length = 0
+    for is_final, text in updates:
+        clear_chars = max(0, last_length - len(text) - 3)
+        if is_final:
+            stream.write(f"\r✅ \033[92m{text}\033[0m{' ' * clear_chars}\n")
+            last_length = 0
+        else:
+            stream.write(f"\r🔘 \033[90m{text}\033[0m{' ' * clear_chars}")
+            stream.flush()
+            last_length = len(text) + 3
+
+
+def incremental_render(stream, updates, max_fps, columns):
+    renderer = TerminalRenderer(stream, max_fps=max_fps, columns=columns)
+    for is_final, text in updates:
+        if is_final:
+            renderer.final(text)
+        else:
+            renderer.interim(text)
+    return renderer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="終端顯示效能測試")
+    parser.add_argument("--utterances", type=int, default=200)
+    parser.add_argument("--words", type=int, default=40, help="每句單詞數")
+    parser.add_argument("--columns", type=int, default=120, help="模擬的終端寬度")
+    parser.add_argument("--fps", type=float, default=30, help="增量顯示的重繪上限（0 表示不限制）")
+    parser.add_argument("--chinese", action="store_true", help="混入中文字，檢查寬度計算")
+    args = parser.parse_args()
+
+    updates = build_updates(args.utterances, args.words, args.chinese, random.Random(42))
+    interim_count = sum(1 for is_final, _ in updates if not is_final)
+
+    print("🖥️ 終端顯示效能測試")
+    print(f"   {len(updates)} 次更新（中間結果 {interim_count} 次），每句 {args.words} 個單詞，終端寬度 {args.columns}")
+    print("=" * 72)
+    print(f"{'方式':<16}{'輸出(KB)':>10}{'字節/次':>10}{'寫入次數':>10}{'微秒/次':>10}")
+    print("-" * 72)
+
+    rows = []
+    stream = CountingStream()
+    start = time.perf_counter()
+    legacy_render(stream, updates)
+    rows.append(("整行重寫", stream, time.perf_counter() - start))
+
+    modes = [("增量（不限速）", 0)]
+    if args.fps:
+        # 更新連續到達（例如快速重播），限速時大部分中間結果只記錄不重繪
+        modes.append((f"增量（{args.fps:g} fps）", args.fps))
+    for label, fps in modes:
+        stream = CountingStream()
+        start = time.perf_counter()
+        renderer = incremental_render(stream, updates, fps, args.columns)
+        rows.append((label, stream, time.perf_counter() - start))
+
+    for label, stream, elapsed in rows:
+        print(f"{label:<16}{stream.bytes / 1024:>10.1f}{stream.bytes / len(updates):>10.1f}"
+              f"{stream.writes:>10}{elapsed * 1e6 / len(updates):>10.1f}")
+
+    print("=" * 72)
+    print(f"📊 {renderer.report()}")
+    longest = max(display_width(text) for _, text in updates)
+    print(f"💡 最長的中間結果顯示寬度 {longest}；舊版在超過終端寬度後會換行，\\r 只能回到最後一行，前面的內容殘留在畫面上")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+流式識別效能測試
+啟動本地模擬伺服器（fake_speech_server.py），以合成語音同時驅動多個串流，
+量測現有入口的端到端中間 / 最終結果延遲、重新連接間隔與每個串流的 CPU 使用量
+
+    python benchmark_streaming.py --entry continuous --streams 4 --duration 60 --max-stream-seconds 20
+    python benchmark_streaming.py --entry fixed --streams 8 --latency-ms 100 --jitter-ms 80
+    python benchmark_streaming.py --entry batch --streams 16 --duration 30
+
+延遲從音頻被擷取的時間點起算（包含緩衝區、VAD、佇列與網路），到客戶端收到對應結果為止
+"""
+
+import argparse
+import bisect
+import contextlib
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import wave
+
+import numpy as np
+
+from audio_sources import AudioSource, FileSource
+from fake_speech_server import add_server_arguments, options_from_args, serve
+from speech_connection import EMULATOR_HOST_ENV
+
+RATE = 16000
+CHUNK = int(RATE / 10)  # 100ms
+BYTES_PER_SECOND = RATE * 2
+ENTRIES = ("continuous", "fixed", "batch")
+
+
+class SyntheticSpeechSource(AudioSource):
+    """
+    合成語音來源：0.6 秒諧波音 + 0.3 秒低雜訊交替
+    停頓短於 VAD hangover，因此所有音頻都會被上傳，擷取時間軸與伺服器端偏移一致
+    """
+
+    live = False
+
+    def __init__(self, duration, rate=RATE, chunk=CHUNK, speed=1.0, seed=0):
+        super().__init__(rate, chunk)
+        self.duration = duration
+        self.speed = speed
+        self.seed = seed
+
+    def describe(self):
+        return f"合成語音 ({self.duration:.0f} 秒)"
+
+    def samples(self, start, count):
+        t = (start + np.arange(count)) / self.rate
+        rng = np.random.default_rng(self.seed + start)
+        noise = rng.normal(0, 30, count)
+        voiced = ((t % 0.9) < 0.6) & (t >= 0.2)
+        tone = 6000 * np.sin(2 * np.pi * 180 * t) + 2000 * np.sin(2 * np.pi * 360 * t)
+        return np.where(voiced, tone + noise, noise).astype(np.int16)
+
+    def _run(self, callback):
+        total = int(self.duration * self.rate)
+        start = time.monotonic()
+        position = 0
+        while position < total and not self._stopping:
+            count = min(self.chunk, total - position)
+            callback(self.samples(position, count).tobytes())
+            position += count
+            if self.speed:
+                delay = start + position / self.rate / self.speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+
+class TimedSource:
+    """包裝音頻來源，記錄每一塊音頻被擷取的時間（用來換算端到端延遲）"""
+
+    def __init__(self, source):
+        self.source = source
+        self._ends = []    # 累計位元組數
+        self._times = []   # 對應的擷取時間
+        self._total = 0
+
+    def __getattr__(self, name):
+        return getattr(self.source, name)
+
+    def start(self, callback, on_end=None):
+        def timed(data):
+            self._total += len(data)
+            self._ends.append(self._total)
+            self._times.append(time.time())
+            callback(data)
+        self.source.start(timed, on_end=on_end)
+
+    @property
+    def captured_seconds(self):
+        return self._total / BYTES_PER_SECOND
+
+    def capture_time(self, seconds):
+        """音頻時間軸上 seconds 處的樣本被擷取的時間"""
+        index = bisect.bisect_left(self._ends, int(seconds * BYTES_PER_SECOND))
+        if not self._times:
+            return None
+        return self._times[min(index, len(self._times) - 1)]
+
+
+class StreamProbe:
+    """攔截響應迭代器，記錄每個結果的延遲與接收時間"""
+
+    def __init__(self, source):
+        self.source = source
+        self.interim_ms = []
+        self.final_ms = []
+        self.received = []
+        self.sessions = 0
+
+    def tap(self, responses, audio_start=0.0):
+        self.sessions += 1
+        for response in responses:
+            now = time.time()
+            self.received.append(now)
+            for result in response.results:
+                if not result.alternatives:
+                    continue
+                offset = result.result_end_offset
+                seconds = offset.total_seconds() if hasattr(offset, "total_seconds") else 0.0
+                captured = self.source.capture_time(audio_start + seconds)
+                if captured is None:
+                    continue
+                latency = (now - captured) * 1000
+                (self.final_ms if result.is_final else self.interim_ms).append(latency)
+            yield response
+
+    @property
+    def longest_gap_ms(self):
+        """相鄰兩個響應之間最長的間隔（重新連接時的空窗）"""
+        gaps = [b - a for a, b in zip(self.received, self.received[1:])]
+        return max(gaps) * 1000 if gaps else 0.0
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def _fmt(value, width=8):
+    return f"{value:>{width}.0f}" if value is not None else f"{'-':>{width}}"
+
+
+# ---- 各入口的驅動 ----
+
+def run_continuous(index, args, result):
+    import realtime_chirp2_continuous as continuous
+
+    # 模擬伺服器的串流上限較短時，依比例提前輪替會話與預熱（預熱的呼叫也佔用串流時長）
+    continuous.SESSION_ROLLOVER_SECONDS = min(280, args.max_stream_seconds * 0.9)
+    continuous.PREWARM_LEAD_SECONDS = min(5, args.max_stream_seconds * 0.05)
+    source = TimedSource(make_source(args, index))
+    probe = StreamProbe(source)
+    transcriber = continuous.ContinuousTranscriber(source=source)
+    transcriber._show_final = lambda text: None
+    transcriber._show_interim = lambda text: None
+    process_responses = transcriber.process_responses
+    transcriber.process_responses = lambda responses, session: process_responses(
+        probe.tap(responses, session.audio_start), session)
+
+    transcriber.start_continuous_transcription()
+    result["probe"] = probe
+    result["audio_seconds"] = source.captured_seconds
+    result["handoff_ms"] = list(transcriber.handoff_latencies)
+
+
+_fixed_probes = threading.local()
+
+
+def run_fixed(index, args, result):
+    import realtime_chirp2_fixed as fixed
+
+    if not hasattr(fixed, "_original_listen_print_loop"):
+        fixed._original_listen_print_loop = fixed.listen_print_loop
+        fixed.listen_print_loop = lambda responses: fixed._original_listen_print_loop(
+            _fixed_probes.probe.tap(responses))
+
+    source = TimedSource(make_source(args, index))
+    probe = StreamProbe(source)
+    _fixed_probes.probe = probe
+    fixed.transcribe_streaming_v2(source=source)
+    result["probe"] = probe
+    result["audio_seconds"] = source.captured_seconds
+    result["handoff_ms"] = []
+
+
+def run_batch(index, args, result):
+    import chirp_transcribe
+
+    path = args.batch_file
+    started = time.time()
+    chirp_transcribe.transcribe_chirp(path)
+    with wave.open(path, "rb") as wav:
+        result["audio_seconds"] = wav.getnframes() / wav.getframerate()
+    result["request_ms"] = (time.time() - started) * 1000
+
+
+RUNNERS = {
+    "continuous": run_continuous,
+    "fixed": run_fixed,
+    "batch": run_batch,
+}
+
+
+def make_source(args, index):
+    if args.audio:
+        return FileSource(args.audio, RATE, CHUNK, speed=args.speed)
+    return SyntheticSpeechSource(args.duration, RATE, CHUNK, speed=args.speed, seed=index)
+
+
+def write_synthetic_wav(duration):
+    """批次識別用的合成 WAV 檔"""
+    source = SyntheticSpeechSource(duration)
+    fd, path = tempfile.mkstemp(suffix=".wav", prefix="bench_")
+    os.close(fd)
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(RATE)
+        wav.writeframes(source.samples(0, int(duration * RATE)).tobytes())
+    return path
+
+
+# ---- 伺服器 ----
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+def start_server(args):
+    """回傳 (位址, 清理函數)；預設在子行程中執行，避免伺服器的 CPU 算進客戶端"""
+    if args.server:
+        return args.server, lambda: None
+
+    if args.in_process:
+        server, _, port = serve(0, options_from_args(args))
+        return f"localhost:{port}", lambda: server.stop(grace=0)
+
+    port = _free_port()
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_speech_server.py"),
+               "--port", str(port)]
+    for name in ("words_per_second", "interim_interval", "utterance_seconds", "latency_ms",
+                 "final_latency_ms", "jitter_ms", "error_rate", "max_stream_seconds", "seed", "script"):
+        value = getattr(args, name)
+        if value is not None:
+            command += ["--" + name.replace("_", "-"), str(value)]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+
+    def stop():
+        process.terminate()
+        process.wait(timeout=5)
+
+    return f"localhost:{port}", stop
+
+
+def wait_for_server(address, timeout=10):
+    import grpc
+    channel = grpc.insecure_channel(address)
+    try:
+        grpc.channel_ready_future(channel).result(timeout=timeout)
+    finally:
+        channel.close()
+
+
+# ---- 報告 ----
+
+def report(args, results, wall, cpu):
+    streams = len(results)
+    audio_seconds = sum(r.get("audio_seconds", 0.0) for r in results)
+    errors = [r["error"] for r in results if r.get("error")]
+
+    print(f"\n📊 入口: {args.entry}，{streams} 個串流，總音頻 {audio_seconds:.1f} 秒，耗時 {wall:.1f} 秒")
+    print("=" * 72)
+
+    if args.entry == "batch":
+        request_ms = [r["request_ms"] for r in results if "request_ms" in r]
+        print(f"{'請求延遲(ms)':<18} p50 {_fmt(percentile(request_ms, 50))}  "
+              f"p95 {_fmt(percentile(request_ms, 95))}  最大 {_fmt(max(request_ms) if request_ms else None)}")
+    else:
+        probes = [r["probe"] for r in results if "probe" in r]
+        interim = [v for p in probes for v in p.interim_ms]
+        final = [v for p in probes for v in p.final_ms]
+        handoff = [v for r in results for v in r.get("handoff_ms", [])]
+        reconnects = sum(max(0, p.sessions - 1) for p in probes)
+        longest_gap = max((p.longest_gap_ms for p in probes), default=0.0)
+
+        print(f"{'':<18} {'次數':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'最大':>8}")
+        for label, values in (("中間結果延遲(ms)", interim), ("最終結果延遲(ms)", final)):
+            print(f"{label:<18} {len(values):>6} {_fmt(percentile(values, 50))} {_fmt(percentile(values, 95))} "
+                  f"{_fmt(percentile(values, 99))} {_fmt(max(values) if values else None)}")
+        print("-" * 72)
+        print(f"🔄 重新連接 {reconnects} 次，最長響應空窗 {longest_gap:.0f} ms")
+        if handoff:
+            print(f"🔗 會話交接 (決定交接 → 新會話送出音頻): 平均 {sum(handoff) / len(handoff):.1f} ms，"
+                  f"最長 {max(handoff):.1f} ms")
+
+    print("-" * 72)
+    per_stream = cpu / streams if streams else 0.0
+    per_audio_minute = cpu / audio_seconds * 60 if audio_seconds else 0.0
+    print(f"🧮 客戶端 CPU: 共 {cpu:.2f} 秒，每串流 {per_stream:.3f} 秒（{per_stream / wall:.1%} 核心），"
+          f"每分鐘音頻 {per_audio_minute:.3f} 秒")
+    if errors:
+        print(f"❌ {len(errors)} 個串流出錯，例如: {errors[0]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流式識別效能測試（本地模擬伺服器）")
+    parser.add_argument("--entry", choices=ENTRIES, default="continuous", help="要測試的入口")
+    parser.add_argument("--streams", type=int, default=1, help="同時執行的串流數")
+    parser.add_argument("--duration", type=float, default=30, help="每個串流的合成音頻長度（秒）")
+    parser.add_argument("--audio", help="改用 WAV/FLAC 檔（含長靜音時 VAD 會讓延遲換算偏移）")
+    parser.add_argument("--speed", type=float, default=1.0, help="音頻播放速度（1 = 即時）")
+    parser.add_argument("--server", help="使用已啟動的模擬伺服器 host:port")
+    parser.add_argument("--in-process", action="store_true", help="在同一行程執行伺服器（CPU 數據會包含伺服器）")
+    parser.add_argument("--verbose", action="store_true", help="顯示各入口原本的輸出")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    os.environ.setdefault("GOOGLE_CLOUD_PROJECT", "fake-project")
+    address, stop_server = start_server(args)
+    os.environ[EMULATOR_HOST_ENV] = address
+
+    print(f"🧪 流式識別效能測試 - 模擬伺服器 {address}")
+    print(f"   入口 {args.entry}，{args.streams} 個串流，延遲 {args.latency_ms:.0f}/{args.final_latency_ms:.0f} ms "
+          f"± {args.jitter_ms:.0f} ms，錯誤率 {args.error_rate:.1%}，串流上限 {args.max_stream_seconds:.0f} 秒")
+
+    if args.entry == "batch":
+        args.batch_file = args.audio or write_synthetic_wav(args.duration)
+
+    results = [{} for _ in range(args.streams)]
+
+    def worker(index):
+        try:
+            RUNNERS[args.entry](index, args, results[index])
+        except Exception as e:
+            results[index]["error"] = f"{type(e).__name__}: {e}"
+
+    try:
+        wait_for_server(address)
+        output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        cpu_start = usage.ru_utime + usage.ru_stime
+        started = time.time()
+        with output:
+            threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(args.streams)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        wall = time.time() - started
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        report(args, results, wall, usage.ru_utime + usage.ru_stime - cpu_start)
+    except KeyboardInterrupt:
+        print("\n⏹️ 已中止")
+    finally:
+        stop_server()
+        if args.entry == "batch" and not args.audio:
+            os.unlink(args.batch_file)
+
+
+if __name__ == "__main__":
+    main()
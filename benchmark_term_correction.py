@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+專有名詞模糊修正效能測試
+在 100 / 1k / 10k 詞彙下測量建立索引的時間、每個最終結果的延遲（冷快取與熱快取），
+以及注入拼寫 / 斷詞錯誤的詞彙被修正回來的比例；
+另外以預設詞彙 + custom_vocabulary.json 掃描真實英文文字（專案文件與日常句子），統計誤修正
+"""
+
+import argparse
+import random
+import re
+import string
+import time
+
+import term_correction
+from benchmark_capitalization import SAMPLE_TRANSCRIPT, build_vocabulary, load_base_phrases
+from custom_vocabulary import PREDEFINED_PHRASES
+from term_correction import PART_PATTERN, FuzzyCorrector, TermCorrector
+
+FILLER_WORDS = SAMPLE_TRANSCRIPT.split()
+REAL_TEXT_FILES = ["README.md", "CHIRP_MODELS.md", "CAPITALIZATION_FIX.md", "INTERIM_RESULTS_FIX.md"]
+
+# 日常句子：包含和預設詞彙相近的一般單詞（都不應被修正；仍被改寫的會列在誤修正結果中）
+EVERYDAY_SENTENCES = [
+    "Tucker said the ticker dropped after the market closed",
+    "we saw a panda and two pandas at the zoo",
+    "let's take a pi break before the next meeting",
+    "the docket is full so the court moved the hearing",
+    "our app engineer left the company last week",
+    "he bought a firestone tire for the truck",
+    "neural networks and user interfaces were both on the agenda",
+    "the docker unloaded the ship at the harbor",
+    "she is an engineer who builds apps for phones",
+    "the roy family runs a small shop near the station",
+    "cloud storage prices keep falling every year",
+    "please compute the total before the engine warms up",
+    "the agile team shipped two products and a prototype",
+    "I read the report and the proof was convincing",
+    "graph paper and a pencil are all you need",
+]
+
+
+def misspell(phrase, rng):
+    """模擬識別錯誤：在大小寫交界拆開單詞、改一個字母或全小寫"""
+    parts = PART_PATTERN.findall(phrase.split()[0])
+    words = phrase.lower().split()
+    choice = rng.random()
+    if choice < 0.4 and len(parts) > 1:
+        # 把多部分組成的單詞拆開（例如 AutoCore → auto core）
+        words[0:1] = [part.lower() for part in parts]
+    elif choice < 0.8:
+        index = max(range(len(words)), key=lambda i: len(words[i]))
+        word = words[index]
+        if len(word) >= 5:
+            position = rng.randint(1, len(word) - 2)
+            words[index] = word[:position] + rng.choice(string.ascii_lowercase) + word[position + 1:]
+    return " ".join(words)
+
+
+def build_finals(phrases, count, rng):
+    """產生最終結果：一般單詞中夾雜 1~2 個識別錯誤的詞彙，回傳 [(文字, [預期詞彙])]"""
+    candidates = [phrase for phrase in phrases if len(phrase.replace(" ", "")) >= 6 and phrase.isascii()]
+    finals = []
+    for _ in range(count):
+        words = rng.sample(FILLER_WORDS, 20)
+        expected = []
+        for _ in range(rng.randint(1, 2)):
+            phrase = rng.choice(candidates)
+            words.insert(rng.randint(0, len(words)), misspell(phrase, rng))
+            expected.append(phrase)
+        finals.append((" ".join(words), expected))
+    return finals
+
+
+def load_real_text():
+    """專案文件中的英文句子（去掉程式碼區塊與 Markdown 符號），加上日常句子"""
+    sentences = list(EVERYDAY_SENTENCES)
+    for path in REAL_TEXT_FILES:
+        try:
+            with open(path, encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except OSError:
+            continue
+        in_code = False
+        for line in lines:
+            if line.strip().startswith("```"):
+                in_code = not in_code
+                continue
+            # 去掉行內程式碼、連結與引號中的範例（文件裡的 "hon high" 本來就是識別錯誤的示範）
+            text = re.sub(r'`[^`]*`|\([^)]*\)|"[^"]*"|[#*|>\[\]_]', " ", line)
+            if in_code or not text.isascii():
+                continue
+            sentences.extend(sentence.strip() for sentence in re.split(r"[.!?:;]", text) if len(sentence.split()) >= 3)
+    return sentences
+
+
+def normalize(text):
+    """只比較單詞（忽略大小寫與連字號等標點）"""
+    return " ".join(re.findall(r"[0-9a-z]+", text.lower()))
+
+
+def false_positives(phrases, sentences):
+    """一般文字中被模糊修正改寫的片段 [(原文, 改成)]（只改大小寫或標點的不算）"""
+    corrector = FuzzyCorrector(phrases)
+    changed = []
+    for sentence in sentences:
+        for start, stop, term in corrector.find(sentence):
+            if normalize(sentence[start:stop]) != normalize(term):
+                changed.append((sentence[start:stop], term))
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="專有名詞模糊修正效能測試")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--finals", type=int, default=500, help="每種詞彙數測試的最終結果數")
+    parser.add_argument("--system-dictionary", action="store_true",
+                        help=f"同時以系統字典（{term_correction.DICTIONARY_FILE}）判斷一般單詞")
+    args = parser.parse_args()
+    term_correction.USE_SYSTEM_DICTIONARY = args.system_dictionary
+
+    rng = random.Random(42)
+    base_phrases = load_base_phrases()
+
+    print("🔎 專有名詞模糊修正效能測試")
+    print("=" * 72)
+    print(f"{'詞彙數':>8} {'建立(ms)':>10} {'冷快取/次(ms)':>14} {'熱快取/次(ms)':>14} {'修正率':>8}")
+    print("-" * 72)
+
+    for size in args.sizes:
+        phrases = build_vocabulary(size, base_phrases, rng)
+        finals = build_finals(phrases, args.finals, rng)
+
+        start = time.perf_counter()
+        corrector = TermCorrector(phrases)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        # 冷快取：每個最終結果前清空片段快取（最差情況）
+        cold_total = 0.0
+        corrected = 0
+        expected_total = 0
+        for text, expected in finals:
+            corrector.fuzzy._cache.clear()
+            start = time.perf_counter()
+            result = corrector.fix(text)
+            cold_total += time.perf_counter() - start
+            expected_total += len(expected)
+            corrected += sum(1 for phrase in expected if phrase in result)
+
+        start = time.perf_counter()
+        for text, _ in finals:
+            corrector.fix(text)
+        warm_ms = (time.perf_counter() - start) * 1000 / len(finals)
+
+        cold_ms = cold_total * 1000 / len(finals)
+        rate = corrected / expected_total if expected_total else 0
+        print(f"{size:>8} {build_ms:>10.1f} {cold_ms:>14.3f} {warm_ms:>14.3f} {rate:>7.0%}")
+
+    print("=" * 72)
+    phrases = [phrase for category in PREDEFINED_PHRASES.values() for phrase in category]
+    phrases += [phrase for phrase in base_phrases if phrase not in phrases]
+    sentences = load_real_text()
+    words = sum(len(sentence.split()) for sentence in sentences)
+    changed = false_positives(phrases, sentences)
+    print(f"🧾 誤修正：{len(phrases)} 個詞彙掃描 {len(sentences)} 句真實文字（{words} 個單詞），"
+          f"改寫 {len(changed)} 處（每千詞 {len(changed) * 1000 / max(words, 1):.2f}）")
+    for original, term in changed[:10]:
+        print(f"   • {original} → {term}")
+    print("=" * 72)
+    example = "today at hon high tech day 2024 terry go said auto core AI runs on tensor flow and big query"
+    print(f"📝 範例輸入: {example}")
+    print(f"📝 範例輸出: {TermCorrector(base_phrases).fix(example)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+翻譯後端效能測試
+以固定的句子到達速率把最終結果送進 TranslationPipeline，比較各後端的每句延遲與吞吐量，
+並與舊版「單一工作線程、逐句翻譯」的設定對照
+
+    python benchmark_translation.py                                # 本地詞組表，模擬 400 ms 的遠端模型延遲
+    python benchmark_translation.py --local-latency-ms 800 --local-per-sentence-ms 50
+    GEMINI_API_KEY=... python benchmark_translation.py --backends local gemini
+"""
+
+import argparse
+import os
+import random
+import threading
+import time
+
+from translation_pipeline import TranslationPipeline, percentile
+from translators import TRANSLATORS, create_translator
+
+LOCAL_LATENCY_MS = 400  # local 後端預設的模擬請求延遲（接近遠端模型；0 時管線與逐句的比較沒有意義）
+
+SAMPLE_SENTENCES = [
+    "Good morning everyone.",
+    "Thank you for joining us today.",
+    "So today we will review the quarterly numbers.",
+    "Then we will discuss the hiring plan for next year.",
+    "Terry Gou talked about electric vehicles and the supply chain.",
+    "Nvidia and Foxconn are partners on artificial intelligence.",
+    "Our Next Energy presented their battery roadmap.",
+    "Let's move on to the next agenda item.",
+    "Revenue growth last quarter was better than the budget.",
+    "The team will launch the product with GE Vernova.",
+    "Machine learning on the cloud needs better security.",
+    "Any questions?",
+]
+
+
+def build_corpus(count, rng):
+    """依序取樣本句，偶爾重複以反映真實會議中的重複語句"""
+    return [rng.choice(SAMPLE_SENTENCES) for _ in range(count)]
+
+
+def run_pipeline(translator, corpus, arrival_rate, **pipeline_options):
+    """以 arrival_rate 句/秒送入句子，回傳每句端到端延遲、排隊、模型延遲與總耗時"""
+    emitted = []
+    done = threading.Event()
+
+    def on_result(item):
+        emitted.append((item, time.time()))
+        if len(emitted) == len(corpus):
+            done.set()
+
+    pipeline = TranslationPipeline(translator, on_result, **pipeline_options)
+    started = time.time()
+    interval = 1.0 / arrival_rate if arrival_rate else 0.0
+    for index, text in enumerate(corpus):
+        # 依排程時間送出，不受前一句處理時間影響
+        delay = started + index * interval - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        pipeline.submit(text)
+    done.wait(timeout=max(60.0, len(corpus) * 5.0))
+    elapsed = time.time() - started
+    pipeline.close(timeout=1.0)
+
+    return {
+        "end_to_end": [(at - item.enqueued_at) * 1000 for item, at in emitted],
+        "queue": [item.queue_ms for item, _ in emitted],
+        "model": [item.model_ms for item, _ in emitted],
+        "elapsed": elapsed,
+        "count": len(emitted),
+        "failed": pipeline.failed,
+        "batches": pipeline.batches,
+    }
+
+
+def _fmt(value, width=8):
+    return f"{value:>{width}.0f}" if value is not None else f"{'-':>{width}}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="翻譯後端效能測試")
+    parser.add_argument("--backends", nargs="+", choices=sorted(TRANSLATORS), default=["local"])
+    parser.add_argument("--sentences", type=int, default=60)
+    parser.add_argument("--arrival-rate", type=float, default=2.0, help="每秒送入的句數（0 表示一次全部送入）")
+    parser.add_argument("--in-flight", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=6)
+    parser.add_argument("--local-latency-ms", type=float, default=LOCAL_LATENCY_MS, help="local 後端每個請求的模擬延遲")
+    parser.add_argument("--local-per-sentence-ms", type=float, default=0.0, help="local 後端每句額外的模擬延遲")
+    parser.add_argument("--no-sequential", dest="sequential", action="store_false",
+                        help="不測試舊版單一工作線程逐句翻譯的設定")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.sentences, random.Random(args.seed))
+    modes = [("管線", {"max_in_flight": args.in_flight, "max_batch_size": args.batch_size})]
+    if args.sequential:
+        modes.append(("逐句", {"max_in_flight": 1, "max_batch_size": 1}))
+
+    print("🌐 翻譯後端效能測試")
+    print(f"   {len(corpus)} 句，到達速率 {args.arrival_rate:g} 句/秒，local 模擬延遲 {args.local_latency_ms:g} ms"
+          f" + 每句 {args.local_per_sentence_ms:g} ms")
+    if "local" in args.backends and not args.local_latency_ms and not args.local_per_sentence_ms:
+        print("⚠️ local 後端沒有模擬延遲：延遲數字只反映詞組表查詢，無法比較管線與逐句翻譯")
+    print("=" * 92)
+    print(f"{'後端':<10}{'模式':<6}{'端到端p50':>10}{'端到端p95':>10}{'排隊p50':>9}{'模型p50':>9}"
+          f"{'模型p95':>9}{'批次':>6}{'失敗':>6}{'句/秒':>8}")
+    print("-" * 92)
+
+    for backend in args.backends:
+        options = {}
+        if backend == "local":
+            options = {"latency_ms": args.local_latency_ms, "per_sentence_ms": args.local_per_sentence_ms}
+        elif backend == "gemini":
+            api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
+            if not api_key:
+                print(f"{backend:<10}⚠️ 略過：請設置 GEMINI_API_KEY")
+                continue
+            import google.generativeai as genai
+            genai.configure(api_key=api_key)
+
+        for mode, pipeline_options in modes:
+            translator = create_translator(backend, **options)
+            result = run_pipeline(translator, corpus, args.arrival_rate, **pipeline_options)
+            throughput = result["count"] / result["elapsed"] if result["elapsed"] else 0.0
+            print(f"{backend:<10}{mode:<6}"
+                  f"{_fmt(percentile(result['end_to_end'], 50), 10)}{_fmt(percentile(result['end_to_end'], 95), 10)}"
+                  f"{_fmt(percentile(result['queue'], 50), 9)}{_fmt(percentile(result['model'], 50), 9)}"
+                  f"{_fmt(percentile(result['model'], 95), 9)}{result['batches']:>6}{result['failed']:>6}"
+                  f"{throughput:>8.2f}")
+
+    print("=" * 92)
+    print("💡 時間單位為毫秒；句/秒為完成句數除以總耗時，受到達速率限制")
+    sample = create_translator("local")
+    print(f"📝 local 範例: {SAMPLE_SENTENCES[4]} → {sample.translate(SAMPLE_SENTENCES[4])}")
+
+
+if __name__ == "__main__":
+    main()
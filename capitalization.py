@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+專有名詞大小寫修正引擎
+將整個詞彙表一次編譯成單一正則（字元前綴樹），單次掃描修正所有詞彙
+"""
+
+import re
+from functools import lru_cache
+
+
+def _normalize(text):
+    """正規化：小寫並合併空白，作為詞彙查表的鍵"""
+    return " ".join(text.lower().split())
+
+
+def _build_trie(keys):
+    """以正規化後的詞彙建立字元前綴樹，'' 鍵標記詞彙結尾"""
+    trie = {}
+    for key in keys:
+        node = trie
+        for char in key:
+            node = node.setdefault(char, {})
+        node[""] = True
+    return trie
+
+
+def _char_pattern(char):
+    """單一字元的正則片段 - 空白允許匹配任意長度的空白"""
+    if char == " ":
+        return r"\s+"
+    return re.escape(char)
+
+
+def _trie_to_pattern(node):
+    """
+    將前綴樹轉成正則
+    子節點排在結尾標記之前，正則回溯時會先嘗試較長的詞彙（最長匹配優先）
+    """
+    branches = []
+    for char, child in node.items():
+        if char == "":
+            continue
+        # 合併單一路徑，避免產生過深的巢狀群組
+        literal = _char_pattern(char)
+        while len(child) == 1 and "" not in child:
+            (next_char, child), = child.items()
+            literal += _char_pattern(next_char)
+        branches.append(literal + _trie_to_pattern(child))
+
+    if "" in node:
+        # 詞彙結尾：後面不能緊接著單詞字元
+        branches.append(r"(?!\w)")
+
+    if len(branches) == 1:
+        return branches[0]
+    return "(?:" + "|".join(branches) + ")"
+
+
+class PhraseCorrector:
+    """已編譯的詞彙修正器 - 建立一次，對每個最終結果單次掃描"""
+
+    def __init__(self, phrases):
+        # 相同正規化鍵以最後出現的寫法為準（與舊版逐詞替換的結果一致）
+        self.canonical = {}
+        for phrase in phrases:
+            key = _normalize(phrase)
+            if key:
+                self.canonical[key] = phrase
+
+        self.pattern = None
+        if self.canonical:
+            trie = _build_trie(self.canonical)
+            self.pattern = re.compile(r"(?<!\w)" + _trie_to_pattern(trie), re.IGNORECASE)
+
+    def __len__(self):
+        return len(self.canonical)
+
+    def _replace(self, match):
+        return self.canonical.get(_normalize(match.group(0)), match.group(0))
+
+    def fix(self, text):
+        """修正文字中專有名詞的大小寫"""
+        if self.pattern is None or not text:
+            return text
+        return self.pattern.sub(self._replace, text)
+
+
+@lru_cache(maxsize=8)
+def _cached_corrector(phrases):
+    return PhraseCorrector(phrases)
+
+
+def fix_capitalization(text, custom_phrases):
+    """修正文字中專有名詞的大小寫（相容舊介面，依詞彙表快取已編譯的修正器）"""
+    if not custom_phrases:
+        return text
+    return _cached_corrector(tuple(custom_phrases)).fix(text)
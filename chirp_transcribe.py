@@ -1,11 +1,43 @@
 import os
 
-from google.api_core.client_options import ClientOptions
-from google.cloud.speech_v2 import SpeechClient
 from google.cloud.speech_v2.types import cloud_speech
 
+from speech_connection import get_speech_client
+
 PROJECT_ID = os.getenv("GOOGLE_CLOUD_PROJECT")
 
+def build_recognize_request(
+    audio_content: bytes,
+    language_codes=("en-US",),
+    model: str = "chirp",
+    region: str = "us-central1",
+    features: cloud_speech.RecognitionFeatures = None,
+) -> cloud_speech.RecognizeRequest:
+    """Builds a synchronous recognize request for the given audio bytes.
+    Args:
+        audio_content (bytes): Encoded audio (any format supported by auto decoding).
+        language_codes: Language codes, or ["auto"] to detect the language.
+        model (str): Recognition model.
+        region (str): The region for the API endpoint.
+        features: Optional recognition features (e.g. word time offsets).
+    Returns:
+        cloud_speech.RecognizeRequest: The request to pass to `client.recognize`.
+    """
+    config = cloud_speech.RecognitionConfig(
+        auto_decoding_config=cloud_speech.AutoDetectDecodingConfig(),
+        language_codes=list(language_codes),
+        model=model,
+    )
+    if features is not None:
+        config.features = features
+
+    return cloud_speech.RecognizeRequest(
+        recognizer=f"projects/{PROJECT_ID}/locations/{region}/recognizers/_",
+        config=config,
+        content=audio_content,
+    )
+
+
 def transcribe_chirp(
     audio_file: str,
 ) -> cloud_speech.RecognizeResponse:
@@ -17,28 +49,14 @@ def transcribe_chirp(
         cloud_speech.RecognizeResponse: The response from the Speech-to-Text API containing
         the transcription results.
     """
-    # Instantiates a client
-    client = SpeechClient(
-        client_options=ClientOptions(
-            api_endpoint="us-central1-speech.googleapis.com",
-        )
-    )
+    # Reuses the shared client (keepalive gRPC channel)
+    client = get_speech_client("us-central1")
 
     # Reads a file as bytes
     with open(audio_file, "rb") as f:
         audio_content = f.read()
 
-    config = cloud_speech.RecognitionConfig(
-        auto_decoding_config=cloud_speech.AutoDetectDecodingConfig(),
-        language_codes=["en-US"],
-        model="chirp",
-    )
-
-    request = cloud_speech.RecognizeRequest(
-        recognizer=f"projects/{PROJECT_ID}/locations/us-central1/recognizers/_",
-        config=config,
-        content=audio_content,
-    )
+    request = build_recognize_request(audio_content, ["en-US"])
 
     # Transcribes the audio into text
     response = client.recognize(request=request)
@@ -62,28 +80,15 @@ def transcribe_chirp_auto_detect_language(
     Returns:
         cloud_speech.RecognizeResponse: The response containing the transcription results.
     """
-    # Instantiates a client
-    client = SpeechClient(
-        client_options=ClientOptions(
-            api_endpoint=f"{region}-speech.googleapis.com",
-        )
-    )
+    # Reuses the shared client (keepalive gRPC channel)
+    client = get_speech_client(region)
 
     # Reads a file as bytes
     with open(audio_file, "rb") as f:
         audio_content = f.read()
 
-    config = cloud_speech.RecognitionConfig(
-        auto_decoding_config=cloud_speech.AutoDetectDecodingConfig(),
-        language_codes=["auto"],  # Set language code to auto to detect language.
-        model="chirp",
-    )
-
-    request = cloud_speech.RecognizeRequest(
-        recognizer=f"projects/{PROJECT_ID}/locations/{region}/recognizers/_",
-        config=config,
-        content=audio_content,
-    )
+    # Set language code to auto to detect language.
+    request = build_recognize_request(audio_content, ["auto"], region=region)
 
     # Transcribes the audio into text
     response = client.recognize(request=request)
@@ -113,6 +118,7 @@ if __name__ == "__main__":
         print("1. 使用您手機錄製一個短音頻")
         print("2. 下載網上的音頻樣本")
         print("3. 使用 macOS 內建的錄音功能")
+        print("批次轉錄整個目錄: python batch_transcribe.py <目錄> -o transcripts.jsonl")
         exit(0)
     
     if not os.path.exists(audio_file):
@@ -2,204 +2,659 @@
 """
 自定義詞彙管理工具
 用於管理語音識別的專業術語詞庫
+- 記憶體中以 dict 建立索引（詞彙 → 分類、分類 → 詞彙），成員判斷、新增、移除都是 O(1)
+- 磁碟上以 SQLite（VOCABULARY_DB_FILE）保存，每次修改只寫入變動的列，批次匯入在同一個交易中完成
+- custom_vocabulary.json 仍是識別程式讀取的格式：修改後只在離開選單或批次匯入結束時寫出一次；
+  開啟時若 JSON 比資料庫新（例如手動編輯過），先以 JSON 為準重新匯入
+- 非互動的批次匯入 / 匯出：串流讀寫 TXT / CSV / TSV / JSONL，可指定分類與加權
+
+    python custom_vocabulary.py                                    # 互動模式
+    python custom_vocabulary.py import terms.csv glossary.jsonl --category 技術 --boost 12
+    python custom_vocabulary.py export vocabulary.tsv --category 技術
 """
 
+import argparse
+import csv
 import json
 import os
+import sqlite3
+import sys
+import time
 from datetime import datetime
 
 VOCABULARY_FILE = "custom_vocabulary.json"
+VOCABULARY_DB_FILE = "custom_vocabulary.sqlite3"
+IMPORT_BATCH_ROWS = 10000  # 批次匯入時每次寫入資料庫的列數（全部在同一個交易中）
+
+# CSV / TSV / JSONL 的欄位名稱（不分大小寫）；CSV / TSV 沒有標題列時依序為 詞彙, 分類, 加權
+PHRASE_COLUMNS = ("phrase", "term", "text", "詞彙")
+CATEGORY_COLUMNS = ("category", "分類")
+BOOST_COLUMNS = ("boost", "加權")
+
+class VocabularyIndex:
+    """
+    詞彙索引
+    詞彙保持加入順序；每個詞彙最多屬於一個分類（None 表示未分類），可以有自己的加權（覆寫分類加權）
+    JSON 中 phrases / categories / phrase_boosts 以外的欄位（例如分類加權 boosts）原樣保留
+    """
+
+    def __init__(self, db_path=VOCABULARY_DB_FILE, json_path=VOCABULARY_FILE):
+        self.db_path = db_path
+        self.json_path = json_path
+        self._phrases = {}     # 詞彙 → 分類
+        self._categories = {}  # 分類 → {詞彙: None}（有序集合）
+        self._boosts = {}      # 詞彙 → 加權（只記錄有自己加權的詞彙）
+        self.extras = {}
+        self.last_updated = None
+
+        self._db = sqlite3.connect(db_path or ":memory:")
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS phrases ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, phrase TEXT NOT NULL UNIQUE,"
+            " category TEXT, added_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(phrases)")}
+        if "boost" not in columns:
+            self._db.execute("ALTER TABLE phrases ADD COLUMN boost REAL")
+        self._db.commit()
+
+        for phrase, category, boost in self._db.execute("SELECT phrase, category, boost FROM phrases ORDER BY id"):
+            self._index(phrase, category, boost)
+        self.extras = json.loads(self._meta("extras") or "{}")
+        self.last_updated = self._meta("last_updated")
+
+        # JSON 在上次匯出 / 匯入之後被修改過（或資料庫是新的）：以 JSON 為準
+        signature = self._json_signature()
+        if signature is not None and signature != self._meta("json_signature"):
+            if self._meta("dirty") == "1":
+                print(f"⚠️ {json_path} 已在外部修改，資料庫中尚未匯出的修改將被覆蓋")
+            self.import_json(json_path, replace=True)
+        elif self._meta("dirty") == "1":
+            # 上次修改後沒有匯出（例如中途被中斷）
+            self.export_json()
+
+    # ---- 索引 ----
+
+    def __len__(self):
+        return len(self._phrases)
+
+    def __contains__(self, phrase):
+        return phrase in self._phrases
+
+    def __iter__(self):
+        return iter(self._phrases)
+
+    def category_of(self, phrase):
+        return self._phrases.get(phrase)
+
+    def categories(self):
+        """分類 → 詞彙列表（不含未分類）"""
+        return {category: list(phrases) for category, phrases in self._categories.items() if phrases}
+
+    def uncategorized(self):
+        return [phrase for phrase, category in self._phrases.items() if category is None]
+
+    def boost_of(self, phrase):
+        """詞彙自己的加權（沒有時為 None，使用分類加權）"""
+        return self._boosts.get(phrase)
+
+    def rows(self, category=None):
+        """依加入順序產生 (詞彙, 分類, 加權)；指定 category 時只產生該分類"""
+        phrases = self._categories.get(category, {}) if category else self._phrases
+        for phrase in phrases:
+            yield phrase, self._phrases[phrase], self._boosts.get(phrase)
+
+    def _index(self, phrase, category, boost=None):
+        self._phrases[phrase] = category
+        if category is not None:
+            self._categories.setdefault(category, {})[phrase] = None
+        if boost is not None:
+            self._boosts[phrase] = boost
+
+    def _unindex(self, phrase):
+        category = self._phrases.pop(phrase)
+        self._boosts.pop(phrase, None)
+        if category is not None:
+            self._categories[category].pop(phrase, None)
+
+    # ---- 資料庫 ----
+
+    def _meta(self, key):
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, **values):
+        self._db.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", values.items())
+
+    def _touch(self):
+        """在目前的交易中記錄修改時間並標記尚未匯出"""
+        self.last_updated = datetime.now().isoformat()
+        self._set_meta(last_updated=self.last_updated, dirty="1")
+
+    def _json_signature(self):
+        if not self.json_path or not os.path.exists(self.json_path):
+            return None
+        stat = os.stat(self.json_path)
+        return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+    # ---- 修改 ----
+
+    def add(self, phrase, category=None, boost=None):
+        """新增詞彙；已存在時回傳 False"""
+        if not phrase or phrase in self._phrases:
+            return False
+        with self._db:
+            self._db.execute("INSERT INTO phrases (phrase, category, boost, added_at) VALUES (?, ?, ?, ?)",
+                             (phrase, category, boost, time.time()))
+            self._touch()
+        self._index(phrase, category, boost)
+        return True
+
+    def remove(self, phrase):
+        """移除詞彙；不存在時回傳 False"""
+        if phrase not in self._phrases:
+            return False
+        with self._db:
+            self._db.execute("DELETE FROM phrases WHERE phrase = ?", (phrase,))
+            self._touch()
+        self._unindex(phrase)
+        return True
+
+    def add_many(self, items, batch_rows=IMPORT_BATCH_ROWS):
+        """
+        批次新增詞彙字串、(詞彙, 分類) 或 (詞彙, 分類, 加權)；items 可以是生成器（邊讀邊寫）
+        以索引（雜湊表）判斷重複，全部在同一個交易中每 batch_rows 列寫入一次
+        回傳 (新增數, 已存在或重複而略過的數)
+        """
+        added = []
+        batch = []
+        skipped = 0
+        now = time.time()
+        try:
+            with self._db:
+                for item in items:
+                    phrase, category, boost = ((item, None, None) if isinstance(item, str)
+                                               else (tuple(item) + (None, None))[:3])
+                    if not phrase or phrase in self._phrases:
+                        skipped += 1
+                        continue
+                    self._index(phrase, category, boost)
+                    added.append(phrase)
+                    batch.append((phrase, category, boost, now))
+                    if len(batch) >= batch_rows:
+                        self._db.executemany(
+                            "INSERT INTO phrases (phrase, category, boost, added_at) VALUES (?, ?, ?, ?)", batch)
+                        batch = []
+                if batch:
+                    self._db.executemany(
+                        "INSERT INTO phrases (phrase, category, boost, added_at) VALUES (?, ?, ?, ?)", batch)
+                if added:
+                    self._touch()
+        except BaseException:
+            # 交易已回滾，索引也還原
+            for phrase in added:
+                self._unindex(phrase)
+            raise
+        return len(added), skipped
+
+    def clear(self):
+        with self._db:
+            self._db.execute("DELETE FROM phrases")
+            self._touch()
+        self._phrases.clear()
+        self._categories.clear()
+        self._boosts.clear()
+
+    # ---- 匯入 / 匯出 ----
+
+    def to_dict(self):
+        """custom_vocabulary.json 的格式"""
+        data = dict(self.extras)
+        data.update({
+            "phrases": list(self._phrases),
+            "categories": self.categories(),
+            "last_updated": self.last_updated,
+        })
+        if self._boosts:
+            data["phrase_boosts"] = dict(self._boosts)
+        return data
+
+    def import_json(self, path, replace=False):
+        """
+        匯入 custom_vocabulary.json 格式（phrases、categories 與 phrase_boosts；詞彙的分類取第一個包含它的分類）
+        replace 時先清空，並保留其他欄位；回傳 (新增數, 略過數)
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        category_of = {}
+        for category, phrases in (data.get("categories") or {}).items():
+            for phrase in phrases:
+                category_of.setdefault(phrase, category)
+        boosts = data.get("phrase_boosts") or {}
+        candidates = list(data.get("phrases") or [])
+        candidates.extend(category_of)
+
+        if replace:
+            self._phrases.clear()
+            self._categories.clear()
+            self._boosts.clear()
+            self.extras = {key: value for key, value in data.items()
+                           if key not in ("phrases", "categories", "phrase_boosts", "last_updated")}
+            self._db.execute("DELETE FROM phrases")
+        result = self.add_many((phrase, category_of.get(phrase), boosts.get(phrase)) for phrase in candidates)
+        with self._db:
+            self._set_meta(extras=json.dumps(self.extras, ensure_ascii=False))
+            if replace:
+                self.last_updated = data.get("last_updated") or self.last_updated
+                self._set_meta(last_updated=self.last_updated or "")
+            if replace and os.path.abspath(path) == os.path.abspath(self.json_path or ""):
+                # 資料庫與 JSON 內容一致
+                self._set_meta(json_signature=self._json_signature(), dirty="0")
+        return result
+
+    def export_json(self, path=None):
+        """寫出 JSON（先寫入暫存檔再改名，讀取端不會讀到半個檔案）"""
+        path = path or self.json_path
+        temporary = path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        os.replace(temporary, path)
+        if os.path.abspath(path) == os.path.abspath(self.json_path or ""):
+            with self._db:
+                self._set_meta(json_signature=self._json_signature(), dirty="0")
+        return path
+
+    @property
+    def dirty(self):
+        return self._meta("dirty") == "1"
+
+    def close(self):
+        self._db.close()
+
+def _clean_phrase(phrase):
+    """去除前後空白並合併連續空白"""
+    return " ".join(str(phrase).split()) if phrase is not None else ""
+
+def _parse_boost(value):
+    """加權欄位轉成數字；空白為 None，格式錯誤（包括 JSON 陣列、物件）拋出 ValueError 或 TypeError"""
+    if value is None or str(value).strip() == "":
+        return None
+    return float(value)
+
+def _column(header, names):
+    for index, name in enumerate(header):
+        if name in names:
+            return index
+    return None
+
+def read_txt(f):
+    """每行一個詞彙；空行與 # 開頭的註解略過"""
+    for line in f:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line, None, None
+
+def _read_delimited(f, delimiter):
+    """有標題列時依欄位名稱，否則依序為 詞彙, 分類, 加權"""
+    reader = csv.reader(f, delimiter=delimiter)
+    first = next(reader, None)
+    if first is None:
+        return
+    header = [name.strip().lower().lstrip("\ufeff") for name in first]
+    phrase_column = _column(header, PHRASE_COLUMNS)
+    if phrase_column is None:
+        columns = (0, 1, 2)
+        yield tuple(first[i] if i < len(first) else None for i in columns)
+    else:
+        columns = (phrase_column, _column(header, CATEGORY_COLUMNS), _column(header, BOOST_COLUMNS))
+    for row in reader:
+        yield tuple(row[i] if i is not None and i < len(row) else None for i in columns)
+
+def read_csv(f):
+    return _read_delimited(f, ",")
+
+def read_tsv(f):
+    return _read_delimited(f, "\t")
+
+def read_jsonl(f):
+    """每行一個 JSON 字串或物件（phrase / term / text、category、boost）；無法解析的行產生空詞彙"""
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            yield None, None, None
+            continue
+        if isinstance(item, str):
+            yield item, None, None
+        elif isinstance(item, dict):
+            item = {str(key).lower(): value for key, value in item.items()}
+            phrase = next((item[name] for name in PHRASE_COLUMNS if name in item), None)
+            category = next((item[name] for name in CATEGORY_COLUMNS if name in item), None)
+            boost = next((item[name] for name in BOOST_COLUMNS if name in item), None)
+            yield phrase, category, boost
+        else:
+            yield None, None, None
+
+def write_txt(f, rows):
+    for phrase, _, _ in rows:
+        f.write(phrase + "\n")
+
+def _write_delimited(f, rows, delimiter):
+    writer = csv.writer(f, delimiter=delimiter, lineterminator="\n")
+    writer.writerow(("phrase", "category", "boost"))
+    for phrase, category, boost in rows:
+        writer.writerow((phrase, category or "", "" if boost is None else f"{boost:g}"))
+
+def write_csv(f, rows):
+    _write_delimited(f, rows, ",")
+
+def write_tsv(f, rows):
+    _write_delimited(f, rows, "\t")
+
+def write_jsonl(f, rows):
+    for phrase, category, boost in rows:
+        item = {"phrase": phrase}
+        if category:
+            item["category"] = category
+        if boost is not None:
+            item["boost"] = boost
+        f.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+READERS = {
+    "txt": read_txt,
+    "csv": read_csv,
+    "tsv": read_tsv,
+    "jsonl": read_jsonl,
+}
+
+WRITERS = {
+    "txt": write_txt,
+    "csv": write_csv,
+    "tsv": write_tsv,
+    "jsonl": write_jsonl,
+}
+
+FORMAT_EXTENSIONS = {".txt": "txt", ".csv": "csv", ".tsv": "tsv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+
+def detect_format(path, format="auto"):
+    """依副檔名判斷格式（標準輸入 / 輸出或無法判斷時為 txt）"""
+    if format != "auto":
+        return format
+    return FORMAT_EXTENSIONS.get(os.path.splitext(path)[1].lower(), "txt")
+
+def import_terms(vocabulary, path, format="auto", category=None, boost=None):
+    """
+    串流讀取詞彙檔並寫入索引（不會一次讀進整個檔案）
+    沒有分類 / 加權欄位的詞彙使用 category / boost；回傳 (新增數, 重複或已存在數, 無效行數)
+    """
+    reader = READERS[detect_format(path, format)]
+    invalid = 0
+
+    def terms(f):
+        nonlocal invalid
+        for phrase, row_category, row_boost in reader(f):
+            phrase = _clean_phrase(phrase)
+            try:
+                row_boost = _parse_boost(row_boost)
+            except (TypeError, ValueError):
+                row_boost = phrase = None
+            if not phrase:
+                invalid += 1
+                continue
+            yield (phrase, _clean_phrase(row_category) or category,
+                   row_boost if row_boost is not None else boost)
+
+    if path == "-":
+        added, skipped = vocabulary.add_many(terms(sys.stdin))
+    else:
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            added, skipped = vocabulary.add_many(terms(f))
+    return added, skipped, invalid
+
+def export_terms(vocabulary, path, format="auto", category=None):
+    """依格式串流寫出詞彙，回傳寫出的數量"""
+    writer = WRITERS[detect_format(path, format)]
+    count = 0
+
+    def counted(rows):
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    if path == "-":
+        writer(sys.stdout, counted(vocabulary.rows(category)))
+    else:
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer(f, counted(vocabulary.rows(category)))
+    return count
 
 def load_vocabulary():
-    """載入自定義詞彙"""
-    if os.path.exists(VOCABULARY_FILE):
-        with open(VOCABULARY_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {
-        "phrases": [],
-        "categories": {},
-        "last_updated": None
-    }
-
-def save_vocabulary(vocab_data):
-    """儲存自定義詞彙"""
-    vocab_data["last_updated"] = datetime.now().isoformat()
-    with open(VOCABULARY_FILE, 'w', encoding='utf-8') as f:
-        json.dump(vocab_data, f, ensure_ascii=False, indent=2)
-    print(f"✅ 詞彙已儲存到 {VOCABULARY_FILE}")
-
-def add_phrase(vocab_data, phrase, category=None):
+    """開啟詞彙索引（JSON 比資料庫新時先匯入）"""
+    return VocabularyIndex()
+
+def save_vocabulary(vocabulary):
+    """把詞彙寫出到 custom_vocabulary.json（識別程式讀取的格式）"""
+    vocabulary.export_json()
+    print(f"✅ 詞彙已儲存到 {vocabulary.json_path}")
+
+def add_phrase(vocabulary, phrase, category=None):
     """新增詞彙"""
-    if phrase not in vocab_data["phrases"]:
-        vocab_data["phrases"].append(phrase)
-        if category:
-            if category not in vocab_data["categories"]:
-                vocab_data["categories"][category] = []
-            if phrase not in vocab_data["categories"][category]:
-                vocab_data["categories"][category].append(phrase)
+    if vocabulary.add(phrase, category):
         print(f"✅ 已新增: {phrase}")
         if category:
             print(f"   分類: {category}")
     else:
         print(f"⚠️  詞彙已存在: {phrase}")
 
-def remove_phrase(vocab_data, phrase):
+def remove_phrase(vocabulary, phrase):
     """移除詞彙"""
-    if phrase in vocab_data["phrases"]:
-        vocab_data["phrases"].remove(phrase)
-        # 從分類中移除
-        for category in vocab_data["categories"]:
-            if phrase in vocab_data["categories"][category]:
-                vocab_data["categories"][category].remove(phrase)
+    if vocabulary.remove(phrase):
         print(f"✅ 已移除: {phrase}")
     else:
         print(f"❌ 詞彙不存在: {phrase}")
 
-def list_vocabulary(vocab_data):
+def list_vocabulary(vocabulary):
     """顯示所有詞彙"""
     print("\n📚 自定義詞彙庫:")
     print("=" * 50)
-    
-    if not vocab_data["phrases"]:
+
+    if not len(vocabulary):
         print("❌ 詞彙庫為空")
         return
-    
-    print(f"📊 總共 {len(vocab_data['phrases'])} 個詞彙")
-    if vocab_data["last_updated"]:
-        print(f"🕒 最後更新: {vocab_data['last_updated']}")
+
+    print(f"📊 總共 {len(vocabulary)} 個詞彙")
+    if vocabulary.last_updated:
+        print(f"🕒 最後更新: {vocabulary.last_updated}")
     print()
-    
+
     # 按分類顯示
-    if vocab_data["categories"]:
-        for category, phrases in vocab_data["categories"].items():
-            if phrases:
-                print(f"📁 {category}:")
-                for phrase in phrases:
-                    print(f"   • {phrase}")
-                print()
-    
+    for category, phrases in vocabulary.categories().items():
+        print(f"📁 {category}:")
+        for phrase in phrases:
+            print(f"   • {phrase}")
+        print()
+
     # 顯示未分類的詞彙
-    categorized_phrases = set()
-    for phrases in vocab_data["categories"].values():
-        categorized_phrases.update(phrases)
-    
-    uncategorized = [p for p in vocab_data["phrases"] if p not in categorized_phrases]
+    uncategorized = vocabulary.uncategorized()
     if uncategorized:
         print("📁 未分類:")
         for phrase in uncategorized:
             print(f"   • {phrase}")
 
-def add_predefined_phrases(vocab_data):
-    """新增一些常見的專業術語範例"""
-    # 技術相關
-    tech_phrases = [
+# 預設的常見專業術語範例（類別 → 詞彙）
+PREDEFINED_PHRASES = {
+    "技術": [
         "API", "SDK", "REST API", "GraphQL", "OAuth", "JWT",
         "Docker", "Kubernetes", "microservices", "DevOps",
         "machine learning", "artificial intelligence", "neural network",
         "deep learning", "computer vision", "natural language processing",
         "TensorFlow", "PyTorch", "scikit-learn", "pandas", "NumPy"
-    ]
-    
-    # 商業相關
-    business_phrases = [
+    ],
+    "商業": [
         "KPI", "ROI", "SaaS", "B2B", "B2C", "CRM", "ERP",
         "scalability", "monetization", "MVP", "proof of concept",
         "user experience", "user interface", "agile development"
-    ]
-    
-    # Google Cloud 相關
-    gcp_phrases = [
+    ],
+    "Google Cloud": [
         "Google Cloud", "BigQuery", "Cloud Storage", "Cloud Run",
         "App Engine", "Compute Engine", "Cloud Functions",
         "Firestore", "Cloud SQL", "Pub Sub", "Cloud Vision",
         "Speech to Text", "Cloud Translation"
-    ]
-    
+    ],
+}
+
+
+def add_predefined_phrases(vocabulary):
+    """新增一些常見的專業術語範例"""
     print("📦 新增預設專業術語...")
-    
-    for phrase in tech_phrases:
-        add_phrase(vocab_data, phrase, "技術")
-    
-    for phrase in business_phrases:
-        add_phrase(vocab_data, phrase, "商業")
-        
-    for phrase in gcp_phrases:
-        add_phrase(vocab_data, phrase, "Google Cloud")
-    
-    print(f"✅ 已新增 {len(tech_phrases + business_phrases + gcp_phrases)} 個預設術語")
+
+    items = [(phrase, category) for category, phrases in PREDEFINED_PHRASES.items() for phrase in phrases]
+    added, _ = vocabulary.add_many(items)
+
+    print(f"✅ 已新增 {added} 個預設術語（{len(items) - added} 個已存在）")
 
 def interactive_mode():
-    """互動模式"""
-    vocab_data = load_vocabulary()
-    
-    while True:
-        print("\n🎯 自定義詞彙管理")
-        print("=" * 30)
-        print("1. 📝 新增詞彙")
-        print("2. 🗑️  移除詞彙") 
-        print("3. 📚 查看詞彙庫")
-        print("4. 📦 新增預設術語")
-        print("5. 📤 匯出詞彙")
-        print("6. 📥 匯入詞彙")
-        print("7. 🚀 測試識別")
-        print("0. 退出")
-        
-        choice = input("\n請選擇 (0-7): ").strip()
-        
-        if choice == "1":
-            phrase = input("輸入詞彙: ").strip()
-            if phrase:
-                category = input("輸入分類 (可選): ").strip() or None
-                add_phrase(vocab_data, phrase, category)
-                save_vocabulary(vocab_data)
-        
-        elif choice == "2":
-            phrase = input("輸入要移除的詞彙: ").strip()
-            if phrase:
-                remove_phrase(vocab_data, phrase)
-                save_vocabulary(vocab_data)
-        
-        elif choice == "3":
-            list_vocabulary(vocab_data)
-        
-        elif choice == "4":
-            add_predefined_phrases(vocab_data)
-            save_vocabulary(vocab_data)
-        
-        elif choice == "5":
-            export_file = input("匯出檔名 (預設: vocabulary_export.txt): ").strip() or "vocabulary_export.txt"
-            with open(export_file, 'w', encoding='utf-8') as f:
-                for phrase in vocab_data["phrases"]:
-                    f.write(phrase + "\n")
-            print(f"✅ 已匯出到 {export_file}")
-        
-        elif choice == "6":
-            import_file = input("匯入檔名: ").strip()
-            if os.path.exists(import_file):
-                with open(import_file, 'r', encoding='utf-8') as f:
-                    lines = f.readlines()
-                for line in lines:
-                    phrase = line.strip()
-                    if phrase:
-                        add_phrase(vocab_data, phrase)
-                save_vocabulary(vocab_data)
+    """互動模式（修改即時寫入資料庫，離開選單時寫出 custom_vocabulary.json）"""
+    vocabulary = load_vocabulary()
+
+    try:
+        while True:
+            print("\n🎯 自定義詞彙管理")
+            print("=" * 30)
+            print("1. 📝 新增詞彙")
+            print("2. 🗑️  移除詞彙")
+            print("3. 📚 查看詞彙庫")
+            print("4. 📦 新增預設術語")
+            print("5. 📤 匯出詞彙")
+            print("6. 📥 匯入詞彙")
+            print("7. 🚀 測試識別")
+            print("0. 退出")
+
+            choice = input("\n請選擇 (0-7): ").strip()
+
+            if choice == "1":
+                phrase = input("輸入詞彙: ").strip()
+                if phrase:
+                    category = input("輸入分類 (可選): ").strip() or None
+                    add_phrase(vocabulary, phrase, category)
+
+            elif choice == "2":
+                phrase = input("輸入要移除的詞彙: ").strip()
+                if phrase:
+                    remove_phrase(vocabulary, phrase)
+
+            elif choice == "3":
+                list_vocabulary(vocabulary)
+
+            elif choice == "4":
+                add_predefined_phrases(vocabulary)
+
+            elif choice == "5":
+                export_file = input("匯出檔名 (預設: vocabulary_export.txt): ").strip() or "vocabulary_export.txt"
+                count = export_terms(vocabulary, export_file)
+                print(f"✅ 已匯出 {count} 個詞彙到 {export_file}")
+
+            elif choice == "6":
+                import_file = input("匯入檔名 (TXT / CSV / TSV / JSONL): ").strip()
+                if os.path.exists(import_file):
+                    started = time.perf_counter()
+                    try:
+                        added, skipped, invalid = import_terms(vocabulary, import_file)
+                    except (OSError, UnicodeDecodeError, ValueError, csv.Error) as e:
+                        print(f"❌ 匯入失敗: {e}")
+                        continue
+                    elapsed = time.perf_counter() - started
+                    print(f"✅ 已匯入 {added} 個詞彙，略過 {skipped} 個已存在的詞彙、{invalid} 行無效（{elapsed:.2f} 秒）")
+                else:
+                    print("❌ 檔案不存在")
+
+            elif choice == "7":
+                print("🚀 啟動帶自定義詞彙的語音識別...")
+                break
+
+            elif choice == "0":
+                break
+
             else:
-                print("❌ 檔案不存在")
-        
-        elif choice == "7":
-            print("🚀 啟動帶自定義詞彙的語音識別...")
-            break
-        
-        elif choice == "0":
-            break
-        
-        else:
-            print("❌ 無效選擇")
+                print("❌ 無效選擇")
+    finally:
+        # 所有修改只寫出一次 JSON（中途按 Ctrl+C 也會寫出）
+        if vocabulary.dirty:
+            save_vocabulary(vocabulary)
+        vocabulary.close()
 
 def get_phrases_for_recognition():
     """獲取用於語音識別的詞彙列表"""
-    vocab_data = load_vocabulary()
-    return vocab_data["phrases"]
+    vocabulary = load_vocabulary()
+    try:
+        return list(vocabulary)
+    finally:
+        vocabulary.close()
+
+def _rate(count, elapsed):
+    return f"{count / elapsed:,.0f} 詞/秒" if elapsed > 0 else "—"
+
+def main():
+    parser = argparse.ArgumentParser(description="自定義詞彙管理（不帶子命令時進入互動模式）")
+    commands = parser.add_subparsers(dest="command")
+
+    import_parser = commands.add_parser("import", help="批次匯入詞彙檔（TXT / CSV / TSV / JSONL）")
+    import_parser.add_argument("files", nargs="+", help="詞彙檔（- 表示標準輸入）")
+    import_parser.add_argument("--format", choices=("auto", *READERS), default="auto", help="預設依副檔名判斷")
+    import_parser.add_argument("--category", help="沒有分類欄位的詞彙使用的分類")
+    import_parser.add_argument("--boost", type=float, help="沒有加權欄位的詞彙使用的加權（覆寫分類加權）")
+    import_parser.add_argument("--replace", action="store_true", help="匯入前先清空現有詞彙")
+
+    export_parser = commands.add_parser("export", help="匯出詞彙")
+    export_parser.add_argument("file", help="輸出檔（- 表示標準輸出）")
+    export_parser.add_argument("--format", choices=("auto", *WRITERS), default="auto", help="預設依副檔名判斷")
+    export_parser.add_argument("--category", help="只匯出此分類")
+
+    args = parser.parse_args()
+    if args.command is None:
+        interactive_mode()
+        return
+
+    vocabulary = load_vocabulary()
+    try:
+        if args.command == "import":
+            if args.replace:
+                vocabulary.clear()
+            total_started = time.perf_counter()
+            total_read = 0
+            for path in args.files:
+                started = time.perf_counter()
+                try:
+                    added, skipped, invalid = import_terms(vocabulary, path, args.format, args.category, args.boost)
+                except (OSError, UnicodeDecodeError, ValueError, csv.Error) as e:
+                    # 這個檔案的詞彙已回滾，繼續匯入其他檔案
+                    print(f"❌ {path}: {e}")
+                    continue
+                elapsed = time.perf_counter() - started
+                read = added + skipped + invalid
+                total_read += read
+                print(f"📥 {path}: 新增 {added}，重複或已存在 {skipped}，無效 {invalid}"
+                      f"（{read} 行，{elapsed:.2f} 秒，{_rate(read, elapsed)}）")
+            if vocabulary.dirty:
+                # 所有檔案匯入後只寫出一次 JSON
+                save_vocabulary(vocabulary)
+            elapsed = time.perf_counter() - total_started
+            print(f"📊 詞彙庫共 {len(vocabulary)} 個詞彙，總耗時 {elapsed:.2f} 秒（{_rate(total_read, elapsed)}）")
+        else:
+            started = time.perf_counter()
+            count = export_terms(vocabulary, args.file, args.format, args.category)
+            elapsed = time.perf_counter() - started
+            if args.file != "-":
+                print(f"📤 已匯出 {count} 個詞彙到 {args.file}（{elapsed:.2f} 秒，{_rate(count, elapsed)}）")
+    finally:
+        vocabulary.close()
 
 if __name__ == "__main__":
-    interactive_mode() 
\ No newline at end of file
+    main()
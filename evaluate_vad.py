@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+VAD 離線評估工具
+對 WAV 檔案執行 VAD 閘門，報告過濾比例、語音段數與處理速度；
+若有標註檔（Audacity 標籤格式：開始\t結束\t標籤），另外計算語音保留率
+"""
+
+import argparse
+import os
+import time
+import wave
+
+import numpy as np
+
+from vad import DETECTORS, VADGate, create_detector
+
+CHUNK_MS = 100
+
+
+def read_wav_mono16(path):
+    """讀取 WAV 並轉成 16-bit 單聲道 PCM，回傳 (pcm_bytes, rate)"""
+    with wave.open(path, "rb") as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError(f"{path}: 只支持 16-bit PCM WAV")
+        rate = wav.getframerate()
+        channels = wav.getnchannels()
+        frames = wav.readframes(wav.getnframes())
+
+    samples = np.frombuffer(frames, dtype=np.int16)
+    if channels > 1:
+        samples = samples.reshape(-1, channels)[:, 0]
+    return samples.tobytes(), rate
+
+
+def read_labels(path):
+    """讀取 Audacity 標籤檔，回傳 [(start, end), ...]（秒）"""
+    segments = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            parts = line.strip().split("\t")
+            if len(parts) >= 2:
+                try:
+                    segments.append((float(parts[0]), float(parts[1])))
+                except ValueError:
+                    continue
+    return segments
+
+
+def evaluate_file(path, detector_name, hangover_ms, pre_roll_ms, keepalive_ms, labels_path=None):
+    """評估單一檔案"""
+    pcm, rate = read_wav_mono16(path)
+    chunk_bytes = int(rate * CHUNK_MS / 1000) * 2
+    gate = VADGate(create_detector(detector_name, rate), rate=rate, hangover_ms=hangover_ms,
+                   pre_roll_ms=pre_roll_ms, keepalive_ms=keepalive_ms)
+
+    chunk_count = (len(pcm) + chunk_bytes - 1) // chunk_bytes
+    sent = np.zeros(chunk_count, dtype=bool)
+
+    start = time.perf_counter()
+    for i in range(chunk_count):
+        output = gate.process(memoryview(pcm)[i * chunk_bytes:(i + 1) * chunk_bytes])
+        if output:
+            # 輸出包含 pre-roll 時，對應到之前被暫存的音頻塊
+            sent[max(0, i - len(output) + 1):i + 1] = True
+    elapsed = time.perf_counter() - start
+
+    duration = len(pcm) / 2 / rate
+    result = {
+        "file": os.path.basename(path),
+        "duration": duration,
+        "suppressed": gate.suppressed_fraction,
+        "onsets": gate.speech_onsets,
+        "speed": duration / elapsed if elapsed else float("inf"),
+        "recall": None,
+    }
+
+    if labels_path and os.path.exists(labels_path):
+        chunk_seconds = CHUNK_MS / 1000
+        speech = np.zeros(chunk_count, dtype=bool)
+        for seg_start, seg_end in read_labels(labels_path):
+            speech[int(seg_start / chunk_seconds):int(np.ceil(seg_end / chunk_seconds))] = True
+        if speech.any():
+            result["recall"] = float(np.mean(sent[speech]))
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VAD 離線評估")
+    parser.add_argument("wav_files", nargs="+", help="16-bit PCM WAV 檔案")
+    parser.add_argument("--detector", choices=sorted(DETECTORS), default="energy")
+    parser.add_argument("--hangover-ms", type=int, default=1000)
+    parser.add_argument("--pre-roll-ms", type=int, default=300)
+    parser.add_argument("--keepalive-ms", type=int, default=5000, help="0 表示不送保活音頻")
+    parser.add_argument("--labels-ext", default=".txt", help="標註檔副檔名（與 WAV 同名）")
+    args = parser.parse_args()
+
+    print(f"🔇 VAD 離線評估 (檢測器: {args.detector}, hangover {args.hangover_ms} ms, "
+          f"pre-roll {args.pre_roll_ms} ms)")
+    print("=" * 78)
+    print(f"{'檔案':<28} {'時長(s)':>8} {'過濾比例':>8} {'語音段':>6} {'保留率':>8} {'速度':>10}")
+    print("-" * 78)
+
+    total_duration = 0.0
+    total_suppressed = 0.0
+    for path in args.wav_files:
+        try:
+            labels_path = os.path.splitext(path)[0] + args.labels_ext
+            r = evaluate_file(path, args.detector, args.hangover_ms, args.pre_roll_ms,
+                              args.keepalive_ms or None, labels_path)
+        except (OSError, ValueError, ImportError, wave.Error) as e:
+            print(f"❌ {path}: {e}")
+            continue
+
+        recall = f"{r['recall']:.1%}" if r["recall"] is not None else "-"
+        print(f"{r['file'][:28]:<28} {r['duration']:>8.1f} {r['suppressed']:>8.1%} "
+              f"{r['onsets']:>6} {recall:>8} {r['speed']:>9.0f}x")
+        total_duration += r["duration"]
+        total_suppressed += r["duration"] * r["suppressed"]
+
+    print("=" * 78)
+    if total_duration:
+        print(f"📊 總時長 {total_duration:.1f} 秒，過濾 {total_suppressed / total_duration:.1%} 的音頻")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,508 @@
+#!/usr/bin/env python3
+"""
+本地 Speech-to-Text V2 模擬伺服器
+實作 google.cloud.speech.v2.Speech 的 StreamingRecognize 與 Recognize，
+依收到的音頻長度產生腳本化的中間 / 最終結果，可設定延遲、抖動、錯誤率與 5 分鐘串流限制，
+讓效能問題可以在本地重現，不必連到 Google
+也在記憶體中實作 PhraseSet / Recognizer 資源的建立、查詢、更新、刪除與還原（長時間操作立即完成），
+識別請求可以引用這些資源（speech_resources.py）
+
+啟動：
+    python fake_speech_server.py --port 50051 --latency-ms 150 --jitter-ms 50
+    export SPEECH_EMULATOR_HOST=localhost:50051
+    python realtime_chirp2_continuous.py --source recording.wav
+"""
+
+import argparse
+import datetime
+import functools
+import io
+import queue
+import random
+import threading
+import time
+import wave
+from concurrent import futures
+
+import grpc
+from google.cloud.speech_v2.types import cloud_speech
+from google.longrunning import operations_pb2
+from google.protobuf import any_pb2
+
+SERVICE = "google.cloud.speech.v2.Speech"
+DEFAULT_PORT = 50051
+BYTES_PER_SECOND = 16000 * 2  # 16kHz 16-bit 單聲道（與客戶端的 LINEAR16 設定一致）
+
+DEFAULT_SCRIPT = (
+    "welcome to the weekly engineering sync today we will review the streaming pipeline "
+    "the new buffer keeps memory flat while the connection manager reuses one channel "
+    "latency for interim results should stay under two hundred milliseconds "
+    "next we look at vocabulary adaptation for product names like kubernetes and openai "
+    "finally we plan the rollout for the translation service and the batch jobs"
+)
+
+# 資源類型：(gRPC 方法名稱中的類型, 集合名稱, 列表響應的欄位)
+RESOURCE_KINDS = {
+    "phrase_set": ("PhraseSet", "phraseSets", "phrase_sets"),
+    "recognizer": ("Recognizer", "recognizers", "recognizers"),
+}
+MAX_INLINE_AUDIO_BYTES = 10 * 1024 * 1024  # 同步 recognize 內嵌音頻的上限（與真實服務相同）
+MAX_MESSAGE_BYTES = MAX_INLINE_AUDIO_BYTES + 1024 * 1024  # 接收訊息上限：音頻加上配置與詞彙的餘裕
+DEFAULT_RECOGNIZER = "_"  # 不需建立、配置全部由請求提供的識別器
+
+
+class FakeSpeechOptions:
+    """模擬伺服器的行為設定"""
+
+    def __init__(self, script=DEFAULT_SCRIPT, words_per_second=2.5, interim_interval=0.3,
+                 utterance_seconds=3.0, latency_ms=150, final_latency_ms=300, jitter_ms=50,
+                 error_rate=0.0, max_stream_seconds=300, recognize_rtf=0.05, language_code="en-US",
+                 mismatch_confidence=0.35, seed=None):
+        self.words = script.split()
+        self.words_per_second = words_per_second
+        self.interim_interval = interim_interval      # 每隔多少秒音頻送一個中間結果
+        self.utterance_seconds = utterance_seconds    # 每段話多長時送出最終結果
+        self.latency_ms = latency_ms                  # 中間結果延遲（從收到對應音頻起算）
+        self.final_latency_ms = final_latency_ms      # 最終結果延遲
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate                  # 每個響應觸發 UNAVAILABLE 的機率
+        self.max_stream_seconds = max_stream_seconds  # 串流時長上限（真實服務為 5 分鐘）
+        self.recognize_rtf = recognize_rtf            # 批次識別的處理時間 / 音頻時長
+        self.language_code = language_code            # 腳本的語言（模擬說話者實際使用的語言）
+        self.mismatch_confidence = mismatch_confidence  # 要求的語言與腳本語言不同時的信心值
+        self.random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+    def delay(self, final):
+        """回傳此響應的延遲（秒），含隨機抖動"""
+        base = self.final_latency_ms if final else self.latency_ms
+        with self._random_lock:
+            jitter = self.random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(0.0, base + jitter) / 1000
+
+    def should_fail(self):
+        if not self.error_rate:
+            return False
+        with self._random_lock:
+            return self.random.random() < self.error_rate
+
+    def recognized_as(self, language_codes):
+        """
+        依要求的語言回傳 (結果的 language_code, 最終結果信心值)：
+        包含腳本語言或 auto 時回報腳本語言，否則回報要求的第一個語言並降低信心
+        """
+        spoken = self.language_code.lower()
+        for code in language_codes:
+            code = code.lower()
+            if code in ("auto", spoken) or code.split("-")[0] == spoken.split("-")[0]:
+                return self.language_code, 0.92
+        return (language_codes[0] if language_codes else self.language_code), self.mismatch_confidence
+
+    def words_between(self, start_seconds, end_seconds):
+        """回傳 [start, end) 秒之間說出的單詞，以及每個單詞的起訖時間"""
+        first = int(start_seconds * self.words_per_second)
+        last = int(end_seconds * self.words_per_second)
+        spans = []
+        for index in range(first, last):
+            word = self.words[index % len(self.words)]
+            spans.append((word, index / self.words_per_second, (index + 1) / self.words_per_second))
+        return spans
+
+
+def _duration(seconds):
+    return datetime.timedelta(seconds=seconds)
+
+
+def _build_result(options, spans, end_seconds, final, word_offsets, result_class, language=None):
+    """由單詞列表建立識別結果；language 為 recognized_as() 的結果"""
+    language_code, confidence = language or (options.language_code, 0.92)
+    alternative = cloud_speech.SpeechRecognitionAlternative(
+        transcript=" ".join(word for word, _, _ in spans),
+        confidence=confidence if final else 0.0,
+    )
+    if final and word_offsets:
+        alternative.words = [
+            cloud_speech.WordInfo(word=word, start_offset=_duration(start), end_offset=_duration(end),
+                                  confidence=confidence)
+            for word, start, end in spans
+        ]
+    result = result_class(
+        alternatives=[alternative],
+        result_end_offset=_duration(end_seconds),
+        language_code=language_code,
+    )
+    if result_class is cloud_speech.StreamingRecognitionResult:
+        result.is_final = final
+        result.stability = 0.0 if final else 0.8
+    return result
+
+
+class FakeSpeechServicer:
+    """Speech V2 服務的本地替身"""
+
+    def __init__(self, options=None):
+        self.options = options or FakeSpeechOptions()
+        self.active_streams = 0
+        self.total_streams = 0
+        self.resources = {}  # 資源名稱 → PhraseSet / Recognizer
+        self.operations = 0
+        self._lock = threading.Lock()
+
+    def _resolve_config(self, recognizer, config, context):
+        """
+        合併識別器的預設配置與請求中的配置（請求優先），並確認引用的 PhraseSet 都存在
+        識別器或 PhraseSet 不存在時以 NOT_FOUND 結束呼叫
+        """
+        merged = cloud_speech.RecognitionConfig()
+        if recognizer.rsplit("/", 1)[-1] != DEFAULT_RECOGNIZER:
+            resource = self._live_resource(recognizer)
+            if resource is None:
+                context.abort(grpc.StatusCode.NOT_FOUND, f"Unable to find Recognizer {recognizer}.")
+            cloud_speech.RecognitionConfig.pb(merged).MergeFrom(
+                cloud_speech.RecognitionConfig.pb(resource.default_recognition_config))
+        cloud_speech.RecognitionConfig.pb(merged).MergeFrom(cloud_speech.RecognitionConfig.pb(config))
+        for item in merged.adaptation.phrase_sets:
+            if item.phrase_set and self._live_resource(item.phrase_set) is None:
+                context.abort(grpc.StatusCode.NOT_FOUND, f"Unable to find PhraseSet {item.phrase_set}.")
+        return merged
+
+    def _live_resource(self, name):
+        with self._lock:
+            resource = self.resources.get(name)
+        if resource is None or resource.state == type(resource).State.DELETED:
+            return None
+        return resource
+
+    # ---- 流式識別 ----
+
+    def streaming_recognize(self, request_iterator, context):
+        options = self.options
+        first = next(request_iterator, None)
+        if first is None or not first.recognizer or "streaming_config" not in first:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT,
+                          "The first request must contain recognizer and streaming_config.")
+
+        streaming_config = first.streaming_config
+        interim_results = streaming_config.streaming_features.interim_results
+        config = self._resolve_config(first.recognizer, streaming_config.config, context)
+        word_offsets = config.features.enable_word_time_offsets
+        language = options.recognized_as(list(config.language_codes))
+
+        with self._lock:
+            self.active_streams += 1
+            self.total_streams += 1
+
+        # 讀取線程依音頻進度排程響應：(預定送出時間, 響應)；None 表示音頻結束
+        scheduled = queue.Queue()
+        started = time.monotonic()
+
+        def read_audio():
+            audio_bytes = 0
+            next_interim = options.interim_interval
+            utterance_start = 0.0
+            last_due = 0.0
+
+            def schedule(response, final):
+                nonlocal last_due
+                # 響應依序送出：延遲不會讓後面的結果超前
+                last_due = max(last_due, time.monotonic() + options.delay(final))
+                scheduled.put((last_due, response))
+
+            try:
+                for request in request_iterator:
+                    audio_bytes += len(request.audio)
+                    seconds = audio_bytes / BYTES_PER_SECOND
+
+                    if seconds - utterance_start >= options.utterance_seconds:
+                        end = utterance_start + options.utterance_seconds
+                        spans = options.words_between(utterance_start, end)
+                        result = _build_result(options, spans, end, True, word_offsets,
+                                               cloud_speech.StreamingRecognitionResult, language)
+                        schedule(cloud_speech.StreamingRecognizeResponse(results=[result]), True)
+                        utterance_start = end
+                        next_interim = end + options.interim_interval
+
+                    if interim_results and seconds >= next_interim:
+                        spans = options.words_between(utterance_start, seconds)
+                        if spans:
+                            result = _build_result(options, spans, seconds, False, False,
+                                                   cloud_speech.StreamingRecognitionResult, language)
+                            schedule(cloud_speech.StreamingRecognizeResponse(results=[result]), False)
+                        next_interim = seconds + options.interim_interval
+
+                # 音頻結束：送出最後一段話的最終結果
+                seconds = audio_bytes / BYTES_PER_SECOND
+                spans = options.words_between(utterance_start, seconds)
+                if spans:
+                    result = _build_result(options, spans, seconds, True, word_offsets,
+                                           cloud_speech.StreamingRecognitionResult, language)
+                    schedule(cloud_speech.StreamingRecognizeResponse(results=[result]), True)
+            except Exception:
+                # 客戶端取消或連線中斷
+                pass
+            finally:
+                scheduled.put(None)
+
+        reader = threading.Thread(target=read_audio)
+        reader.daemon = True
+        reader.start()
+
+        try:
+            while context.is_active():
+                if time.monotonic() - started > options.max_stream_seconds:
+                    context.abort(grpc.StatusCode.OUT_OF_RANGE,
+                                  "Max duration of 5 minutes reached for stream.")
+                try:
+                    item = scheduled.get(timeout=0.05)
+                except queue.Empty:
+                    continue
+                if item is None:
+                    return
+                due, response = item
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                if options.should_fail():
+                    context.abort(grpc.StatusCode.UNAVAILABLE, "Injected failure from fake speech server.")
+                yield response
+        finally:
+            with self._lock:
+                self.active_streams -= 1
+
+    # ---- 批次識別 ----
+
+    def recognize(self, request, context):
+        options = self.options
+        if not request.recognizer:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "Missing recognizer.")
+        config = self._resolve_config(request.recognizer, request.config, context)
+        if len(request.content) > MAX_INLINE_AUDIO_BYTES:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT,
+                          f"Request payload size exceeds the limit: {MAX_INLINE_AUDIO_BYTES} bytes.")
+
+        seconds = _content_seconds(request.content)
+        time.sleep(options.delay(True) + seconds * options.recognize_rtf)
+        if options.should_fail():
+            context.abort(grpc.StatusCode.UNAVAILABLE, "Injected failure from fake speech server.")
+
+        word_offsets = config.features.enable_word_time_offsets
+        language = options.recognized_as(list(config.language_codes))
+        results = []
+        start = 0.0
+        while start < seconds:
+            end = min(seconds, start + options.utterance_seconds)
+            spans = options.words_between(start, end)
+            if spans:
+                results.append(_build_result(options, spans, end, True, word_offsets,
+                                             cloud_speech.SpeechRecognitionResult, language))
+            start = end
+        return cloud_speech.RecognizeResponse(
+            results=results,
+            metadata=cloud_speech.RecognitionResponseMetadata(total_billed_duration=_duration(seconds)),
+        )
+
+
+    # ---- PhraseSet / Recognizer 資源 ----
+
+    def _operation(self, resource):
+        """已完成的長時間操作（客戶端不需要輪詢 Operations 服務）"""
+        with self._lock:
+            self.operations += 1
+            number = self.operations
+        response = any_pb2.Any()
+        response.Pack(type(resource).pb(resource))
+        location = resource.name.rsplit("/", 2)[0]
+        return operations_pb2.Operation(name=f"{location}/operations/{number}", done=True, response=response)
+
+    def _touch(self, resource):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        resource.update_time = now
+        resource.etag = f"{time.monotonic_ns():x}"
+
+    def create_resource(self, kind, request, context):
+        collection = RESOURCE_KINDS[kind][1]
+        resource_id = getattr(request, f"{kind}_id")
+        if not resource_id:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, f"Missing {kind}_id.")
+        resource = getattr(request, kind)
+        resource.name = f"{request.parent}/{collection}/{resource_id}"
+        with self._lock:
+            if resource.name in self.resources:
+                context.abort(grpc.StatusCode.ALREADY_EXISTS, f"{resource.name} already exists.")
+            resource.uid = f"{len(self.resources) + 1:08x}"
+            resource.state = type(resource).State.ACTIVE
+            resource.create_time = datetime.datetime.now(datetime.timezone.utc)
+            self._touch(resource)
+            self.resources[resource.name] = resource
+        return self._operation(resource)
+
+    def get_resource(self, kind, request, context):
+        with self._lock:
+            resource = self.resources.get(request.name)
+        if resource is None:
+            context.abort(grpc.StatusCode.NOT_FOUND, f"Unable to find {request.name}.")
+        return resource
+
+    def update_resource(self, kind, request, context):
+        update = getattr(request, kind)
+        with self._lock:
+            resource = self.resources.get(update.name)
+            if resource is None:
+                context.abort(grpc.StatusCode.NOT_FOUND, f"Unable to find {update.name}.")
+            message_class = type(resource)
+            paths = list(request.update_mask.paths) or [
+                field for field in message_class.meta.fields
+                if field not in ("name", "uid", "state", "create_time", "update_time", "etag")]
+            for path in paths:
+                # 以 proto 複製欄位，map 與重複欄位整個取代
+                message_class.pb(resource).ClearField(path)
+                if path in update:
+                    setattr(resource, path, getattr(update, path))
+            self._touch(resource)
+        return self._operation(resource)
+
+    def delete_resource(self, kind, request, context):
+        """與真實服務相同的軟刪除：保留期內可以還原，不能以相同 ID 重新建立"""
+        with self._lock:
+            resource = self.resources.get(request.name)
+            if resource is None:
+                context.abort(grpc.StatusCode.NOT_FOUND, f"Unable to find {request.name}.")
+            resource.state = type(resource).State.DELETED
+            resource.delete_time = datetime.datetime.now(datetime.timezone.utc)
+            self._touch(resource)
+        return self._operation(resource)
+
+    def undelete_resource(self, kind, request, context):
+        with self._lock:
+            resource = self.resources.get(request.name)
+            if resource is None:
+                context.abort(grpc.StatusCode.NOT_FOUND, f"Unable to find {request.name}.")
+            resource.state = type(resource).State.ACTIVE
+            resource.delete_time = None
+            self._touch(resource)
+        return self._operation(resource)
+
+    def list_resources(self, kind, request, context):
+        type_name, collection, field = RESOURCE_KINDS[kind]
+        prefix = f"{request.parent}/{collection}/"
+        with self._lock:
+            resources = [resource for name, resource in sorted(self.resources.items())
+                         if name.startswith(prefix)
+                         and (request.show_deleted or resource.state != type(resource).State.DELETED)]
+        response_class = getattr(cloud_speech, f"List{type_name}sResponse")
+        return response_class(**{field: resources})
+
+
+def _content_seconds(content):
+    """估計音頻內容的長度：WAV 讀取標頭，其他視為 16kHz LINEAR16"""
+    if content[:4] == b"RIFF":
+        try:
+            with wave.open(io.BytesIO(content), "rb") as wav:
+                return wav.getnframes() / wav.getframerate()
+        except wave.Error:
+            pass
+    return len(content) / BYTES_PER_SECOND
+
+
+def serve(port=DEFAULT_PORT, options=None, max_workers=64):
+    """啟動模擬伺服器，回傳 (grpc.Server, servicer, 實際埠號)"""
+    servicer = FakeSpeechServicer(options)
+    handlers = {
+        "StreamingRecognize": grpc.stream_stream_rpc_method_handler(
+            servicer.streaming_recognize,
+            request_deserializer=cloud_speech.StreamingRecognizeRequest.deserialize,
+            response_serializer=cloud_speech.StreamingRecognizeResponse.serialize,
+        ),
+        "Recognize": grpc.unary_unary_rpc_method_handler(
+            servicer.recognize,
+            request_deserializer=cloud_speech.RecognizeRequest.deserialize,
+            response_serializer=cloud_speech.RecognizeResponse.serialize,
+        ),
+    }
+    for kind, (type_name, _, _) in RESOURCE_KINDS.items():
+        request_classes = {
+            "Create": (servicer.create_resource, f"Create{type_name}Request", None),
+            "Get": (servicer.get_resource, f"Get{type_name}Request", getattr(cloud_speech, type_name)),
+            "Update": (servicer.update_resource, f"Update{type_name}Request", None),
+            "Delete": (servicer.delete_resource, f"Delete{type_name}Request", None),
+            "Undelete": (servicer.undelete_resource, f"Undelete{type_name}Request", None),
+            "List": (servicer.list_resources, f"List{type_name}sRequest",
+                     getattr(cloud_speech, f"List{type_name}sResponse")),
+        }
+        for verb, (method, request_class, response_class) in request_classes.items():
+            method_name = f"{verb}{type_name}s" if verb == "List" else f"{verb}{type_name}"
+            handlers[method_name] = grpc.unary_unary_rpc_method_handler(
+                functools.partial(method, kind),
+                request_deserializer=getattr(cloud_speech, request_class).deserialize,
+                response_serializer=(response_class.serialize if response_class
+                                     else operations_pb2.Operation.SerializeToString),
+            )
+    # 預設 4 MB 的接收上限會拒絕真實服務接受的大型同步請求
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers),
+                         options=[("grpc.max_receive_message_length", MAX_MESSAGE_BYTES)])
+    server.add_generic_rpc_handlers((grpc.method_handlers_generic_handler(SERVICE, handlers),))
+    port = server.add_insecure_port(f"[::]:{port}")
+    server.start()
+    return server, servicer, port
+
+
+def add_server_arguments(parser):
+    """模擬伺服器的命令列參數（基準測試工具共用）"""
+    parser.add_argument("--script", help="腳本文字檔（預設使用內建英文腳本）")
+    parser.add_argument("--words-per-second", type=float, default=2.5)
+    parser.add_argument("--interim-interval", type=float, default=0.3, help="中間結果間隔（秒音頻）")
+    parser.add_argument("--utterance-seconds", type=float, default=3.0, help="每段最終結果的音頻長度")
+    parser.add_argument("--latency-ms", type=float, default=150, help="中間結果延遲")
+    parser.add_argument("--final-latency-ms", type=float, default=300, help="最終結果延遲")
+    parser.add_argument("--jitter-ms", type=float, default=50)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="每個響應注入 UNAVAILABLE 的機率")
+    parser.add_argument("--max-stream-seconds", type=float, default=300, help="串流時長上限")
+    parser.add_argument("--language-code", default="en-US",
+                        help="腳本的語言；要求其他語言的串流得到較低的信心值（測試多語言模式）")
+    parser.add_argument("--mismatch-confidence", type=float, default=0.35, help="語言不符時的最終結果信心值")
+    parser.add_argument("--seed", type=int)
+    return parser
+
+
+def options_from_args(args):
+    script = DEFAULT_SCRIPT
+    if args.script:
+        with open(args.script, "r", encoding="utf-8") as f:
+            script = f.read()
+    return FakeSpeechOptions(
+        script=script,
+        words_per_second=args.words_per_second,
+        interim_interval=args.interim_interval,
+        utterance_seconds=args.utterance_seconds,
+        latency_ms=args.latency_ms,
+        final_latency_ms=args.final_latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        max_stream_seconds=args.max_stream_seconds,
+        language_code=args.language_code,
+        mismatch_confidence=args.mismatch_confidence,
+        seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 Speech-to-Text V2 模擬伺服器")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--max-workers", type=int, default=64, help="同時處理的串流數上限")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server, servicer, port = serve(args.port, options_from_args(args), args.max_workers)
+    print(f"🧪 模擬 Speech V2 伺服器已啟動: localhost:{port}")
+    print(f"   延遲: 中間 {args.latency_ms:.0f} ms / 最終 {args.final_latency_ms:.0f} ms ± {args.jitter_ms:.0f} ms，"
+          f"錯誤率 {args.error_rate:.1%}，串流上限 {args.max_stream_seconds:.0f} 秒")
+    print(f"💡 export SPEECH_EMULATOR_HOST=localhost:{port}")
+    try:
+        server.wait_for_termination()
+    except KeyboardInterrupt:
+        print(f"\n⏹️ 停止伺服器（共處理 {servicer.total_streams} 個串流）")
+        server.stop(grace=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+中間結果的串流翻譯
+只在最終結果出現後才翻譯，中文會比英文晚好幾秒；這裡在說話途中就翻譯已穩定的開頭：
+- 連續 STABLE_UPDATES 個中間結果都相同的開頭單詞視為穩定（最後一個單詞可能還在變，不算）
+- 已翻譯的穩定開頭會保留重用，每次只送出新穩定的尾段
+- 識別結果改寫了已送出的單詞時，取消被取代的請求並丟棄對應的譯文
+- 最終結果出現時，與之相符的已翻譯開頭直接重用，只把剩下的尾段交給翻譯管線
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from translation_pipeline import STATS_WINDOW, percentile
+from translators import join_translations
+
+STABLE_UPDATES = 2     # 開頭需要在幾個連續中間結果中保持不變
+MIN_TAIL_WORDS = 4     # 穩定尾段至少幾個單詞才送出翻譯
+MAX_IN_FLIGHT = 2      # 工作線程數（被取代但已送出的請求仍會佔用一個）
+CLAUSE_ENDINGS = (".", ",", "!", "?", ";", ":")
+
+
+def _normalize(word):
+    return word.strip(".,!?;:\"'").lower()
+
+
+def common_prefix_length(word_lists):
+    """多個單詞列表共同開頭的單詞數（忽略大小寫與標點）"""
+    if not word_lists:
+        return 0
+    length = min(len(words) for words in word_lists)
+    for i in range(length):
+        first = _normalize(word_lists[0][i])
+        if any(_normalize(words[i]) != first for words in word_lists[1:]):
+            return i
+    return length
+
+
+class TranslatedPiece:
+    """一段已送出（或已翻譯）的穩定單詞"""
+
+    def __init__(self, start, words):
+        self.start = start          # 在整句中的單詞位置
+        self.words = words
+        self.translation = None
+        self.future = None
+        self.sent_at = time.time()
+        self.latency_ms = None
+
+    @property
+    def end(self):
+        return self.start + len(self.words)
+
+    def matches(self, words):
+        segment = words[self.start:self.end]
+        return len(segment) == len(self.words) and all(
+            _normalize(a) == _normalize(b) for a, b in zip(segment, self.words))
+
+
+class InterimTranslator:
+    """
+    中間結果串流翻譯器
+    translator 需提供 translate_batch(texts)；若另有 translate_tail(prefix, prefix_translation, tail)，
+    尾段翻譯時會一併提供前文以保持語意連貫
+    """
+
+    def __init__(self, translator, stable_updates=STABLE_UPDATES, min_tail_words=MIN_TAIL_WORDS,
+                 max_in_flight=MAX_IN_FLIGHT):
+        self.translator = translator
+        self.stable_updates = stable_updates
+        self.min_tail_words = min_tail_words
+        self._pool = ThreadPoolExecutor(max_workers=max_in_flight)
+        self._lock = threading.Lock()
+        self._history = []
+        self._pieces = []
+
+        self.sent = 0
+        self.superseded = 0
+        self.reused_words = 0
+        self.latencies_ms = deque(maxlen=STATS_WINDOW)
+
+    def update(self, transcript):
+        """處理一個中間結果，必要時送出新穩定尾段的翻譯"""
+        words = transcript.split()
+        with self._lock:
+            self._history = (self._history + [words])[-self.stable_updates:]
+            self._drop_superseded(words)
+            if len(self._history) < self.stable_updates:
+                return
+            if self._pieces and self._pieces[-1].translation is None:
+                # 上一段尚未譯完：尾段需要接在完整的前文譯文之後，等它完成再送
+                return
+            # 最後一個單詞可能只辨識了一半，不計入穩定開頭
+            stable = min(common_prefix_length(self._history), len(words) - 1)
+            start = self._pieces[-1].end if self._pieces else 0
+            if stable - start < self.min_tail_words:
+                return
+            # 優先在子句結尾處切開
+            end = stable
+            for i in range(stable, start + self.min_tail_words - 1, -1):
+                if words[i - 1].endswith(CLAUSE_ENDINGS):
+                    end = i
+                    break
+            self._send(TranslatedPiece(start, words[start:end]))
+
+    def _send(self, piece):
+        prefix = " ".join(" ".join(p.words) for p in self._pieces)
+        prefix_translation = join_translations([p.translation for p in self._pieces])
+        piece.future = self._pool.submit(self._translate, piece, prefix, prefix_translation)
+        self._pieces.append(piece)
+        self.sent += 1
+
+    def _translate(self, piece, prefix, prefix_translation):
+        tail = " ".join(piece.words)
+        try:
+            if prefix and hasattr(self.translator, "translate_tail"):
+                translation = self.translator.translate_tail(prefix, prefix_translation, tail)
+            else:
+                translation = self.translator.translate_batch([tail])[0]
+        except Exception:
+            translation = None
+        with self._lock:
+            if piece in self._pieces:
+                piece.translation = translation
+                piece.latency_ms = (time.time() - piece.sent_at) * 1000
+                self.latencies_ms.append(piece.latency_ms)
+                if translation is None:
+                    # 翻譯失敗：之後的片段也無法接上，交給最終結果重新翻譯
+                    self._discard_from(self._pieces.index(piece))
+
+    def _drop_superseded(self, words):
+        """識別結果改寫了已送出的單詞：從第一個不相符的片段起全部作廢"""
+        for index, piece in enumerate(self._pieces):
+            if not piece.matches(words):
+                self._discard_from(index)
+                return
+
+    def _discard_from(self, index):
+        for piece in self._pieces[index:]:
+            # 尚未開始的請求直接取消；已送出的請求結果會被忽略
+            if piece.future is not None:
+                piece.future.cancel()
+            self.superseded += 1
+        del self._pieces[index:]
+
+    def preview(self):
+        """目前已翻譯好的開頭（供中間結果顯示）"""
+        with self._lock:
+            translated = []
+            for piece in self._pieces:
+                if piece.translation is None:
+                    break
+                translated.append(piece.translation)
+            return join_translations(translated)
+
+    def finalize(self, transcript):
+        """
+        最終結果：回傳 (可重用的英文開頭, 對應譯文, 仍需翻譯的尾段)，並重設狀態
+        只重用已完成、且與最終結果相符的連續片段
+        """
+        words = transcript.split()
+        with self._lock:
+            self._drop_superseded(words)
+            reused = []
+            for piece in self._pieces:
+                if piece.translation is None:
+                    break
+                reused.append(piece)
+            self._discard_from(len(reused))
+            self._pieces = []
+            self._history = []
+
+        end = reused[-1].end if reused else 0
+        self.reused_words += end
+        prefix = " ".join(words[:end])
+        return prefix, join_translations([piece.translation for piece in reused]), " ".join(words[end:])
+
+    def report(self):
+        if not self.sent:
+            return []
+        p50 = percentile(self.latencies_ms, 50)
+        p50 = f"{p50:.0f} ms" if p50 is not None else "—"
+        return [f"中間結果翻譯: 送出 {self.sent} 段，作廢 {self.superseded} 段，"
+                f"最終結果重用 {self.reused_words} 個單詞，尾段延遲 p50 {p50}"]
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
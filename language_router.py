@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+多語言識別的逐句語言選擇
+同一段音頻同時送給多個語言的串流，每個語句收集各語言的最終結果後選出一個：
+- 分數為信心值；某個串流偵測到的語言（language_code，例如 auto 串流）指向另一個候選語言時該語言加分，
+  目前領先的語言有少量加分避免來回切換
+- 第一個最終結果到達後最多等待 wait_seconds 讓其他語言跟上；只剩一個語言時不等待
+- 連續輸掉 prune_after 句、且勝出語言夠有把握的語言關閉串流（節省費用）
+- 勝出語言連續多句信心偏低時重新開啟已關閉的語言（說話者可能換了語言）
+- 串流一直失敗的語言由 drop() 停用：不再等待它，也不再重新開啟
+- 結束位置不超過已決定語句的結果視為重播造成的重複而丟棄
+"""
+
+import threading
+import time
+
+from session_handoff import offset_seconds
+
+ARBITRATION_WAIT_SECONDS = 1.5  # 第一個最終結果到達後等待其他語言的時間
+UTTERANCE_TOLERANCE_SECONDS = 0.5  # 各語言斷句位置的容差
+DETECTION_BONUS = 0.2           # 偵測到的語言與候選語言相同時的加分
+LEADER_BONUS = 0.05             # 目前領先語言的加分（避免信心相近時來回切換）
+PRUNE_AFTER_LOSSES = 3          # 連續輸掉幾句後關閉該語言的串流
+PRUNE_MIN_CONFIDENCE = 0.7      # 勝出語言的信心達到此值時才關閉其他語言
+REPROBE_CONFIDENCE = 0.5        # 勝出語言信心低於此值的語句
+REPROBE_UTTERANCES = 2          # 連續幾句信心偏低時重新開啟所有語言
+
+
+def same_language(a, b):
+    """語言代碼是否相同（不分大小寫，"en" 與 "en-US" 視為相同）"""
+    if not a or not b:
+        return False
+    a, b = a.lower(), b.lower()
+    return a == b or a.split("-")[0] == b or b.split("-")[0] == a
+
+
+class Candidate:
+    """某個語言對一段音頻的最終結果"""
+
+    def __init__(self, language, transcript, result, audio_start, audio_end, received_at, stream=None):
+        self.language = language
+        self.transcript = transcript
+        self.confidence = result.alternatives[0].confidence if result.alternatives else 0.0
+        self.detected = getattr(result, "language_code", "") or ""
+        self.result = result
+        self.audio_start = audio_start
+        self.audio_end = audio_end
+        self.received_at = received_at
+        self.stream = stream
+
+
+class Decision:
+    """一個語句的選擇結果：勝出語言、合併後的文字與各語言分數"""
+
+    def __init__(self, language, candidates, scores, audio_start, audio_end, decided_at):
+        self.language = language
+        self.candidates = candidates  # 勝出語言的結果（依音頻位置排列）
+        self.transcript = " ".join(candidate.transcript for candidate in candidates)
+        self.confidence = max(candidate.confidence for candidate in candidates)
+        self.scores = scores
+        self.audio_start = audio_start
+        self.audio_end = audio_end
+        self.decided_at = decided_at
+        self.pruned = []    # 這一句之後關閉的語言
+        self.reprobed = []  # 這一句之後重新開啟的語言
+
+    @property
+    def spoken_language(self):
+        """勝出的語言；auto 串流勝出時為它偵測到的語言"""
+        if self.language.lower() == "auto":
+            return next((candidate.detected for candidate in self.candidates if candidate.detected), self.language)
+        return self.language
+
+    @property
+    def wait_ms(self):
+        """第一個最終結果到達到決定之間的等待時間"""
+        return (self.decided_at - min(candidate.received_at for candidate in self.candidates)) * 1000
+
+
+class LanguageRouter:
+    """
+    逐句語言選擇器（執行緒安全）
+    submit() 收到各語言串流的最終結果，poll() 由監督迴圈定期呼叫處理等待逾時；
+    決定後依序呼叫 on_decision(decision)，關閉語言時呼叫 on_prune(language)，
+    重新開啟時呼叫 on_reprobe([languages])
+    """
+
+    def __init__(self, languages, on_decision, on_prune=None, on_reprobe=None,
+                 wait_seconds=ARBITRATION_WAIT_SECONDS, prune_after=PRUNE_AFTER_LOSSES):
+        if not languages:
+            raise ValueError("至少需要一個語言")
+        self.languages = list(languages)
+        self.active = list(languages)
+        self.leader = self.languages[0]
+        self.on_decision = on_decision
+        self.on_prune = on_prune
+        self.on_reprobe = on_reprobe
+        self.wait_seconds = wait_seconds
+        self.prune_after = prune_after
+
+        self.wins = {language: 0 for language in languages}
+        self.utterances = 0
+        self.duplicates = 0
+        self.pruned = 0
+        self.reprobes = 0
+        self.dropped = []  # 停用的語言
+        self._losses = {language: 0 for language in languages}
+        self._low_confidence = 0
+        self._pending = {language: [] for language in languages}
+        self._first_at = None
+        self._decided_end = 0.0
+        self._lock = threading.Lock()
+
+    def submit(self, candidate):
+        """收到某個語言的最終結果"""
+        with self._lock:
+            if candidate.language not in self.active:
+                return
+            if self.utterances and candidate.audio_end is not None \
+                    and candidate.audio_end <= self._decided_end + UTTERANCE_TOLERANCE_SECONDS:
+                # 重新開啟或交接時重播的音頻，這一句已經決定過（第一次決定之前沒有已決定的範圍）
+                self.duplicates += 1
+                return
+            self._pending[candidate.language].append(candidate)
+            if self._first_at is None:
+                self._first_at = time.time()
+            decisions = self._decide_ready_locked(time.time())
+        self._dispatch(decisions)
+
+    def drop(self, language):
+        """停用語言（串流無法使用）：之後的語句不再等待它，重新偵測時也不開啟"""
+        with self._lock:
+            if language in self.dropped:
+                return
+            self.dropped.append(language)
+            if language in self.active:
+                self.active.remove(language)
+            self._pending[language] = []
+            if self.leader == language and self.active:
+                self.leader = self.active[0]
+            decisions = self._decide_ready_locked(time.time())
+        self._dispatch(decisions)
+
+    def poll(self):
+        """處理等待逾時的語句"""
+        with self._lock:
+            decisions = self._decide_ready_locked(time.time())
+        self._dispatch(decisions)
+
+    def flush(self):
+        """音頻結束：不再等待，決定所有剩下的結果"""
+        with self._lock:
+            decisions = []
+            while any(self._pending[language] for language in self.active):
+                decisions.append(self._decide_locked(time.time()))
+        self._dispatch(decisions)
+
+    def _target_end_locked(self):
+        """目前語句的結束位置：最早到達的最終結果的結束位置"""
+        first = min((pending[0] for pending in (self._pending[language] for language in self.active) if pending),
+                    key=lambda candidate: candidate.received_at)
+        return first.audio_end
+
+    def _decide_ready_locked(self, now):
+        decisions = []
+        while any(self._pending[language] for language in self.active):
+            target = self._target_end_locked()
+            ready = all(
+                any(target is None or candidate.audio_end is None
+                    or candidate.audio_end >= target - UTTERANCE_TOLERANCE_SECONDS
+                    for candidate in self._pending[language])
+                for language in self.active
+            )
+            if not ready and now - self._first_at < self.wait_seconds:
+                break
+            decisions.append(self._decide_locked(now))
+        return decisions
+
+    def _decide_locked(self, now):
+        target = self._target_end_locked()
+        limit = None if target is None else target + UTTERANCE_TOLERANCE_SECONDS
+
+        # 每個語言取結束位置在這一句之內的結果
+        groups = {}
+        for language in self.active:
+            pending = self._pending[language]
+            taken = [candidate for candidate in pending
+                     if limit is None or candidate.audio_end is None or candidate.audio_end <= limit]
+            if not taken and pending:
+                # 這個語言的斷句比較長：取第一個結果
+                taken = pending[:1]
+            if taken:
+                groups[language] = taken
+
+        # 偵測到的語言投票：串流通常回報自己要求的語言，只有回報其他語言（例如 auto 串流）時才有資訊
+        votes = {}
+        for candidates in groups.values():
+            for candidate in candidates:
+                if same_language(candidate.detected, candidate.language):
+                    continue
+                for language in self.active:
+                    if same_language(candidate.detected, language):
+                        votes[language] = votes.get(language, 0) + 1
+                        break
+
+        scores = {}
+        for language, candidates in groups.items():
+            total = sum(len(candidate.transcript) for candidate in candidates) or 1
+            confidence = sum(candidate.confidence * len(candidate.transcript) for candidate in candidates) / total
+            score = confidence
+            if votes.get(language):
+                score += DETECTION_BONUS
+            if language == self.leader:
+                score += LEADER_BONUS
+            scores[language] = round(score, 3)
+        winner = max(scores, key=lambda language: (scores[language], language == self.leader))
+        chosen = groups[winner]
+
+        audio_ends = [candidate.audio_end for candidate in chosen if candidate.audio_end is not None]
+        audio_end = max(audio_ends) if audio_ends else self._decided_end
+        decision = Decision(winner, chosen, scores, self._decided_end, audio_end, now)
+
+        # 已決定的範圍內的結果全部移除（包括其他語言斷在稍後的同一句）
+        self._decided_end = max(self._decided_end, audio_end)
+        for language in self.languages:
+            self._pending[language] = [
+                candidate for candidate in self._pending[language]
+                if candidate not in chosen and candidate.audio_end is not None
+                and candidate.audio_end > self._decided_end + UTTERANCE_TOLERANCE_SECONDS
+            ]
+        self._first_at = now if any(self._pending[language] for language in self.active) else None
+
+        self._update_streaks_locked(decision)
+        return decision
+
+    def _update_streaks_locked(self, decision):
+        """記錄勝負並決定要關閉或重新開啟的語言"""
+        winner = decision.language
+        self.utterances += 1
+        self.wins[winner] += 1
+        self.leader = winner
+        self._losses[winner] = 0
+
+        for language in self.active:
+            if language != winner:
+                self._losses[language] += 1
+        if decision.confidence >= PRUNE_MIN_CONFIDENCE:
+            for language in list(self.active):
+                if language != winner and self._losses[language] >= self.prune_after:
+                    self.active.remove(language)
+                    self._pending[language] = []
+                    self.pruned += 1
+                    decision.pruned.append(language)
+
+        closed = [language for language in self.languages
+                  if language not in self.active and language not in self.dropped]
+        if closed and decision.confidence < REPROBE_CONFIDENCE:
+            self._low_confidence += 1
+            if self._low_confidence >= REPROBE_UTTERANCES:
+                decision.reprobed = closed
+                for language in decision.reprobed:
+                    self.active.append(language)
+                    self._losses[language] = 0
+                self.reprobes += 1
+                self._low_confidence = 0
+        else:
+            self._low_confidence = 0
+
+    def _dispatch(self, decisions):
+        # 在鎖外呼叫回調（回調會開關串流、顯示與保存結果）
+        for decision in decisions:
+            self.on_decision(decision)
+            if decision.pruned and self.on_prune:
+                for language in decision.pruned:
+                    self.on_prune(language)
+            if decision.reprobed and self.on_reprobe:
+                self.on_reprobe(decision.reprobed)
+
+    def report(self):
+        wins = "、".join(f"{language} {self.wins[language]} 句" for language in self.languages)
+        line = f"{self.utterances} 句（{wins}）"
+        if self.pruned:
+            line += f"，提前關閉 {self.pruned} 個語言串流"
+        if self.reprobes:
+            line += f"，重新偵測 {self.reprobes} 次"
+        if self.duplicates:
+            line += f"，丟棄重複結果 {self.duplicates} 個"
+        if self.dropped:
+            line += f"，停用 {'、'.join(self.dropped)}（串流一直失敗）"
+        return line
+
+
+def candidate_from_result(language, result, transcript, audio_start, received_at, stream=None):
+    """由串流結果建立候選；audio_start 為該串流第一個音頻在整體時間軸上的位置（秒）"""
+    end_offset = offset_seconds(getattr(result, "result_end_offset", None))
+    audio_end = audio_start + end_offset if end_offset else None
+    return Candidate(language, transcript, result, audio_start, audio_end, received_at, stream)
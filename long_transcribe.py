@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+長音頻分段轉錄
+同步 recognize 只能處理約 1 分鐘的音頻；這裡把長檔案在靜音處切成 API 可接受的片段，
+平行轉錄後依序拼接，並以單詞時間偏移去除片段重疊處的重複單詞
+
+- 以 audio_sources.FileSource 串流解碼（WAV / FLAC），同一時間只保留一個片段與進行中的請求，
+  記憶體用量與檔案長度無關
+- 片段在 min_seconds 之後遇到第一個靜音塊就切開；到 max_seconds 仍沒有靜音時，
+  在能量最低處強制切開並讓下一段重疊 overlap_seconds，重疊區以中點為界分配單詞
+
+    python long_transcribe.py meeting.wav -o meeting.txt --workers 4
+"""
+
+import argparse
+import io
+import json
+import sys
+import time
+import wave
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+from google.cloud.speech_v2.types import cloud_speech
+
+from audio_sources import FileSource
+from batch_transcribe import MAX_RETRIES, RateLimiter, recognize_with_retries
+from chirp_transcribe import build_recognize_request
+from session_handoff import offset_seconds, strip_overlap
+from speech_connection import DEFAULT_REGION, get_speech_client
+from vad import create_detector
+
+RATE = 16000
+CHUNK = int(RATE / 10)  # 100ms 分析單位
+BYTES_PER_SECOND = RATE * 2
+
+MIN_SEGMENT_SECONDS = 20
+MAX_SEGMENT_SECONDS = 55  # 同步 recognize 上限約 60 秒
+OVERLAP_SECONDS = 1.0  # 強制切開時的重疊長度
+DEFAULT_WORKERS = 4
+
+
+class Segment:
+    """一段待轉錄的音頻"""
+
+    def __init__(self, index, start, pcm, overlap):
+        self.index = index
+        self.start = start      # 在整個檔案中的起始時間（秒）
+        self.pcm = pcm
+        self.overlap = overlap  # 與上一段重疊的秒數
+
+    @property
+    def duration(self):
+        return len(self.pcm) / BYTES_PER_SECOND
+
+    @property
+    def own_start(self):
+        """此片段負責的起點：重疊區的中點之後的單詞歸這一段"""
+        return self.start + self.overlap / 2
+
+    def wav_bytes(self):
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(RATE)
+            wav.writeframes(self.pcm)
+        return buffer.getvalue()
+
+
+def split_at_silence(chunks, min_seconds=MIN_SEGMENT_SECONDS, max_seconds=MAX_SEGMENT_SECONDS,
+                     overlap_seconds=OVERLAP_SECONDS, detector=None):
+    """
+    把 16-bit 單聲道 PCM 音頻塊切成片段（生成器）
+    只保留目前片段的音頻塊，最多 max_seconds
+    """
+    detector = detector or create_detector("energy", RATE)
+    min_bytes = int(min_seconds * BYTES_PER_SECOND)
+    max_bytes = int(max_seconds * BYTES_PER_SECOND)
+    overlap_bytes = int(overlap_seconds * BYTES_PER_SECOND)
+
+    index = 0
+    start_bytes = 0       # 目前片段在整個檔案中的起點
+    overlap = 0.0
+    chunks_in_segment = []  # (pcm, 能量)
+    size = 0
+
+    def emit(count):
+        nonlocal index
+        pcm = b"".join(data for data, _ in chunks_in_segment[:count])
+        segment = Segment(index, start_bytes / BYTES_PER_SECOND, pcm, overlap)
+        index += 1
+        return segment
+
+    for data in chunks:
+        samples = np.frombuffer(data, dtype=np.int16).astype(np.float32)
+        energy = float(np.mean(samples * samples)) if len(samples) else 0.0
+        silent = not detector.is_speech(data)
+        chunks_in_segment.append((data, energy))
+        size += len(data)
+
+        if size >= min_bytes and silent:
+            # 在靜音處切開，不需要重疊
+            yield emit(len(chunks_in_segment))
+            start_bytes += size
+            chunks_in_segment, size, overlap = [], 0, 0.0
+        elif size >= max_bytes:
+            # 沒有靜音：在 min_seconds 之後能量最低的音頻塊之後切開，下一段往前重疊
+            offsets = np.cumsum([len(d) for d, _ in chunks_in_segment])
+            candidates = [i for i in range(len(chunks_in_segment)) if offsets[i] >= min_bytes] or \
+                [len(chunks_in_segment) - 1]
+            cut = min(candidates, key=lambda i: chunks_in_segment[i][1]) + 1
+            yield emit(cut)
+
+            cut_bytes = int(offsets[cut - 1])
+            keep_from = cut
+            kept_overlap = 0
+            while keep_from > 0 and kept_overlap < overlap_bytes:
+                keep_from -= 1
+                kept_overlap += len(chunks_in_segment[keep_from][0])
+            start_bytes += cut_bytes - kept_overlap
+            overlap = kept_overlap / BYTES_PER_SECOND
+            chunks_in_segment = chunks_in_segment[keep_from:]
+            size = sum(len(d) for d, _ in chunks_in_segment)
+
+    if chunks_in_segment and size > overlap * BYTES_PER_SECOND:
+        yield emit(len(chunks_in_segment))
+
+
+def transcribe_segment(client, segment, args, limiter):
+    """
+    轉錄一個片段，回傳 (片段, 單元列表, 是否有單詞時間)
+    單元為 (全域開始秒數, 結束秒數, 文字)
+    """
+    features = cloud_speech.RecognitionFeatures(enable_word_time_offsets=True)
+    make_request = lambda: build_recognize_request(
+        segment.wav_bytes(), [args.language], model=args.model, region=args.region, features=features)
+    response, _ = recognize_with_retries(client, make_request, limiter, args.max_retries, args.timeout)
+
+    units = []
+    timed = True
+    previous_end = 0.0
+    for result in response.results:
+        if not result.alternatives:
+            continue
+        alternative = result.alternatives[0]
+        end = offset_seconds(result.result_end_offset) or segment.duration
+        if alternative.words:
+            for word in alternative.words:
+                units.append((segment.start + offset_seconds(word.start_offset),
+                              segment.start + offset_seconds(word.end_offset), word.word))
+        elif alternative.transcript.strip():
+            # 沒有單詞時間：整個結果視為一個單元，從上一個結果結束處開始
+            timed = False
+            units.append((segment.start + previous_end, segment.start + end, alternative.transcript.strip()))
+        previous_end = end
+    return segment, units, timed
+
+
+class Stitcher:
+    """
+    依片段順序拼接結果
+    暫存上一段的單元，下一段到達時丟掉上一段落在下一段負責範圍內的單元
+    """
+
+    def __init__(self, write):
+        self.write = write
+        self._held = []
+        self._strip = False
+        self._last_text = ""
+        self.words = 0
+
+    def add(self, segment, units, timed):
+        own_start = segment.own_start
+        if segment.overlap:
+            self._held = [u for u in self._held if u[0] < own_start]
+        self._flush()
+        if not segment.overlap:
+            self._held = list(units)
+        elif timed:
+            self._held = [u for u in units if u[0] >= own_start]
+        else:
+            # 沒有單詞時間的單元涵蓋整個結果，開頭常落在重疊區內：只要結尾超過分界就保留，重複的單詞由文字比對去除
+            self._held = [u for u in units if u[1] > own_start]
+        # 沒有單詞時間的重疊片段只能以文字比對去除重複
+        self._strip = bool(segment.overlap) and not timed
+
+    def _flush(self):
+        if not self._held:
+            return
+        text = " ".join(u[2] for u in self._held)
+        if self._strip and self._last_text:
+            text = strip_overlap(self._last_text, text)
+        if text:
+            self.write(self._held, text)
+            self._last_text = text
+            self.words += len(text.split())
+        self._held = []
+
+    def close(self):
+        self._flush()
+
+
+def transcribe_long_file(path, args, write):
+    """分段平行轉錄長音頻，依序以 write(units, text) 輸出，回傳統計"""
+    client = get_speech_client(args.region)
+    limiter = RateLimiter(args.rate)
+    stitcher = Stitcher(write)
+    source = FileSource(path, RATE, CHUNK)
+    segments = split_at_silence(source.frames(), args.min_seconds, args.max_seconds, args.overlap)
+
+    stats = {"segments": 0, "audio_seconds": 0.0, "forced_cuts": 0}
+    started = time.time()
+    limit = args.workers * 2
+
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        in_flight = set()
+        ready = {}
+        next_index = 0
+        exhausted = False
+        while True:
+            # 進行中加上等待拼接的片段數有上限，記憶體不隨檔案長度成長
+            while not exhausted and len(in_flight) + len(ready) < limit:
+                segment = next(segments, None)
+                if segment is None:
+                    exhausted = True
+                    break
+                stats["segments"] += 1
+                stats["audio_seconds"] = segment.start + segment.duration
+                stats["forced_cuts"] += bool(segment.overlap)
+                in_flight.add(pool.submit(transcribe_segment, client, segment, args, limiter))
+            if not in_flight and not ready:
+                break
+
+            if in_flight:
+                completed, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in completed:
+                    segment, units, timed = future.result()
+                    segment.pcm = b""  # 已轉錄，釋放音頻
+                    ready[segment.index] = (segment, units, timed)
+            while next_index in ready:
+                stitcher.add(*ready.pop(next_index))
+                next_index += 1
+
+    stitcher.close()
+    stats["words"] = stitcher.words
+    stats["elapsed"] = time.time() - started
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="長音頻分段平行轉錄")
+    parser.add_argument("audio_file", help="WAV 或 FLAC 檔")
+    parser.add_argument("-o", "--output", help="輸出文字檔（預設輸出到螢幕）")
+    parser.add_argument("--words-jsonl", help="另存含時間的單詞（JSONL）")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--rate", type=float, default=5.0, help="每秒請求數上限（0 表示不限制）")
+    parser.add_argument("--min-seconds", type=float, default=MIN_SEGMENT_SECONDS)
+    parser.add_argument("--max-seconds", type=float, default=MAX_SEGMENT_SECONDS)
+    parser.add_argument("--overlap", type=float, default=OVERLAP_SECONDS, help="強制切開時的重疊秒數")
+    parser.add_argument("--max-retries", type=int, default=MAX_RETRIES)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--language", default="en-US")
+    parser.add_argument("--model", default="chirp")
+    parser.add_argument("--region", default=DEFAULT_REGION)
+    args = parser.parse_args()
+
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    words_file = open(args.words_jsonl, "w", encoding="utf-8") if args.words_jsonl else None
+
+    def write(units, text):
+        output.write(text + "\n")
+        output.flush()
+        if words_file:
+            for start, end, word in units:
+                words_file.write(json.dumps({"start": round(start, 3), "end": round(end, 3), "word": word},
+                                            ensure_ascii=False) + "\n")
+
+    print(f"🎯 長音頻轉錄: {args.audio_file}", file=sys.stderr)
+    try:
+        stats = transcribe_long_file(args.audio_file, args, write)
+    finally:
+        if args.output:
+            output.close()
+        if words_file:
+            words_file.close()
+
+    speed = stats["audio_seconds"] / stats["elapsed"] if stats["elapsed"] else 0.0
+    print(f"📊 {stats['audio_seconds']:.0f} 秒音頻，{stats['segments']} 個片段（強制切開 {stats['forced_cuts']} 次），"
+          f"{stats['words']} 個單詞，耗時 {stats['elapsed']:.1f} 秒（{speed:.0f}x 即時）", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+行程內延遲指標
+從說話到看見綠色文字之間經過錄音回調、緩衝區、會話佇列、gRPC 上傳、識別、大小寫修正與終端顯示，
+這裡以直方圖記錄各階段耗時：
+- MetricsRegistry 以名稱管理直方圖，observe() 記錄一筆毫秒數
+- 直方圖使用固定的累積桶（與 Prometheus 相同），記憶體固定，百分位數由桶內插估計
+- start_metrics_server() 以 HTTP 提供 Prometheus 文字格式（/metrics）
+- SummaryReporter 定期輸出一行摘要（只統計上次摘要之後的資料）
+未啟用時呼叫端持有 None，只多一次屬性判斷，不建立任何物件
+"""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_PREFIX = "stt_"
+METRICS_PORT = 9464
+SUMMARY_INTERVAL_SECONDS = 30  # 摘要行的輸出間隔
+
+# 毫秒桶：涵蓋微秒級的本地處理到數秒的識別延遲
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 150, 200, 300, 500,
+                      750, 1000, 1500, 2000, 3000, 5000, 10000)
+
+
+class Histogram:
+    """累積桶直方圖（執行緒安全）"""
+
+    def __init__(self, name, help_text="", buckets=LATENCY_BUCKETS_MS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # 最後一格為 +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = 0
+        for bound in self.buckets:
+            if value <= bound:
+                break
+            index += 1
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+            if value > self._max:
+                self._max = value
+
+    def snapshot(self):
+        """回傳 (各桶計數, 總和, 筆數, 最大值) 的副本"""
+        with self._lock:
+            return list(self._counts), self._sum, self._count, self._max
+
+    def quantile(self, q, counts=None):
+        """由桶計數線性內插估計分位數（q 為 0-1）；沒有資料時回傳 None"""
+        if counts is None:
+            counts = self.snapshot()[0]
+        total = sum(counts)
+        if not total:
+            return None
+        rank = q * total
+        cumulative = 0
+        for index, count in enumerate(counts):
+            if cumulative + count >= rank and count:
+                if index == len(self.buckets):
+                    # 落在 +Inf 桶時只能回報最後一個邊界
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+
+class MetricsRegistry:
+    """以名稱管理直方圖；observe() 遇到新名稱時自動建立"""
+
+    def __init__(self, descriptions=None, prefix=METRICS_PREFIX):
+        self.prefix = prefix
+        self._histograms = {}
+        self._lock = threading.Lock()
+        for name, help_text in (descriptions or {}).items():
+            self.histogram(name, help_text)
+
+    def histogram(self, name, help_text="", buckets=LATENCY_BUCKETS_MS):
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, Histogram(name, help_text, buckets))
+        return histogram
+
+    def observe(self, name, value):
+        self.histogram(name).observe(value)
+
+    def histograms(self):
+        with self._lock:
+            return list(self._histograms.values())
+
+    def render_prometheus(self):
+        """Prometheus 文字格式（text/plain; version=0.0.4）"""
+        lines = []
+        for histogram in self.histograms():
+            name = self.prefix + histogram.name
+            counts, total, count, _ = histogram.snapshot()
+            if histogram.help_text:
+                lines.append(f"# HELP {name} {histogram.help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{{le="{bound:g}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{le="+Inf"}} {count}')
+            lines.append(f"{name}_sum {total:.3f}")
+            lines.append(f"{name}_count {count}")
+        return "\n".join(lines) + "\n"
+
+
+class SummaryReporter:
+    """
+    定期輸出各直方圖的 p50 / p95（只統計上一次摘要之後的資料）
+    emit 為接收一行文字的函數，例如 print 或 TerminalRenderer.print_line
+    """
+
+    def __init__(self, registry, emit=print, interval=SUMMARY_INTERVAL_SECONDS, labels=None):
+        self.registry = registry
+        self.emit = emit
+        self.interval = interval
+        self.labels = labels or {}
+        self._previous = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def summary(self):
+        """回傳自上次呼叫以來的摘要行；沒有新資料時回傳 None"""
+        parts = []
+        for histogram in self.registry.histograms():
+            counts = histogram.snapshot()[0]
+            previous = self._previous.get(histogram.name, [0] * len(counts))
+            self._previous[histogram.name] = counts
+            window = [now - before for now, before in zip(counts, previous)]
+            if not sum(window):
+                continue
+            p50 = histogram.quantile(0.5, window)
+            p95 = histogram.quantile(0.95, window)
+            label = self.labels.get(histogram.name, histogram.name)
+            parts.append(f"{label} {_format_ms(p50)}/{_format_ms(p95)}")
+        if not parts:
+            return None
+        return "延遲 p50/p95 (ms): " + " · ".join(parts)
+
+    def start(self):
+        def run():
+            while not self._stop.wait(self.interval):
+                line = self.summary()
+                if line:
+                    self.emit(f"⏱️ {line}")
+        self._thread = threading.Thread(target=run, name="metrics-summary", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+def _format_ms(value):
+    if value is None:
+        return "-"
+    return f"{value:.0f}" if value >= 10 else f"{value:.1f}"
+
+
+def start_metrics_server(registry, port=METRICS_PORT, host="127.0.0.1"):
+    """在背景執行緒提供 http://host:port/metrics；回傳 server，呼叫 shutdown() 停止"""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # 不在終端輸出每次抓取的存取記錄
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def elapsed_ms(started):
+    """從 time.perf_counter() 的起點到現在的毫秒數"""
+    return (time.perf_counter() - started) * 1000
@@ -8,10 +8,11 @@ import os
 import threading
 import time
 import queue
-import pyaudio
-from google.api_core.client_options import ClientOptions
-from google.cloud.speech_v2 import SpeechClient
+import argparse
 from google.cloud.speech_v2.types import cloud_speech
+from google.protobuf import duration_pb2
+from audio_sources import MicrophoneSource, add_source_arguments, open_source
+from speech_connection import get_speech_client
 
 PROJECT_ID = os.getenv("GOOGLE_CLOUD_PROJECT")
 
@@ -21,16 +22,13 @@ CHUNK = int(RATE / 10)  # 100ms 的音頻數據
 
 
 class RealTimeTranscriber:
-    def __init__(self, region="us-central1", language_code="auto"):
-        self.client = SpeechClient(
-            client_options=ClientOptions(
-                api_endpoint=f"{region}-speech.googleapis.com",
-            )
-        )
+    def __init__(self, region="us-central1", language_code="auto", source=None):
+        self.client = get_speech_client(region)
         self.region = region
         self.language_code = language_code
         self.audio_queue = queue.Queue()
         self.recording = False
+        self.source = source or MicrophoneSource(RATE, CHUNK)
         
     def get_config(self):
         """獲取 Chirp 語音識別配置"""
@@ -56,43 +54,26 @@ class RealTimeTranscriber:
     
     def record_audio(self):
         """錄製音頻線程"""
-        p = pyaudio.PyAudio()
+        if isinstance(self.source, MicrophoneSource):
+            # 檢查麥克風設備
+            try:
+                devices = MicrophoneSource.list_devices()
+                print(f"🎤 檢測到 {len(devices)} 個音頻輸入設備")
+            except Exception as e:
+                print(f"⚠️  音頻設備檢測錯誤: {e}")
         
-        # 檢查麥克風設備
-        try:
-            # 列出可用的音頻設備
-            device_count = p.get_device_count()
-            print(f"🎤 檢測到 {device_count} 個音頻設備")
-            
-            # 尋找默認輸入設備
-            default_input = p.get_default_input_device_info()
-            print(f"🎙️  使用麥克風: {default_input['name']}")
-            
-        except Exception as e:
-            print(f"⚠️  音頻設備檢測錯誤: {e}")
+        def on_audio(data):
+            if self.recording:  # 再次檢查，避免停止時還在添加數據
+                self.audio_queue.put(data)
         
-        stream = None
         try:
-            stream = p.open(
-                format=pyaudio.paInt16,
-                channels=1,
-                rate=RATE,
-                input=True,
-                frames_per_buffer=CHUNK,
-                input_device_index=None,  # 使用默認麥克風
-            )
-            
-            print("✅ 麥克風已連接，開始錄音...")
+            # 來源結束時（例如檔案播放完畢）通知音頻生成器停止
+            self.source.start(on_audio, on_end=lambda: self.audio_queue.put(None))
+            print(f"✅ 已連接音頻來源: {self.source.describe()}")
             print("🔊 請說話...")
             
-            while self.recording:
-                try:
-                    data = stream.read(CHUNK, exception_on_overflow=False)
-                    if self.recording:  # 再次檢查，避免停止時還在添加數據
-                        self.audio_queue.put(data)
-                except Exception as e:
-                    print(f"讀取音頻錯誤: {e}")
-                    break
+            while self.recording and not self.source.wait(timeout=0.5):
+                pass
                 
         except Exception as e:
             print(f"❌ 麥克風錯誤: {e}")
@@ -102,10 +83,7 @@ class RealTimeTranscriber:
             print("   3. 允許終端機存取麥克風")
             self.recording = False
         finally:
-            if stream:
-                stream.stop_stream()
-                stream.close()
-            p.terminate()
+            self.source.stop()
     
     def create_streaming_requests(self):
         """創建流式請求生成器"""
@@ -120,8 +98,8 @@ class RealTimeTranscriber:
                 streaming_features=cloud_speech.StreamingRecognitionFeatures(
                     interim_results=True,  # 顯示中間結果
                     voice_activity_timeout=cloud_speech.StreamingRecognitionFeatures.VoiceActivityTimeout(
-                        speech_start_timeout=15,  # 等待開始說話的時間
-                        speech_end_timeout=15,    # 檢測到說話結束後的等待時間
+                        speech_start_timeout=duration_pb2.Duration(seconds=15),  # 等待開始說話的時間
+                        speech_end_timeout=duration_pb2.Duration(seconds=15),    # 檢測到說話結束後的等待時間
                     ),
                 ),
             ),
@@ -229,6 +207,9 @@ class RealTimeTranscriber:
 
 
 def main():
+    parser = add_source_arguments(argparse.ArgumentParser(description="實時語音轉文字"))
+    args = parser.parse_args()
+    
     if not PROJECT_ID:
         print("❌ 錯誤: 請設置 GOOGLE_CLOUD_PROJECT 環境變量")
         print("執行: export GOOGLE_CLOUD_PROJECT=your-project-id")
@@ -258,7 +239,8 @@ def main():
     print(f"🗣️  語言設置: {language}")
     
     # 創建轉錄器
-    transcriber = RealTimeTranscriber(language_code=language)
+    source = open_source(args.source, RATE, CHUNK, speed=args.speed, loop=args.loop)
+    transcriber = RealTimeTranscriber(language_code=language, source=source)
     
     # 開始轉錄
     transcriber.start_streaming()
@@ -6,24 +6,75 @@
 
 import os
 import sys
-import json
 import threading
 import time
-from queue import Queue
-import pyaudio
-import re
-from google.cloud.speech_v2 import SpeechClient
+import queue
+from collections import deque
+import argparse
 from google.cloud.speech_v2.types import cloud_speech
+from google.protobuf import duration_pb2
+from speech_connection import SpeechConnectionManager
+from speech_resources import use_server_resources
+from capitalization import PhraseCorrector
+from session_handoff import FinalDeduplicator, offset_seconds
+from audio_buffer import BLOCK, PCMRingBuffer
+from audio_sources import MicrophoneSource, add_source_arguments, open_source
+from vad import VADGate, create_detector
+from terminal_renderer import TerminalRenderer
+from custom_vocabulary import VOCABULARY_FILE
+from vocabulary_store import get_vocabulary_store
+from transcript_sink import TranscriptWriter, create_sink, make_record
+from metrics import Histogram, MetricsRegistry, SummaryReporter, elapsed_ms, start_metrics_server
 
 # 設置環境變量
 os.environ['GOOGLE_CLOUD_PROJECT'] = 'lithe-window-713'
 
 # 音頻參數
 RATE = 16000
+LANGUAGE_CODE = "en-US"
 CHUNK = int(RATE / 10)  # 100ms 緩衝
-FORMAT = pyaudio.paInt16
+BUFFER_SECONDS = 30  # 音頻緩衝區容量（秒）
+OVERFLOW_POLICY = "drop_oldest"  # 緩衝區滿時的策略: drop_oldest / block / spill
+VAD_ENABLED = True  # 本地語音活動檢測：長時間靜音不上傳
+VAD_DETECTOR = "energy"  # energy（能量+過零率）或 webrtc
+
+# 會話交接參數
+SESSION_ROLLOVER_SECONDS = 280  # 4分40秒，接近5分鐘限制時交接
+HANDOFF_MODE = True  # 先開啟下一個會話再關閉目前會話
+HANDOFF_OVERLAP_SECONDS = 2.0  # 交接時重播到新會話的最近音頻長度（秒）
+DUPLICATE_TOLERANCE_SECONDS = 0.1  # 跨會話去重的結束偏移容差
+SESSION_QUEUE_CHUNKS = 100  # 每個會話最多暫存的音頻塊數（約 10 秒）
+PREWARM_LEAD_SECONDS = 5  # 交接前多久預先開啟下一個流式呼叫
 CHANNELS = 1
 
+# 轉錄保存參數
+SAVE_INTERIMS = False  # 除最終結果外也保存中間結果
+SENT_HISTORY_CHUNKS = 3000  # 每個會話記錄最近多少個音頻塊的送出時間（約 5 分鐘），用於計算結果延遲
+
+# 單詞時間：開啟後最終結果附帶每個單詞的音頻位置與錄音時間，並以語音結尾計算延遲
+WORD_TIME_OFFSETS = False
+
+# 延遲指標（預設關閉；關閉時各階段只多一次 None 判斷）
+METRICS_ENABLED = False
+CAPTURE_HISTORY_CHUNKS = 10000  # 最多記錄多少個尚未讀出的錄音塊時間
+LATENCY_STAGES = {
+    # 名稱: (摘要行標籤, 說明)
+    "buffer_dwell_ms": ("緩衝區", "錄音回調到從音頻緩衝區讀出"),
+    "session_queue_ms": ("會話佇列", "放入會話音頻佇列到交給 gRPC 送出"),
+    "capture_to_send_ms": ("上傳", "錄音回調到交給 gRPC 送出"),
+    "first_interim_ms": ("首個中間結果", "語句開頭的音頻送出到第一個中間結果"),
+    "interim_latency_ms": ("中間結果", "結果最後一段音頻送出到收到中間結果"),
+    "final_latency_ms": ("最終結果", "結果最後一段音頻送出到收到最終結果"),
+    "capitalization_ms": ("詞彙修正", "最終結果的詞彙修正（大小寫，開啟時先模糊修正）"),
+    "render_ms": ("顯示", "終端顯示中間或最終結果"),
+    "speech_to_display_ms": ("端到端", "結果最後一段音頻的錄音回調到最終結果顯示完成"),
+    "audio_end_to_final_ms": ("語音結尾", "語句最後一個單詞結束的錄音時間到收到最終結果（需開啟單詞時間）"),
+}
+STAGE_LABELS = {name: label for name, (label, _) in LATENCY_STAGES.items()}
+
+# 伺服器端資源：詞彙與識別配置同步成 PhraseSet / Recognizer，會話只以名稱引用（見 speech_resources.py）
+SERVER_RESOURCES = False
+
 # 顏色代碼
 class Colors:
     GREY = '\033[90m'
@@ -36,269 +87,551 @@ class Colors:
     BOLD = '\033[1m'
     END = '\033[0m'
 
-def load_custom_vocabulary():
-    """載入自定義詞彙"""
-    try:
-        with open('custom_vocabulary.json', 'r', encoding='utf-8') as f:
-            vocab_data = json.load(f)
-        
-        phrases = []
-        count = 0
-        for category, terms in vocab_data.items():
-            phrases.extend(terms)
-            count += len(terms)
-        
-        print(f"📚 載入 {count} 個自定義詞彙")
-        if count > 0:
-            print(f"🚀 啟用詞彙適應性功能，提升專業術語識別準確度")
-            print(f"📝 載入的詞彙包括:")
-            # 顯示前 10 個詞彙
-            displayed = phrases[:10]
-            for term in displayed:
-                print(f"   • {term}")
-            if count > 10:
-                print(f"   ... 還有 {count - 10} 個")
-        
-        return phrases
-    except FileNotFoundError:
+def load_custom_vocabulary(transcripts=(), watch=False):
+    """
+    從共用詞彙庫取得編譯後的詞彙（行程內只解析、編譯一次，依最近轉錄中的命中次數排序、依配額分組）
+    watch 時同時開始監看詞彙檔，變化時在背景熱更新
+    """
+    vocabulary = get_vocabulary_store(VOCABULARY_FILE, transcripts, watch).vocabulary
+    
+    if not vocabulary.terms:
         print("📝 未找到自定義詞彙檔案，使用預設設定")
-        return []
-    except Exception as e:
-        print(f"⚠️ 載入詞彙時出錯: {e}")
-        return []
+        return vocabulary
+    
+    print(f"📚 載入 {len(vocabulary.terms)} 個自定義詞彙: {vocabulary.report()}")
+    print(f"🚀 啟用詞彙適應性功能，提升專業術語識別準確度")
+    print(f"📝 載入的詞彙包括:")
+    # 顯示排名前 10 的詞彙
+    for term in vocabulary.terms[:10]:
+        print(f"   • {term}")
+    if len(vocabulary.terms) > 10:
+        print(f"   ... 還有 {len(vocabulary.terms) - 10} 個")
+    return vocabulary
 
-def fix_capitalization(text, custom_phrases):
-    """修正文字中專有名詞的大小寫"""
-    if not custom_phrases:
-        return text
-    
-    result = text
-    
-    # 為每個自定義詞彙進行大小寫修正
-    for phrase in custom_phrases:
-        # 創建不區分大小寫的搜尋模式
-        # 使用單詞邊界來確保完整匹配，但允許一些標點符號
-        words = phrase.split()
-        
-        if len(words) == 1:
-            # 單詞匹配：使用單詞邊界
-            pattern = r'\b' + re.escape(phrase.lower()) + r'\b'
-        else:
-            # 多詞匹配：更靈活的匹配
-            pattern = r'\b' + r'\s+'.join(re.escape(word.lower()) for word in words) + r'\b'
-        
-        def replace_func(match):
-            return phrase  # 返回正確的大小寫版本
-        
-        # 不區分大小寫的替換
-        result = re.sub(pattern, replace_func, result, flags=re.IGNORECASE)
+def build_recognition_config(vocabulary, word_offsets=WORD_TIME_OFFSETS, language_codes=None):
+    """創建識別配置（speech_resources.py 同步伺服器端識別器、多語言模式的各語言串流也使用）"""
+    # 詞彙適應配置（依配額分成多個 PhraseSet，各分類有各自的加權）
+    adaptation = vocabulary.adaptation()
     
-    return result
+    # 識別配置
+    recognition_config = cloud_speech.RecognitionConfig(
+        explicit_decoding_config=cloud_speech.ExplicitDecodingConfig(
+            encoding=cloud_speech.ExplicitDecodingConfig.AudioEncoding.LINEAR16,
+            sample_rate_hertz=RATE,
+            audio_channel_count=CHANNELS,
+        ),
+        language_codes=language_codes or [LANGUAGE_CODE],  # 支持的語言
+        model="chirp_2",
+        features=cloud_speech.RecognitionFeatures(
+            enable_automatic_punctuation=True,
+            enable_word_time_offsets=word_offsets,
+            max_alternatives=1,
+        ),
+    )
+    
+    if adaptation:
+        recognition_config.adaptation = adaptation
+    
+    return recognition_config
+
+def build_streaming_config(recognition_config):
+    """創建流式識別配置"""
+    return cloud_speech.StreamingRecognitionConfig(
+        config=recognition_config,
+        streaming_features=cloud_speech.StreamingRecognitionFeatures(
+            interim_results=True,
+            voice_activity_timeout=cloud_speech.StreamingRecognitionFeatures.VoiceActivityTimeout(
+                speech_start_timeout=duration_pb2.Duration(seconds=15),
+                speech_end_timeout=duration_pb2.Duration(seconds=15),
+            ),
+        ),
+    )
 
 class AudioStreamer:
-    """音頻流處理器"""
+    """音頻流處理器 - 預設使用麥克風，也可以接上任何 AudioSource（檔案、stdin、socket）"""
     
-    def __init__(self):
-        self.audio_queue = Queue()
+    def __init__(self, buffer_seconds=BUFFER_SECONDS, overflow=OVERFLOW_POLICY, vad=VAD_ENABLED, source=None,
+                 metrics=None, track_capture=False):
+        self.source = source or MicrophoneSource(RATE, CHUNK)
+        if not self.source.live:
+            # 檔案來源可以等待，緩衝區滿時阻塞而不是丟棄
+            overflow = BLOCK
+        # 固定容量環形緩衝區（16-bit 單聲道，每幀 2 字節）
+        self.audio_buffer = PCMRingBuffer(int(RATE * buffer_seconds) * 2, overflow=overflow)
+        self.vad = VADGate(create_detector(VAD_DETECTOR, RATE), rate=RATE) if vad else None
         self.should_stop = False
-        self.stream = None
-        self.audio_interface = None
+        
+        # 錄音時間追蹤（延遲指標與單詞時間對齊用）：錄音塊寫入後在緩衝區中的位置與回調時間
+        self.metrics = metrics
+        self.track_capture = metrics is not None or track_capture
+        self._capture_times = deque(maxlen=CAPTURE_HISTORY_CHUNKS)
+        self.last_capture_time = None  # 最近讀出的音頻塊的錄音時間
         
     def start_recording(self):
         """開始錄音"""
-        self.audio_interface = pyaudio.PyAudio()
-        
-        # 查找麥克風
-        print("🎤 搜尋可用的麥克風...")
-        for i in range(self.audio_interface.get_device_count()):
-            info = self.audio_interface.get_device_info_by_index(i)
-            if info['maxInputChannels'] > 0:
-                print(f"   📱 {info['name']} (輸入聲道: {info['maxInputChannels']})")
-        
         try:
-            self.stream = self.audio_interface.open(
-                format=FORMAT,
-                channels=CHANNELS,
-                rate=RATE,
-                input=True,
-                frames_per_buffer=CHUNK,
-                stream_callback=self._audio_callback
-            )
+            if isinstance(self.source, MicrophoneSource):
+                # 查找麥克風
+                print("🎤 搜尋可用的麥克風...")
+                for index, name, channels in MicrophoneSource.list_devices():
+                    print(f"   📱 {name} (輸入聲道: {channels})")
             
-            device_info = self.audio_interface.get_device_info_by_index(self.stream._input_device_id)
-            print(f"✅ 使用麥克風: {device_info['name']}")
+            # 來源結束時關閉緩衝區，讓分發線程送完剩餘音頻後結束
+            self.source.start(self._audio_callback, on_end=self.audio_buffer.close)
+            print(f"✅ 使用音頻來源: {self.source.describe()}")
             print(f"🎤 開始錄音...")
-            
-            self.stream.start_stream()
             return True
             
         except Exception as e:
             print(f"❌ 錄音失敗: {e}")
             return False
     
-    def _audio_callback(self, in_data, frame_count, time_info, status):
+    def _audio_callback(self, data):
         """音頻回調函數"""
         if not self.should_stop:
-            self.audio_queue.put(in_data)
-        return (None, pyaudio.paContinue)
+            captured_at = time.time() if self.track_capture else None
+            self.audio_buffer.write(data)
+            if captured_at:
+                self._capture_times.append((self.audio_buffer.bytes_written, captured_at))
     
     def get_audio_generator(self):
-        """音頻數據生成器"""
-        while not self.should_stop:
-            try:
-                chunk = self.audio_queue.get(timeout=1.0)
-                # 確保音頻塊大小不超過 25600 字節
-                max_chunk_size = 25600
-                if len(chunk) > max_chunk_size:
-                    # 分割大塊
-                    for i in range(0, len(chunk), max_chunk_size):
-                        yield chunk[i:i + max_chunk_size]
-                else:
-                    yield chunk
-            except:
-                continue
+        """音頻數據生成器 - 產生緩衝區的 memoryview，每塊不超過 25600 字節"""
+        max_chunk_size = 25600
+        chunks = self.audio_buffer.chunks(max_chunk_size, should_stop=lambda: self.should_stop)
+        if self.track_capture:
+            yield from self._timed_chunks(chunks)
+            return
+        if self.vad:
+            # 長時間靜音不上傳，語音開始時補送 pre-roll
+            chunks = self.vad.filter(chunks)
+        yield from chunks
+    
+    def _timed_chunks(self, chunks):
+        """
+        依讀取位置找出每塊音頻結尾的錄音時間（存於 last_capture_time），並記錄在緩衝區中的停留時間；
+        VAD 補送的 pre-roll 緊接在語音開始那一塊之前，依長度往前推算
+        """
+        times = self._capture_times
+        bytes_per_second = RATE * 2
+        for chunk in chunks:
+            # 已讀出與被丟棄的字節數即為這一塊結尾在錄音時間軸上的位置
+            position = self.audio_buffer.bytes_read + self.audio_buffer.dropped_bytes
+            while len(times) > 1 and times[0][0] < position:
+                times.popleft()
+            captured_at = None
+            if times:
+                # 回調時間對應回調那一塊的結尾
+                end, callback_at = times[0]
+                captured_at = callback_at - max(0, end - position) / bytes_per_second
+                if self.metrics:
+                    self.metrics.observe("buffer_dwell_ms", (time.time() - captured_at) * 1000)
+            
+            output = self.vad.process(chunk) if self.vad else [chunk]
+            remaining = sum(len(data) for data in output)
+            for data in output:
+                remaining -= len(data)
+                self.last_capture_time = captured_at - remaining / bytes_per_second if captured_at else None
+                yield data
     
     def stop_recording(self):
         """停止錄音"""
         self.should_stop = True
-        if self.stream:
-            self.stream.stop_stream()
-            self.stream.close()
-        if self.audio_interface:
-            self.audio_interface.terminate()
+        self.source.stop()
+        self.audio_buffer.close()
+
+class StreamSession:
+    """單一流式會話（最多5分鐘）- 擁有自己的音頻隊列"""
+    
+    def __init__(self, number, audio_start, metrics=None):
+        self.number = number
+        self.audio_start = audio_start  # 此會話第一個音頻字節在整體音頻時間軸上的位置（秒）
+        self.audio_queue = queue.Queue(maxsize=SESSION_QUEUE_CHUNKS)
+        self.closed = False
+        self.finished = threading.Event()
+        self.started_at = None
+        self.first_audio_at = None
+        self.dropped_chunks = 0
+        self.last_final_end = audio_start  # 此會話上一個最終結果的結束位置，即下一個結果的開頭
+        self.interims = 0  # 目前語句已收到的中間結果數
+        self.metrics = metrics
+        
+        # 已送出的音頻：(會話內結束位置字節, 送出時間, 錄音時間)
+        self.sent_bytes = 0
+        self.sent_times = deque(maxlen=SENT_HISTORY_CHUNKS)
+    
+    def age(self):
+        return time.time() - self.started_at if self.started_at else 0.0
+    
+    def send(self, data, captured_at=None, block=False):
+        """送入音頻塊；最新會話會等待（背壓），正在關閉的會話滿了就丟棄"""
+        item = (data, time.time(), captured_at)
+        while not self.closed:
+            try:
+                self.audio_queue.put(item, block=block, timeout=0.1 if block else None)
+                return True
+            except queue.Full:
+                if not block:
+                    self.dropped_chunks += 1
+                    return False
+        return False
+    
+    def audio_chunks(self):
+        """依序產生音頻塊，關閉後送完剩餘音頻即結束"""
+        while True:
+            try:
+                data, queued_at, captured_at = self.audio_queue.get(timeout=0.1)
+            except queue.Empty:
+                if self.closed:
+                    return
+                continue
+            now = time.time()
+            if self.first_audio_at is None:
+                self.first_audio_at = now
+            self.sent_bytes += len(data)
+            self.sent_times.append((self.sent_bytes, now, captured_at))
+            if self.metrics:
+                self.metrics.observe("session_queue_ms", (now - queued_at) * 1000)
+                if captured_at:
+                    self.metrics.observe("capture_to_send_ms", (now - captured_at) * 1000)
+            yield data
+    
+    def sent_at(self, position):
+        """
+        整體音頻時間軸上 position 秒的音頻交給 gRPC 送出的時間與錄音時間；
+        不屬於此會話或已超出記錄範圍時回傳 (None, None)
+        """
+        if position is None:
+            return None, None
+        bytes_per_second = RATE * 2
+        target = (position - self.audio_start) * bytes_per_second
+        found = (None, None)
+        # 結果通常對應最近的音頻，從最新的記錄往回找
+        for end, at, captured_at in reversed(self.sent_times):
+            if end < target:
+                break
+            # 錄音時間對應音頻塊結尾，往前推算到 position
+            found = (at, captured_at - (end - target) / bytes_per_second if captured_at else None)
+        return found
+    
+    def close(self):
+        self.closed = True
 
 class ContinuousTranscriber:
     """連續轉錄器 - 自動處理5分鐘限制"""
     
-    def __init__(self):
-        self.client = SpeechClient()
-        self.audio_streamer = AudioStreamer()
+    def __init__(self, handoff=HANDOFF_MODE, overlap_seconds=HANDOFF_OVERLAP_SECONDS, source=None,
+                 transcript_writer=None, save_interims=SAVE_INTERIMS, metrics=None, word_offsets=WORD_TIME_OFFSETS,
+                 vocabulary_transcripts=(), server_resources=SERVER_RESOURCES):
+        self.connection = SpeechConnectionManager(os.environ['GOOGLE_CLOUD_PROJECT'])
+        self.audio_streamer = AudioStreamer(source=source, metrics=metrics, track_capture=word_offsets)
         self.should_stop = False
         self.session_count = 0
+        self.handoff = handoff
+        self.overlap_seconds = overlap_seconds
+        self.corrector = PhraseCorrector([])
+        self.streaming_config = None
+        self.vocabulary_store = None
         
-    def create_recognition_config(self, phrases):
-        """創建識別配置"""
-        # 詞彙適應配置
-        adaptation = None
-        if phrases:
-            phrase_set = cloud_speech.PhraseSet()
-            for phrase in phrases:
-                phrase_set.phrases.append(cloud_speech.PhraseSet.Phrase(value=phrase, boost=10.0))
-            
-            adaptation = cloud_speech.SpeechAdaptation()
-            adaptation.phrase_sets.append(phrase_set)
+        # 活躍會話與最近音頻尾段（交接時重播）
+        self._sessions = []
+        self._sessions_lock = threading.Lock()
+        self._current_session = None
+        self._tail = deque()
+        self._tail_bytes = 0
+        self._audio_bytes = 0
         
-        # 識別配置
-        recognition_config = cloud_speech.RecognitionConfig(
-            explicit_decoding_config=cloud_speech.ExplicitDecodingConfig(
-                encoding=cloud_speech.ExplicitDecodingConfig.AudioEncoding.LINEAR16,
-                sample_rate_hertz=RATE,
-                audio_channel_count=CHANNELS,
-            ),
-            language_codes=["en-US"],  # 支持的語言
-            model="chirp_2",
-            features=cloud_speech.RecognitionFeatures(
-                enable_automatic_punctuation=True,
-                enable_word_time_offsets=False,
-                max_alternatives=1,
-            ),
-        )
+        # 跨會話的最終結果去重
+        self.finals = FinalDeduplicator(DUPLICATE_TOLERANCE_SECONDS)
+        self.handoff_latencies = []
         
-        if adaptation:
-            recognition_config.adaptation = adaptation
-            
-        return recognition_config
-    
-    def single_stream_session(self, recognition_config):
-        """單次流式會話（最多5分鐘）"""
-        self.session_count += 1
-        session_start_time = time.time()
+        # 顯示狀態（多個會話執行緒共用）
+        self.renderer = TerminalRenderer()
         
-        print(f"\n{Colors.CYAN}🔄 啟動會話 #{self.session_count}{Colors.END}")
-        print(f"{Colors.YELLOW}⏱️ 此會話最多持續 5 分鐘{Colors.END}")
+        # 轉錄保存（背景寫入，不阻塞響應迴圈）
+        self.transcript_writer = transcript_writer
+        self.save_interims = save_interims
+        self.vocabulary_transcripts = vocabulary_transcripts  # 用於依命中次數排序詞彙的既有轉錄
+        self.server_resources = server_resources  # 以名稱引用伺服器端的識別器與 PhraseSet
         
-        # 流式識別配置
-        streaming_config = cloud_speech.StreamingRecognitionConfig(
-            config=recognition_config,
-            streaming_features=cloud_speech.StreamingRecognitionFeatures(
-                interim_results=True,
-                voice_activity_timeout=cloud_speech.StreamingRecognitionFeatures.VoiceActivityTimeout(
-                    speech_start_timeout=15,
-                    speech_end_timeout=15,
-                ),
-            ),
-        )
+        # 延遲指標（None 表示關閉）
+        self.metrics = metrics
+        self.metrics_reporter = None
         
-        def request_generator():
-            """生成識別請求"""
-            # 第一個請求包含配置
-            yield cloud_speech.StreamingRecognizeRequest(
-                recognizer=f"projects/{os.environ['GOOGLE_CLOUD_PROJECT']}/locations/us-central1/recognizers/_",
-                streaming_config=streaming_config,
-            )
+        # 單詞時間與「語音結尾 → 最終結果」延遲（跨會話累計；有指標時一併輸出到 Prometheus）
+        self.word_offsets = word_offsets
+        self.utterance_latency = None
+        if word_offsets:
+            description = LATENCY_STAGES["audio_end_to_final_ms"][1]
+            self.utterance_latency = (metrics.histogram("audio_end_to_final_ms", description) if metrics
+                                      else Histogram("audio_end_to_final_ms", description))
+        
+    def create_recognition_config(self, vocabulary):
+        """創建識別配置"""
+        return build_recognition_config(vocabulary, self.word_offsets)
+    
+    def create_streaming_config(self, recognition_config):
+        """創建流式識別配置"""
+        return build_streaming_config(recognition_config)
+    
+    def _audio_pump(self):
+        """音頻分發線程：從環形緩衝區讀取音頻，分發給活躍會話並保留最近的尾段"""
+        overlap_bytes = int(self.overlap_seconds * RATE) * 2
+        
+        for chunk in self.audio_streamer.get_audio_generator():
+            # 每塊只複製一次，所有會話共用同一個 bytes
+            data = bytes(chunk)
+            captured_at = self.audio_streamer.last_capture_time
+            with self._sessions_lock:
+                self._audio_bytes += len(data)
+                self._tail.append((data, captured_at))
+                self._tail_bytes += len(data)
+                while self._tail and self._tail_bytes - len(self._tail[0][0]) >= overlap_bytes:
+                    self._tail_bytes -= len(self._tail.popleft()[0])
+                sessions = list(self._sessions)
             
-            # 後續請求包含音頻數據
-            for chunk in self.audio_streamer.get_audio_generator():
+            for session in sessions:
+                session.send(data, captured_at, block=session is self._current_session)
+        
+        with self._sessions_lock:
+            for session in self._sessions:
+                session.close()
+    
+    def _open_session(self, replay):
+        """建立新會話並註冊到分發線程；replay 時先放入最近的音頻尾段"""
+        self.session_count += 1
+        with self._sessions_lock:
+            tail = list(self._tail) if replay else []
+            replay_bytes = sum(len(data) for data, _ in tail)
+            audio_start = (self._audio_bytes - replay_bytes) / (RATE * 2)
+            session = StreamSession(self.session_count, audio_start, metrics=self.metrics)
+            for data, captured_at in tail:
+                # 重播的音頻保留原本的錄音時間，交接後的結果仍能換算回錄音時刻
+                session.send(data, captured_at)
+            self._sessions.append(session)
+        return session
+    
+    def _close_session(self, session):
+        """停止向會話送入新音頻，讓它送完剩餘音頻後結束"""
+        with self._sessions_lock:
+            if session in self._sessions:
+                self._sessions.remove(session)
+        session.close()
+    
+    def _start_session(self, session):
+        """在背景執行緒中開啟流式識別"""
+        self._current_session = session
+        session.started_at = time.time()
+        thread = threading.Thread(target=self.single_stream_session, args=(session,))
+        thread.daemon = True
+        thread.start()
+    
+    def single_stream_session(self, session):
+        """單次流式會話（最多5分鐘）"""
+        self.renderer.print_line(f"{Colors.CYAN}🔄 啟動會話 #{session.number}{Colors.END}")
+        self.renderer.print_line(f"{Colors.YELLOW}⏱️ 此會話最多持續 5 分鐘{Colors.END}")
+        
+        def audio_generator():
+            """會話音頻（交接時開頭是重播的尾段）"""
+            for data in session.audio_chunks():
                 if self.should_stop:
                     break
-                    
-                # 檢查是否接近5分鐘限制
-                if time.time() - session_start_time > 280:  # 4分40秒
-                    print(f"\n{Colors.YELLOW}⚠️ 接近5分鐘限制，準備重新連接...{Colors.END}")
-                    break
-                    
-                yield cloud_speech.StreamingRecognizeRequest(audio=chunk)
+                yield data
         
         try:
-            responses = self.client.streaming_recognize(requests=request_generator())
-            self.process_responses(responses)
+            # 優先使用已預熱的流式呼叫（配置已送出），只需接上音頻
+            responses = self.connection.open_stream(self.streaming_config, audio_generator())
+            self.process_responses(responses, session)
             
         except Exception as e:
             if "Max duration of 5 minutes" in str(e):
-                print(f"\n{Colors.YELLOW}⏱️ 會話 #{self.session_count} 達到5分鐘限制{Colors.END}")
-            else:
-                print(f"\n{Colors.RED}❌ 會話 #{self.session_count} 錯誤: {e}{Colors.END}")
+                self.renderer.print_line(f"{Colors.YELLOW}⏱️ 會話 #{session.number} 達到5分鐘限制{Colors.END}")
+            elif not self.should_stop:
+                self.renderer.print_line(f"{Colors.RED}❌ 會話 #{session.number} 錯誤: {e}{Colors.END}")
+        finally:
+            self._close_session(session)
+            session.finished.set()
+    
+    def _accept_final(self, session, result, transcript):
+        """
+        跨會話去重：丟棄重播區段已輸出的最終結果
+        回傳 (去重後的文字, 開頭移除的單詞數, 結尾移除的單詞數)
+        """
+        return self.finals.accept_span(session.number, session.audio_start, result, transcript)
+    
+    def _show_final(self, text):
+        """最終結果 - 綠色"""
+        self.renderer.final(text)
+        self.renderer.print_line("-" * 60)
+    
+    def _show_interim(self, text):
+        """中間結果 - 灰色，只重寫與上一次不同的尾段"""
+        self.renderer.interim(text)
+    
+    @staticmethod
+    def _result_end(session, result):
+        """結果結束位置在整體音頻時間軸上的秒數；沒有偏移時回傳 None"""
+        end_offset = offset_seconds(getattr(result, "result_end_offset", None))
+        return session.audio_start + end_offset if end_offset else None
+    
+    def _align_words(self, session, result, head, tail, received_at):
+        """
+        把單詞偏移（相對於會話音頻開頭）換算成整體音頻時間軸上的秒數與錄音時的系統時間，
+        並以最後一個單詞結束的錄音時間計算「語音結尾 → 最終結果」延遲；回傳 (單詞列表, 延遲毫秒)
+        """
+        words = list(result.alternatives[0].words)
+        if head or tail:
+            # 只去掉去重實際移除的單詞；API 的單詞數可能多於文字的空白分隔詞數（正規化、不以空白分詞的語言）
+            words = words[head:max(head, len(words) - tail)]
+        aligned = []
+        for word in words:
+            start = session.audio_start + offset_seconds(word.start_offset)
+            end = session.audio_start + offset_seconds(word.end_offset)
+            _, captured_at = session.sent_at(start)
+            aligned.append({"word": word.word, "start": round(start, 3), "end": round(end, 3),
+                            "captured_at": round(captured_at, 3) if captured_at else None})
+        if not aligned:
+            return aligned, None
+        _, speech_end_at = session.sent_at(aligned[-1]["end"])
+        if speech_end_at is None:
+            return aligned, None
+        latency_ms = (received_at - speech_end_at) * 1000
+        self.utterance_latency.observe(latency_ms)
+        return aligned, round(latency_ms, 1)
+    
+    def _save_result(self, session, result, kind, text, raw_text, received_at, words=None, audio_latency_ms=None):
+        """把結果放入背景寫入佇列；latency_ms 為收到結果時間減去結果最後一段音頻的送出時間"""
+        audio_start, audio_end = session.last_final_end, self._result_end(session, result)
+        if words:
+            # 有單詞時間時以實際語音的開頭與結尾為準
+            audio_start, audio_end = words[0]["start"], words[-1]["end"]
+        sent_at, _ = session.sent_at(audio_end)
+        is_final = kind == "final"
+        self.transcript_writer.write(make_record(
+            kind, session.number, text, received_at, raw_text=raw_text,
+            language=result.language_code or LANGUAGE_CODE,
+            confidence=round(result.alternatives[0].confidence, 3) if is_final else None,
+            stability=None if is_final else round(result.stability, 3),
+            audio_start=audio_start, audio_end=audio_end,
+            latency_ms=round((received_at - sent_at) * 1000, 1) if sent_at else None,
+            audio_latency_ms=audio_latency_ms, words=words,
+        ))
+    
+    def _show_final_timed(self, session, result, raw_transcript, received_at):
+        """修正大小寫並顯示最終結果，記錄各階段耗時"""
+        started = time.perf_counter()
+        transcript = self.corrector.fix(raw_transcript)
+        fixed = time.perf_counter()
+        self._show_final(transcript)
+        self.metrics.observe("capitalization_ms", (fixed - started) * 1000)
+        self.metrics.observe("render_ms", elapsed_ms(fixed))
+        sent_at, captured_at = session.sent_at(self._result_end(session, result))
+        if sent_at:
+            self.metrics.observe("final_latency_ms", (received_at - sent_at) * 1000)
+        if captured_at:
+            self.metrics.observe("speech_to_display_ms", (time.time() - captured_at) * 1000)
+        return transcript
+    
+    def _show_interim_timed(self, session, result, transcript, received_at):
+        """顯示中間結果並記錄耗時；語句的第一個中間結果另外記錄從語句開頭送出算起的延遲"""
+        started = time.perf_counter()
+        self._show_interim(transcript)
+        self.metrics.observe("render_ms", elapsed_ms(started))
+        sent_at, _ = session.sent_at(self._result_end(session, result))
+        if sent_at:
+            self.metrics.observe("interim_latency_ms", (received_at - sent_at) * 1000)
+        if session.interims == 1:
+            utterance_sent_at, _ = session.sent_at(session.last_final_end)
+            if utterance_sent_at:
+                self.metrics.observe("first_interim_ms", (received_at - utterance_sent_at) * 1000)
     
-    def process_responses(self, responses):
+    def process_responses(self, responses, session):
         """處理識別響應"""
-        last_interim_length = 0
-        
-        # 載入詞彙用於大小寫修正
-        custom_phrases = load_custom_vocabulary()
-        
         try:
             for response in responses:
                 if self.should_stop:
                     break
+                received_at = time.time()
                     
                 for result in response.results:
                     if result.alternatives:
                         transcript = result.alternatives[0].transcript.strip()
                         
                         if result.is_final:
-                            # 最終結果 - 綠色，先修正大小寫再顯示
-                            corrected_transcript = fix_capitalization(transcript, custom_phrases)
-                            
-                            clear_chars = max(0, last_interim_length - len(corrected_transcript) - 3)
-                            overwrite_chars = " " * clear_chars
-                            
-                            print(f"\r{Colors.GREEN}✅ {corrected_transcript}{Colors.END}{overwrite_chars}")
-                            print("-" * 60)
-                            last_interim_length = 0
+                            # 最終結果 - 去重後修正大小寫再顯示
+                            raw_transcript, head, tail = self._accept_final(session, result, transcript)
+                            if raw_transcript:
+                                if self.metrics:
+                                    transcript = self._show_final_timed(session, result, raw_transcript, received_at)
+                                else:
+                                    transcript = self.corrector.fix(raw_transcript)
+                                    self._show_final(transcript)
+                                words, audio_latency_ms = None, None
+                                if self.word_offsets:
+                                    words, audio_latency_ms = self._align_words(session, result, head, tail,
+                                                                                received_at)
+                                if self.transcript_writer:
+                                    self._save_result(session, result, "final", transcript, raw_transcript, received_at,
+                                                      words=words, audio_latency_ms=audio_latency_ms)
+                            # 下一個語句從這個結果的結尾開始
+                            session.last_final_end = self._result_end(session, result) or session.last_final_end
+                            session.interims = 0
                         else:
-                            # 中間結果 - 灰色，覆蓋之前的內容
-                            # 計算需要清除的字符數量
-                            clear_chars = max(0, last_interim_length - len(transcript) - 3)
-                            overwrite_chars = " " * clear_chars
-                            
-                            print(f"\r{Colors.GREY}🔘 {transcript}{Colors.END}{overwrite_chars}", end='', flush=True)
-                            
-                            # 記錄當前行的長度（包括emoji和前綴）
-                            last_interim_length = len(transcript) + 3
+                            session.interims += 1
+                            if session is self._current_session:
+                                # 交接期間只顯示最新會話的中間結果
+                                if self.metrics:
+                                    self._show_interim_timed(session, result, transcript, received_at)
+                                else:
+                                    self._show_interim(transcript)
+                                if self.transcript_writer and self.save_interims:
+                                    self._save_result(session, result, "interim", transcript, None, received_at)
                             
         except Exception as e:
             if "Max duration of 5 minutes" not in str(e):
-                print(f"\n{Colors.RED}❌ 處理響應錯誤: {e}{Colors.END}")
+                self.renderer.print_line(f"{Colors.RED}❌ 處理響應錯誤: {e}{Colors.END}")
+    
+    def _rollover(self, current):
+        """切換到下一個會話；交接模式下先開啟新會話再關閉目前會話"""
+        handoff_started = time.time()
+        # 目前會話異常結束時也重播尾段，避免遺失尚未識別的音頻
+        next_session = self._open_session(replay=self.overlap_seconds > 0)
+        
+        if self.handoff:
+            self._start_session(next_session)
+            self._close_session(current)
+        else:
+            self._close_session(current)
+            current.finished.wait()
+            self._start_session(next_session)
+        
+        self.renderer.print_line(f"{Colors.CYAN}🔄 自動重新連接... (會話 #{next_session.number}，"
+                                 f"重播 {self.overlap_seconds:.1f} 秒音頻){Colors.END}")
+        
+        # 背景記錄交接延遲：從決定交接到新會話送出第一個音頻塊
+        def record_latency():
+            while next_session.first_audio_at is None and not next_session.finished.is_set():
+                time.sleep(0.005)
+            if next_session.first_audio_at:
+                self.handoff_latencies.append((next_session.first_audio_at - handoff_started) * 1000)
+        threading.Thread(target=record_latency, daemon=True).start()
+        
+        return next_session
+    
+    def _apply_vocabulary(self, snapshot):
+        """
+        換上新版詞彙：大小寫修正器立即生效，詞彙適應配置從下一個會話開始使用
+        （由詞彙庫的監看執行緒呼叫，進行中的會話與響應迴圈不中斷）
+        """
+        streaming_config = self.create_streaming_config(self.create_recognition_config(snapshot.vocabulary))
+        if self.server_resources:
+            # 每次重新連接的第一個請求只帶識別器名稱，不再重送全部詞彙
+            streaming_config = use_server_resources(self.connection, streaming_config,
+                                                    emit=self.renderer.print_line)
+        self.corrector = snapshot.corrector
+        self.streaming_config = streaming_config
+        if snapshot.version > 1:
+            self.renderer.print_line(f"{Colors.CYAN}🔄 詞彙已更新（第 {snapshot.version} 版）: "
+                                     f"{snapshot.vocabulary.report()}{Colors.END}")
     
     def start_continuous_transcription(self):
         """開始連續轉錄"""
@@ -307,12 +640,20 @@ class ContinuousTranscriber:
         print(f"📍 項目: {os.environ['GOOGLE_CLOUD_PROJECT']}")
         print(f"🚀 使用 Chirp 2 模型進行連續語音識別")
         print(f"⏱️ 自動處理 5 分鐘流式限制")
+        if self.handoff:
+            print(f"🔗 無縫交接模式：重播最近 {self.overlap_seconds:.1f} 秒音頻")
         print(f"📝 按 Ctrl+C 停止")
         print("=" * 60)
         
-        # 載入自定義詞彙
-        phrases = load_custom_vocabulary()
-        recognition_config = self.create_recognition_config(phrases)
+        # 載入自定義詞彙（所有會話共用，只編譯一次）；詞彙檔改變時在背景換上新版本
+        load_custom_vocabulary(self.vocabulary_transcripts, watch=True)
+        self.vocabulary_store = get_vocabulary_store(VOCABULARY_FILE, self.vocabulary_transcripts)
+        self.vocabulary_store.subscribe(self._apply_vocabulary)
+        self._apply_vocabulary(self.vocabulary_store.current)
+        
+        # 預先建立 gRPC 連線並開啟第一個流式呼叫
+        self.connection.warm_up()
+        self.connection.prewarm(self.streaming_config)
         
         # 開始錄音
         if not self.audio_streamer.start_recording():
@@ -326,14 +667,38 @@ class ContinuousTranscriber:
         print(f"   🔄 藍色 = 會話重連")
         print("-" * 60)
         
+        if self.metrics:
+            # 定期在中間結果上方輸出一行各階段延遲摘要
+            self.metrics_reporter = SummaryReporter(self.metrics, self.renderer.print_line,
+                                                    labels=STAGE_LABELS).start()
+        
         try:
+            # 啟動音頻分發線程與第一個會話
+            current = self._open_session(replay=False)
+            pump = threading.Thread(target=self._audio_pump)
+            pump.daemon = True
+            pump.start()
+            self._start_session(current)
+            
             while not self.should_stop:
-                # 啟動新的5分鐘會話
-                self.single_stream_session(recognition_config)
+                if current.finished.wait(timeout=0.1):
+                    if not pump.is_alive():
+                        # 音頻來源已結束（例如檔案播放完畢）且最後的會話已送完音頻
+                        self.renderer.print_line(f"{Colors.CYAN}📁 音頻來源已結束{Colors.END}")
+                        break
+                    # 會話提前結束（錯誤或伺服器關閉）：太快結束時稍等再重連
+                    if current.age() < 1:
+                        time.sleep(1)
+                elif current.age() > SESSION_ROLLOVER_SECONDS:
+                    self.renderer.print_line(f"{Colors.YELLOW}⚠️ 接近5分鐘限制，準備重新連接...{Colors.END}")
+                else:
+                    if current.age() > SESSION_ROLLOVER_SECONDS - PREWARM_LEAD_SECONDS:
+                        # 在背景預開下一個流式呼叫
+                        self.connection.prewarm(self.streaming_config)
+                    continue
                 
                 if not self.should_stop:
-                    print(f"\n{Colors.CYAN}🔄 自動重新連接... (會話 #{self.session_count + 1}){Colors.END}")
-                    time.sleep(1)  # 短暫延遲
+                    current = self._rollover(current)
                     
         except KeyboardInterrupt:
             print(f"\n\n{Colors.YELLOW}⏹️ 用戶停止轉錄{Colors.END}")
@@ -346,13 +711,80 @@ class ContinuousTranscriber:
         """停止轉錄"""
         self.should_stop = True
         self.audio_streamer.stop_recording()
+        self.connection.close()
         print(f"\n{Colors.GREEN}✅ 轉錄已停止{Colors.END}")
         print(f"📊 總會話數: {self.session_count}")
+        if self.vocabulary_store:
+            self.vocabulary_store.unsubscribe(self._apply_vocabulary)
+            if self.vocabulary_store.reloads:
+                print(f"📚 {self.vocabulary_store.report()}")
+        for line in self.connection.report():
+            print(f"   ⏱️ {line}")
+        
+        if self.handoff_latencies:
+            average = sum(self.handoff_latencies) / len(self.handoff_latencies)
+            print(f"🔗 會話交接: {len(self.handoff_latencies)} 次，平均 {average:.1f} ms，"
+                  f"最長 {max(self.handoff_latencies):.1f} ms，去除重複結果 {self.finals.duplicates} 個")
+        
+        stats = self.audio_streamer.audio_buffer.stats()
+        print(f"🎵 音頻緩衝區: 最高水位 {stats['high_watermark']:.0%}，"
+              f"丟棄 {stats['dropped_frames']} 幀，溢寫 {stats['spilled_bytes']} 字節")
+        
+        if self.audio_streamer.vad:
+            print(f"🔇 VAD: 過濾 {self.audio_streamer.vad.suppressed_fraction:.0%} 的靜音音頻")
+        print(f"🖥️ {self.renderer.report()}")
+        
+        if self.metrics:
+            if self.metrics_reporter:
+                self.metrics_reporter.stop()
+            # 整段轉錄的累計摘要
+            summary = SummaryReporter(self.metrics, labels=STAGE_LABELS).summary()
+            if summary:
+                print(f"⏱️ {summary}")
+        
+        if self.utterance_latency:
+            _, _, count, longest = self.utterance_latency.snapshot()
+            if count:
+                print(f"🎯 語音結尾 → 最終結果: {count} 句，p50 {self.utterance_latency.quantile(0.5):.0f} ms，"
+                      f"p95 {self.utterance_latency.quantile(0.95):.0f} ms，最長 {longest:.0f} ms")
+        
+        if self.transcript_writer:
+            # 寫完佇列中剩餘的記錄並 fsync
+            self.transcript_writer.close()
+            print(f"💾 {self.transcript_writer.report()}")
 
 def main():
     """主函數"""
+    parser = add_source_arguments(argparse.ArgumentParser(description="Speech-to-Text V2 連續實時轉錄"))
+    parser.add_argument("--transcript", action="append", default=[], metavar="[類型:]路徑",
+                        help="保存轉錄結果，可重複指定：transcripts.jsonl、sqlite:transcripts.db、"
+                             "rotate:logs/meeting.jsonl（依大小或時間輪替）")
+    parser.add_argument("--save-interims", action="store_true", default=SAVE_INTERIMS,
+                        help="同時保存中間結果")
+    parser.add_argument("--word-timestamps", action="store_true", default=WORD_TIME_OFFSETS,
+                        help="要求單詞時間，保存對齊到錄音時間的單詞並統計語音結尾到最終結果的延遲")
+    parser.add_argument("--metrics", action="store_true", default=METRICS_ENABLED,
+                        help="記錄各階段延遲並定期輸出摘要")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="在 http://127.0.0.1:PORT/metrics 提供 Prometheus 指標（隱含 --metrics）")
+    parser.add_argument("--server-resources", action="store_true", default=SERVER_RESOURCES,
+                        help="把詞彙同步成伺服器端 PhraseSet / Recognizer，會話以名稱引用")
+    args = parser.parse_args()
+    
     try:
-        transcriber = ContinuousTranscriber()
+        source = open_source(args.source, RATE, CHUNK, speed=args.speed, loop=args.loop)
+        writer = TranscriptWriter([create_sink(spec) for spec in args.transcript]) if args.transcript else None
+        metrics = None
+        if args.metrics or args.metrics_port:
+            metrics = MetricsRegistry({name: help_text for name, (_, help_text) in LATENCY_STAGES.items()})
+            if args.metrics_port:
+                start_metrics_server(metrics, args.metrics_port)
+                print(f"📈 Prometheus 指標: http://127.0.0.1:{args.metrics_port}/metrics")
+        transcriber = ContinuousTranscriber(source=source, transcript_writer=writer,
+                                            save_interims=args.save_interims, metrics=metrics,
+                                            word_offsets=args.word_timestamps,
+                                            vocabulary_transcripts=args.transcript,
+                                            server_resources=args.server_resources)
         transcriber.start_continuous_transcription()
     except KeyboardInterrupt:
         print(f"\n{Colors.YELLOW}👋 再見！{Colors.END}")
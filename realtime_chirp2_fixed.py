@@ -4,106 +4,82 @@ Google Cloud Speech-to-Text V2 實時轉錄
 基於官方文檔重新實現
 """
 
+import argparse
 import os
-import queue
-import sys
 import threading
 import time
 
-from google.api_core.client_options import ClientOptions
-from google.cloud.speech_v2 import SpeechClient
 from google.cloud.speech_v2.types import cloud_speech
-import pyaudio
-from custom_vocabulary import get_phrases_for_recognition
-import re
+from vocabulary_store import get_vocabulary_store
+from audio_buffer import BLOCK, PCMRingBuffer
+from audio_sources import MicrophoneSource, add_source_arguments, open_source
+from vad import VADGate, create_detector
+from speech_connection import SpeechConnectionManager
+from speech_resources import use_server_resources
+from terminal_renderer import TerminalRenderer
 
 # 音頻參數
 RATE = 16000
 CHUNK = int(RATE / 10)  # 100ms
+BUFFER_SECONDS = 30  # 音頻緩衝區容量（秒）
+OVERFLOW_POLICY = "drop_oldest"  # 緩衝區滿時的策略: drop_oldest / block / spill
+VAD_ENABLED = True  # 本地語音活動檢測：長時間靜音不上傳
+VAD_DETECTOR = "energy"  # energy（能量+過零率）或 webrtc
+SERVER_RESOURCES = False  # 詞彙同步成伺服器端 PhraseSet / Recognizer，以名稱引用（見 speech_resources.py）
 
 PROJECT_ID = os.getenv("GOOGLE_CLOUD_PROJECT")
 
-def fix_capitalization(text, custom_phrases):
-    """修正文字中專有名詞的大小寫"""
-    if not custom_phrases:
-        return text
-    
-    result = text
-    
-    # 為每個自定義詞彙進行大小寫修正
-    for phrase in custom_phrases:
-        # 創建不區分大小寫的搜尋模式
-        # 使用單詞邊界來確保完整匹配，但允許一些標點符號
-        words = phrase.split()
-        
-        if len(words) == 1:
-            # 單詞匹配：使用單詞邊界
-            pattern = r'\b' + re.escape(phrase.lower()) + r'\b'
-        else:
-            # 多詞匹配：更靈活的匹配
-            pattern = r'\b' + r'\s+'.join(re.escape(word.lower()) for word in words) + r'\b'
-        
-        def replace_func(match):
-            return phrase  # 返回正確的大小寫版本
-        
-        # 不區分大小寫的替換
-        result = re.sub(pattern, replace_func, result, flags=re.IGNORECASE)
-    
-    return result
-
 class MicrophoneStream:
-    """麥克風音頻流類"""
+    """音頻流類 - 預設使用麥克風，也可以接上任何 AudioSource（檔案、stdin、socket）"""
     
-    def __init__(self, rate=RATE, chunk=CHUNK):
+    def __init__(self, rate=RATE, chunk=CHUNK, buffer_seconds=BUFFER_SECONDS, overflow=OVERFLOW_POLICY,
+                 vad=VAD_ENABLED, source=None):
         self._rate = rate
         self._chunk = chunk
-        self._buff = queue.Queue()
+        self._source = source or MicrophoneSource(rate, chunk)
+        if not self._source.live:
+            # 檔案來源可以等待，緩衝區滿時阻塞而不是丟棄
+            overflow = BLOCK
+        # 固定容量環形緩衝區（16-bit 單聲道，每幀 2 字節）
+        self._buff = PCMRingBuffer(int(rate * buffer_seconds) * 2, overflow=overflow)
+        self._vad = VADGate(create_detector(VAD_DETECTOR, rate), rate=rate) if vad else None
         self.closed = True
 
     def __enter__(self):
-        self._audio_interface = pyaudio.PyAudio()
-        self._audio_stream = self._audio_interface.open(
-            format=pyaudio.paInt16,
-            channels=1,
-            rate=self._rate,
-            input=True,
-            frames_per_buffer=self._chunk,
-            stream_callback=self._fill_buffer,
-        )
+        # 來源結束時關閉緩衝區，讓生成器送完剩餘音頻後結束
+        self._source.start(self._fill_buffer, on_end=self._buff.close)
+        print(f"🎧 音頻來源: {self._source.describe()}")
         self.closed = False
         return self
 
     def __exit__(self, type, value, traceback):
-        self._audio_stream.stop_stream()
-        self._audio_stream.close()
+        self._source.stop()
         self.closed = True
-        self._buff.put(None)
-        self._audio_interface.terminate()
+        self._buff.close()
+
+        stats = self._buff.stats()
+        if stats["dropped_frames"] or stats["spilled_bytes"]:
+            print(f"\n⚠️ 音頻緩衝區: 丟棄 {stats['dropped_frames']} 幀，"
+                  f"溢寫 {stats['spilled_bytes']} 字節，最高水位 {stats['high_watermark']:.0%}")
+        if self._vad:
+            print(f"\n🔇 VAD: 過濾 {self._vad.suppressed_fraction:.0%} 的靜音音頻")
 
-    def _fill_buffer(self, in_data, frame_count, time_info, status_flags):
-        """將音頻數據放入緩衝區"""
-        self._buff.put(in_data)
-        return None, pyaudio.paContinue
+    def _fill_buffer(self, data):
+        """將音頻數據複製進環形緩衝區"""
+        self._buff.write(data)
 
     def generator(self):
-        """音頻數據生成器 - 限制音頻塊大小"""
+        """音頻數據生成器 - 直接產生緩衝區的 memoryview，每塊不超過 25KB"""
         MAX_CHUNK_SIZE = 25600  # Google Cloud 限制 (25KB)
         
-        while not self.closed:
-            chunk = self._buff.get()
-            if chunk is None:
-                return
-            
-            # 直接發送單個塊，避免累積過多數據
-            if len(chunk) <= MAX_CHUNK_SIZE:
-                yield chunk
-            else:
-                # 如果單個塊太大，分割它
-                for i in range(0, len(chunk), MAX_CHUNK_SIZE):
-                    yield chunk[i:i+MAX_CHUNK_SIZE]
+        chunks = self._buff.chunks(MAX_CHUNK_SIZE)
+        if self._vad:
+            # 長時間靜音不上傳，語音開始時補送 pre-roll
+            chunks = self._vad.filter(chunks)
+        yield from chunks
 
 
-def transcribe_streaming_v2():
+def transcribe_streaming_v2(source=None, server_resources=SERVER_RESOURCES):
     """使用 Speech v2 進行實時轉錄"""
     print("🎙️  Google Cloud Speech-to-Text V2 實時轉錄")
     print("=" * 60)
@@ -112,15 +88,11 @@ def transcribe_streaming_v2():
     print("📝 按 Ctrl+C 停止")
     print("=" * 60)
 
-    # 創建客戶端
-    client = SpeechClient(
-        client_options=ClientOptions(
-            api_endpoint="us-central1-speech.googleapis.com",
-        )
-    )
+    # 連線管理器（共用 keepalive gRPC 通道）
+    connection = SpeechConnectionManager(PROJECT_ID)
 
-    # 載入自定義詞彙
-    custom_phrases = get_phrases_for_recognition()
+    # 載入並編譯自定義詞彙（依配額分組、依分類加權；行程內共用，詞彙檔改變時在背景更新）
+    vocabulary = get_vocabulary_store().vocabulary
     
     # 配置識別 - 明確指定編碼格式
     recognition_config = cloud_speech.RecognitionConfig(
@@ -134,32 +106,19 @@ def transcribe_streaming_v2():
     )
     
     # 如果有自定義詞彙，加入 Speech v2 適應性配置
-    if custom_phrases:
-        print(f"📚 載入 {len(custom_phrases)} 個自定義詞彙")
+    if vocabulary.terms:
+        print(f"📚 載入 {len(vocabulary.terms)} 個自定義詞彙: {vocabulary.report()}")
         print("🚀 啟用詞彙適應性功能，提升專業術語識別準確度")
         
-        # 顯示前10個詞彙
+        # 顯示排名前10個詞彙
         print("📝 載入的詞彙包括:")
-        for i, phrase in enumerate(custom_phrases[:10]):
+        for phrase in vocabulary.terms[:10]:
             print(f"   • {phrase}")
-        if len(custom_phrases) > 10:
-            print(f"   ... 還有 {len(custom_phrases) - 10} 個")
+        if len(vocabulary.terms) > 10:
+            print(f"   ... 還有 {len(vocabulary.terms) - 10} 個")
         
-        # 使用 Speech v2 的正確適應性格式
-        phrase_set = cloud_speech.PhraseSet(
-            phrases=[
-                {"value": phrase, "boost": 10.0}
-                for phrase in custom_phrases[:100]  # 限制數量避免超限
-            ]
-        )
-        
-        recognition_config.adaptation = cloud_speech.SpeechAdaptation(
-            phrase_sets=[
-                cloud_speech.SpeechAdaptation.AdaptationPhraseSet(
-                    inline_phrase_set=phrase_set
-                )
-            ]
-        )
+        # 使用 Speech v2 的適應性格式，依 API 配額分成多個 PhraseSet
+        recognition_config.adaptation = vocabulary.adaptation()
 
     # 流式配置
     streaming_config = cloud_speech.StreamingRecognitionConfig(
@@ -168,29 +127,21 @@ def transcribe_streaming_v2():
             interim_results=True,  # 啟用中間結果
         )
     )
+    if server_resources:
+        # 第一個請求只帶識別器名稱，不再內嵌全部詞彙
+        streaming_config = use_server_resources(connection, streaming_config)
 
-    # 創建初始請求
-    config_request = cloud_speech.StreamingRecognizeRequest(
-        recognizer=f"projects/{PROJECT_ID}/locations/us-central1/recognizers/_",
-        streaming_config=streaming_config,
-    )
-
-    def requests_generator(config_request, audio_generator):
-        """請求生成器 - 按照官方文檔格式"""
-        yield config_request
-        for audio_chunk in audio_generator:
-            yield cloud_speech.StreamingRecognizeRequest(audio=audio_chunk)
+    # 在背景預先開啟流式呼叫並送出配置，開始錄音後只需接上音頻
+    connection.prewarm(streaming_config)
 
     print("🎤 開始錄音...")
     
     try:
-        with MicrophoneStream(RATE, CHUNK) as stream:
+        with MicrophoneStream(RATE, CHUNK, source=source) as stream:
             audio_generator = stream.generator()
             
-            requests = requests_generator(config_request, audio_generator)
-            
             # 開始流式識別
-            responses = client.streaming_recognize(requests=requests)
+            responses = connection.open_stream(streaming_config, audio_generator)
             
             print("✅ 連接成功，開始實時轉錄:")
             print("-" * 60)
@@ -207,14 +158,18 @@ def transcribe_streaming_v2():
         print(f"\n❌ 錯誤: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        connection.close()
+        for line in connection.report():
+            print(f"⏱️ {line}")
 
 
 def listen_print_loop(responses):
     """處理並顯示轉錄結果"""
-    last_interim_length = 0
+    renderer = TerminalRenderer()
     
-    # 載入詞彙用於大小寫修正
-    custom_phrases = get_phrases_for_recognition()
+    # 共用詞彙庫：每個最終結果都取目前版本的大小寫修正器，詞彙檔更新後立即生效
+    vocabulary_store = get_vocabulary_store()
     
     for response in responses:
         if not response.results:
@@ -227,26 +182,14 @@ def listen_print_loop(responses):
         transcript = result.alternatives[0].transcript.strip()
 
         if not result.is_final:
-            # 中間結果 - 灰色，覆蓋之前的內容
-            # 計算需要清除的字符數量
-            clear_chars = max(0, last_interim_length - len(transcript) - 3)
-            overwrite_chars = " " * clear_chars
-            
-            sys.stdout.write(f"\r🔘 \033[90m{transcript}\033[0m{overwrite_chars}")
-            sys.stdout.flush()
-            
-            # 記錄當前行的長度（包括emoji和前綴）
-            last_interim_length = len(transcript) + 3
+            # 中間結果 - 灰色，只重寫與上一次不同的尾段
+            renderer.interim(transcript)
         else:
             # 最終結果 - 綠色，先修正大小寫再顯示
-            corrected_transcript = fix_capitalization(transcript, custom_phrases)
-            
-            clear_chars = max(0, last_interim_length - len(corrected_transcript) - 3)
-            overwrite_chars = " " * clear_chars
+            corrected_transcript = vocabulary_store.corrector.fix(transcript)
             
-            print(f"\r✅ \033[92m{corrected_transcript}\033[0m{overwrite_chars}")
+            renderer.final(corrected_transcript)
             print("-" * 60)
-            last_interim_length = 0
 
             # 檢查退出關鍵字
             if any(word in transcript.lower() for word in ["exit", "quit", "stop"]):
@@ -255,12 +198,23 @@ def listen_print_loop(responses):
 
 
 def main():
+    parser = add_source_arguments(argparse.ArgumentParser(description=__doc__.strip().splitlines()[0]))
+    parser.add_argument("--server-resources", action="store_true", default=SERVER_RESOURCES,
+                        help="把詞彙同步成伺服器端 PhraseSet / Recognizer，會話以名稱引用")
+    args = parser.parse_args()
+
     if not PROJECT_ID:
         print("❌ 錯誤: 請設置 GOOGLE_CLOUD_PROJECT 環境變量")
         print("執行: export GOOGLE_CLOUD_PROJECT=your-project-id")
         return
 
-    transcribe_streaming_v2()
+    try:
+        source = open_source(args.source, RATE, CHUNK, speed=args.speed, loop=args.loop)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return
+
+    transcribe_streaming_v2(source, args.server_resources)
 
 
 if __name__ == "__main__":
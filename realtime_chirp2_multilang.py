@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+🌐 Google Cloud Speech-to-Text V2 多語言實時轉錄
+同一段錄音同時送給多個語言的流式會話，逐句選出信心最高（或偵測到）的語言：
+- 錄音只讀出一次，放進共用的 BroadcastBuffer；每個語言的串流以自己的游標讀取同一份音頻，不各自複製
+- 每句等各語言的最終結果到齊（最多 ARBITRATION_WAIT_SECONDS）後由 language_router 選出一個
+- 連續落後的語言提前關閉串流以節省費用；勝出語言信心偏低時重新開啟，從最近 REPLAY_SECONDS 秒音頻開始
+- 每個語言的串流接近 5 分鐘限制時各自交接（新串流重播最近的音頻，重複的最終結果去除）
+- 串流一開就失敗（語言代碼錯誤、模型或區域不支援 auto 等）時以指數退避重試，連續失敗多次後停用該語言
+
+    python realtime_chirp2_multilang.py --languages en-US cmn-Hant-TW ja-JP
+    python realtime_chirp2_multilang.py --languages en-US cmn-Hant-TW auto --source meeting.wav
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+from audio_buffer import BroadcastBuffer
+from audio_sources import add_source_arguments, open_source
+from capitalization import PhraseCorrector
+from custom_vocabulary import VOCABULARY_FILE
+from language_router import ARBITRATION_WAIT_SECONDS, PRUNE_AFTER_LOSSES, LanguageRouter, candidate_from_result
+from realtime_chirp2_continuous import (RATE, SESSION_ROLLOVER_SECONDS, AudioStreamer, Colors,
+                                        build_recognition_config, build_streaming_config, load_custom_vocabulary)
+from session_handoff import FinalDeduplicator
+from speech_connection import SpeechConnectionManager
+from terminal_renderer import TerminalRenderer
+from transcript_sink import TranscriptWriter, create_sink, make_record
+from vocabulary_store import get_vocabulary_store
+
+LANGUAGE_CODES = ["en-US", "cmn-Hant-TW"]  # 同時識別的語言（可加入 auto 讓模型自動偵測）
+SHARED_BUFFER_SECONDS = 30  # 共用音頻緩衝區保留的音頻長度（重新開啟語言時可重播的上限）
+REPLAY_SECONDS = 2.0        # 重新開啟語言或交接時，新串流從最近幾秒音頻開始
+QUICK_FAILURE_SECONDS = 1.0  # 串流在這段時間內就結束視為立即失敗
+RETRY_BACKOFF_SECONDS = 1.0  # 立即失敗後第一次重試前的等待時間（之後每次加倍）
+MAX_RETRY_BACKOFF_SECONDS = 16.0
+MAX_QUICK_FAILURES = 5       # 連續立即失敗幾次後停用該語言
+BYTES_PER_SECOND = RATE * 2
+
+
+class LanguageStream:
+    """某個語言的一個流式會話（最多 5 分鐘），以共用緩衝區的讀取端作為音頻來源"""
+
+    def __init__(self, language, number, reader):
+        self.language = language
+        self.number = number
+        self.reader = reader
+        self.audio_start = reader.start_bytes / BYTES_PER_SECOND  # 第一個音頻在整體時間軸上的位置（秒）
+        self.started_at = time.time()
+        self.ended_at = None
+        self.retry_at = None  # 立即失敗後排定的重試時間
+        self.finished = threading.Event()
+
+    def age(self):
+        return time.time() - self.started_at
+
+    @property
+    def failed_quickly(self):
+        return self.ended_at is not None and self.ended_at - self.started_at < QUICK_FAILURE_SECONDS
+
+    @property
+    def closed(self):
+        return self.reader.closed
+
+    def close(self):
+        """停止送入新音頻，讓伺服器送完剩餘結果後結束"""
+        self.reader.close()
+
+
+class MultiLanguageTranscriber:
+    """多語言轉錄器 - 每個語言一個串流，逐句選出勝出的語言"""
+
+    def __init__(self, languages=LANGUAGE_CODES, source=None, transcript_writer=None, vocabulary_transcripts=(),
+                 wait_seconds=ARBITRATION_WAIT_SECONDS, prune_after=PRUNE_AFTER_LOSSES):
+        self.languages = list(dict.fromkeys(languages))
+        self.connection = SpeechConnectionManager(os.environ['GOOGLE_CLOUD_PROJECT'])
+        self.audio_streamer = AudioStreamer(source=source)
+        # 依最大 100ms 塊估算槽位數（檔案來源加速播放時每塊較大，槽位足夠保留更長的音頻）
+        self.shared_audio = BroadcastBuffer(int(SHARED_BUFFER_SECONDS * 10))
+        self.router = LanguageRouter(self.languages, self._on_decision, self._on_prune, self._on_reprobe,
+                                     wait_seconds=wait_seconds, prune_after=prune_after)
+        self.renderer = TerminalRenderer()
+        self.transcript_writer = transcript_writer
+        self.vocabulary_transcripts = vocabulary_transcripts
+        self.vocabulary_store = None
+        self.corrector = PhraseCorrector([])
+        self.streaming_configs = {}
+        self.should_stop = False
+
+        self.stream_count = 0
+        self._streams = {}  # 語言 → 目前的串流
+        self._retired = []  # 交接或關閉後仍在送出剩餘結果的串流
+        self._streams_lock = threading.Lock()
+        self.finals = {language: FinalDeduplicator() for language in self.languages}  # 各語言跨會話去重
+        self.streamed_bytes = {language: 0 for language in self.languages}
+        self.quick_failures = {language: 0 for language in self.languages}  # 各語言連續立即失敗的次數
+
+    # ---- 詞彙 ----
+
+    def _apply_vocabulary(self, snapshot):
+        """換上新版詞彙：修正器立即生效，各語言的配置從下一個串流開始使用"""
+        self.streaming_configs = {
+            language: build_streaming_config(build_recognition_config(snapshot.vocabulary, language_codes=[language]))
+            for language in self.languages
+        }
+        self.corrector = snapshot.corrector
+        if snapshot.version > 1:
+            self.renderer.print_line(f"{Colors.CYAN}🔄 詞彙已更新（第 {snapshot.version} 版）: "
+                                     f"{snapshot.vocabulary.report()}{Colors.END}")
+
+    # ---- 音頻與串流 ----
+
+    def _audio_pump(self):
+        """從錄音緩衝區讀出音頻（VAD 過濾後），每塊複製一次放進共用緩衝區"""
+        for chunk in self.audio_streamer.get_audio_generator():
+            self.shared_audio.append(bytes(chunk))
+        self.shared_audio.close()
+
+    def _open_stream(self, language, replay_seconds=0.0):
+        """為語言開啟新串流；replay_seconds 時從最近的音頻開始"""
+        with self._streams_lock:
+            self.stream_count += 1
+            stream = LanguageStream(language, self.stream_count,
+                                    self.shared_audio.reader(int(replay_seconds * BYTES_PER_SECOND)))
+            previous = self._streams.get(language)
+            self._streams[language] = stream
+            if previous is not None and not previous.finished.is_set():
+                # 已結束的串流不會再送出結果，也不會再把自己移出 _retired
+                self._retired.append(previous)
+        thread = threading.Thread(target=self._run_stream, args=(stream,))
+        thread.daemon = True
+        thread.start()
+        return previous
+
+    def _close_language(self, language):
+        with self._streams_lock:
+            stream = self._streams.pop(language, None)
+            if stream is not None and not stream.finished.is_set():
+                self._retired.append(stream)
+        if stream is not None:
+            stream.close()
+
+    def _run_stream(self, stream):
+        try:
+            responses = self.connection.open_stream(self.streaming_configs[stream.language],
+                                                    stream.reader.chunks())
+            self.process_responses(responses, stream)
+        except Exception as e:
+            if "Max duration of 5 minutes" not in str(e) and not self.should_stop:
+                self.renderer.print_line(f"{Colors.RED}❌ {stream.language} 會話 #{stream.number} 錯誤: {e}{Colors.END}")
+        finally:
+            stream.close()
+            with self._streams_lock:
+                self.streamed_bytes[stream.language] += stream.reader.bytes_read
+                if stream in self._retired:
+                    self._retired.remove(stream)
+                # 在鎖內標記結束，交接時才能確定它是否還需要放進 _retired
+                stream.ended_at = time.time()
+                stream.finished.set()
+
+    def process_responses(self, responses, stream):
+        """處理某個語言的識別響應：中間結果只顯示領先的語言，最終結果交給語言選擇器"""
+        for response in responses:
+            if self.should_stop:
+                break
+            received_at = time.time()
+            for result in response.results:
+                if not result.alternatives:
+                    continue
+                transcript = result.alternatives[0].transcript.strip()
+                if result.is_final:
+                    raw_transcript = self.finals[stream.language].accept(stream.number, stream.audio_start,
+                                                                         result, transcript)
+                    if raw_transcript:
+                        self.router.submit(candidate_from_result(stream.language, result, raw_transcript,
+                                                                 stream.audio_start, received_at, stream))
+                elif stream.language == self.router.leader:
+                    self.renderer.interim(transcript, extra=f"  [{stream.language}]")
+
+    # ---- 語言選擇回調 ----
+
+    def _on_decision(self, decision):
+        transcript = self.corrector.fix(decision.transcript)
+        self.renderer.final(f"[{decision.spoken_language}] {transcript}")
+        if len(decision.scores) > 1:
+            scores = "、".join(f"{language} {score:.2f}" for language, score in decision.scores.items())
+            self.renderer.print_line(f"{Colors.GREY}   分數: {scores}（等待 {decision.wait_ms:.0f} ms）{Colors.END}")
+        if self.transcript_writer:
+            last = decision.candidates[-1]
+            self.transcript_writer.write(make_record(
+                "final", last.stream.number if last.stream else 0, transcript, last.received_at,
+                raw_text=decision.transcript, language=decision.spoken_language,
+                confidence=round(decision.confidence, 3),
+                audio_start=round(decision.audio_start, 3), audio_end=round(decision.audio_end, 3),
+            ))
+
+    def _on_prune(self, language):
+        self._close_language(language)
+        self.renderer.print_line(f"{Colors.YELLOW}✂️ 關閉 {language} 串流（連續 {self.router.prune_after} 句落後於 "
+                                 f"{self.router.leader}）{Colors.END}")
+
+    def _on_reprobe(self, languages):
+        self.renderer.print_line(f"{Colors.CYAN}🔎 {self.router.leader} 信心偏低，重新開啟: "
+                                 f"{', '.join(languages)}{Colors.END}")
+        for language in languages:
+            if not self.should_stop:
+                self._open_stream(language, REPLAY_SECONDS)
+
+    # ---- 主流程 ----
+
+    def _supervise(self, pump):
+        """處理語言選擇的等待逾時、各語言串流的 5 分鐘交接與異常結束，音頻結束後等所有串流送完"""
+        while not self.should_stop:
+            time.sleep(0.1)
+            self.router.poll()
+            with self._streams_lock:
+                streams = list(self._streams.values())
+                retired = list(self._retired)
+            if not pump.is_alive() and all(stream.finished.is_set() for stream in streams + retired):
+                self.router.flush()
+                self.renderer.print_line(f"{Colors.CYAN}📁 音頻來源已結束{Colors.END}")
+                return
+            if not self.router.active:
+                self.renderer.print_line(f"{Colors.RED}❌ 所有語言的串流都無法使用，停止轉錄{Colors.END}")
+                return
+            for stream in streams:
+                if not pump.is_alive():
+                    break
+                replay_seconds = REPLAY_SECONDS
+                if stream.finished.is_set() and stream.failed_quickly:
+                    # 太快結束（錯誤）：指數退避後再重連，不要每個檢查週期都開一次新串流
+                    if stream.retry_at is None and not self._schedule_retry(stream):
+                        continue
+                    if time.time() < stream.retry_at:
+                        continue
+                    # 等待期間的音頻也要送，重複的最終結果由語言選擇器丟棄
+                    replay_seconds = min(SHARED_BUFFER_SECONDS, REPLAY_SECONDS + time.time() - stream.ended_at)
+                elif stream.finished.is_set():
+                    self.quick_failures[stream.language] = 0
+                elif stream.age() <= SESSION_ROLLOVER_SECONDS:
+                    continue
+                # 先開新串流再關閉舊的；新串流重播最近的音頻，重複的最終結果由去重器丟棄
+                self.renderer.print_line(f"{Colors.CYAN}🔄 {stream.language} 重新連接...{Colors.END}")
+                self._open_stream(stream.language, replay_seconds)
+                stream.close()
+
+    def _schedule_retry(self, stream):
+        """記錄一次立即失敗並排定重試時間；連續失敗太多次時停用該語言並回傳 False"""
+        language = stream.language
+        self.quick_failures[language] += 1
+        failures = self.quick_failures[language]
+        if failures >= MAX_QUICK_FAILURES:
+            with self._streams_lock:
+                if self._streams.get(language) is stream:
+                    del self._streams[language]
+            # 語言選擇器不再等待這個語言的結果
+            self.router.drop(language)
+            self.renderer.print_line(f"{Colors.RED}⛔ {language} 串流連續 {failures} 次立即失敗，停用這個語言{Colors.END}")
+            return False
+        backoff = min(MAX_RETRY_BACKOFF_SECONDS, RETRY_BACKOFF_SECONDS * 2 ** (failures - 1))
+        stream.retry_at = stream.ended_at + backoff
+        self.renderer.print_line(f"{Colors.YELLOW}⏳ {language} 串流立即結束（第 {failures} 次），"
+                                 f"{backoff:.0f} 秒後重試{Colors.END}")
+        return True
+
+    def start(self):
+        """開始多語言轉錄"""
+        print(f"{Colors.BOLD}{Colors.BLUE}🌐 Google Cloud Speech-to-Text V2 多語言實時轉錄{Colors.END}")
+        print("=" * 60)
+        print(f"📍 項目: {os.environ['GOOGLE_CLOUD_PROJECT']}")
+        print(f"🗣️ 同時識別: {', '.join(self.languages)}（每句選出一個語言，落後的語言提前關閉）")
+        print(f"📝 按 Ctrl+C 停止")
+        print("=" * 60)
+
+        load_custom_vocabulary(self.vocabulary_transcripts, watch=True)
+        self.vocabulary_store = get_vocabulary_store(VOCABULARY_FILE, self.vocabulary_transcripts)
+        self.vocabulary_store.subscribe(self._apply_vocabulary)
+        self._apply_vocabulary(self.vocabulary_store.current)
+        self.connection.warm_up()
+
+        if not self.audio_streamer.start_recording():
+            return
+        print("-" * 60)
+
+        try:
+            # 先建立所有語言的讀取端再開始分發，第一塊音頻每個語言都收得到
+            for language in self.languages:
+                self._open_stream(language)
+            pump = threading.Thread(target=self._audio_pump)
+            pump.daemon = True
+            pump.start()
+            self._supervise(pump)
+        except KeyboardInterrupt:
+            print(f"\n\n{Colors.YELLOW}⏹️ 用戶停止轉錄{Colors.END}")
+        except Exception as e:
+            print(f"\n{Colors.RED}❌ 轉錄錯誤: {e}{Colors.END}")
+        finally:
+            self.stop()
+
+    def report(self):
+        """各語言實際串流的音頻秒數，與全部語言一直開著相比節省的比例"""
+        with self._streams_lock:
+            streamed = dict(self.streamed_bytes)
+            for stream in list(self._streams.values()) + self._retired:
+                if not stream.finished.is_set():
+                    streamed[stream.language] += stream.reader.bytes_read
+        total = self.shared_audio.bytes_written * len(self.languages)
+        used = sum(streamed.values())
+        line = "、".join(f"{language} {streamed[language] / BYTES_PER_SECOND:.1f} 秒" for language in self.languages)
+        if total:
+            line += f"（全部語言一直開著需 {total / BYTES_PER_SECOND:.1f} 秒，節省 {1 - used / total:.0%}）"
+        return line
+
+    def stop(self):
+        """停止轉錄"""
+        self.should_stop = True
+        self.audio_streamer.stop_recording()
+        self.shared_audio.close()
+        with self._streams_lock:
+            streams = list(self._streams.values())
+        for stream in streams:
+            stream.close()
+        self.connection.close()
+        print(f"\n{Colors.GREEN}✅ 轉錄已停止{Colors.END}")
+        print(f"📊 總會話數: {self.stream_count}")
+        print(f"🗣️ 語言選擇: {self.router.report()}")
+        print(f"🎵 串流音頻: {self.report()}")
+        if self.vocabulary_store:
+            self.vocabulary_store.unsubscribe(self._apply_vocabulary)
+        print(f"🖥️ {self.renderer.report()}")
+        if self.transcript_writer:
+            self.transcript_writer.close()
+            print(f"💾 {self.transcript_writer.report()}")
+
+
+def main():
+    """主函數"""
+    parser = add_source_arguments(argparse.ArgumentParser(description="Speech-to-Text V2 多語言實時轉錄"))
+    parser.add_argument("--languages", nargs="+", default=LANGUAGE_CODES, metavar="LANG",
+                        help="同時識別的語言代碼（例如 en-US cmn-Hant-TW ja-JP，auto 為自動偵測）")
+    parser.add_argument("--wait", type=float, default=ARBITRATION_WAIT_SECONDS,
+                        help="第一個最終結果到達後等待其他語言的秒數")
+    parser.add_argument("--prune-after", type=int, default=PRUNE_AFTER_LOSSES,
+                        help="連續落後幾句後關閉該語言的串流")
+    parser.add_argument("--transcript", action="append", default=[], metavar="[類型:]路徑",
+                        help="保存轉錄結果（格式同 realtime_chirp2_continuous.py）")
+    args = parser.parse_args()
+
+    try:
+        source = open_source(args.source, RATE, int(RATE / 10), speed=args.speed, loop=args.loop)
+        writer = TranscriptWriter([create_sink(spec) for spec in args.transcript]) if args.transcript else None
+        transcriber = MultiLanguageTranscriber(args.languages, source=source, transcript_writer=writer,
+                                               vocabulary_transcripts=args.transcript,
+                                               wait_seconds=args.wait, prune_after=args.prune_after)
+        transcriber.start()
+    except KeyboardInterrupt:
+        print(f"\n{Colors.YELLOW}👋 再見！{Colors.END}")
+    except Exception as e:
+        print(f"{Colors.RED}❌ 應用程序錯誤: {e}{Colors.END}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,17 @@
 #!/usr/bin/env python3
 """
 簡單的音頻錄製腳本，使用 macOS 的 afrecord 功能
+沒有 afrecord 時（例如 Linux）改用 audio_sources 的麥克風來源直接寫入 WAV
 """
 
 import subprocess
 import sys
 import os
+import wave
 from datetime import datetime
 
+RATE = 16000
+
 def record_audio(output_file="test_audio.wav", duration=10):
     """
     使用 macOS 內建的 afrecord 錄製音頻
@@ -59,9 +63,46 @@ def record_audio(output_file="test_audio.wav", duration=10):
         print("請確保您使用的是 macOS 系統")
         return None
     except FileNotFoundError:
-        print("❌ 找不到 afrecord 命令")
-        print("請確保您使用的是 macOS 系統")
+        print("⚠️ 找不到 afrecord 命令，改用 PyAudio 麥克風錄製")
+        return record_with_source(output_file, duration)
+
+def record_with_source(output_file, duration, source=None):
+    """
+    使用 audio_sources 的音頻來源錄製 16kHz 單聲道 WAV
+    
+    Args:
+        output_file (str): 輸出音頻文件名
+        duration (int): 錄製時長（秒）
+        source: AudioSource，預設為麥克風
+    """
+    from audio_sources import MicrophoneSource
+    
+    source = source or MicrophoneSource(RATE)
+    total_bytes = int(RATE * duration) * 2
+    written = [0]
+    
+    try:
+        with wave.open(output_file, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(RATE)
+            
+            def write(data):
+                data = data[:max(0, total_bytes - written[0])]
+                if data:
+                    wav.writeframes(data)
+                    written[0] += len(data)
+            
+            source.start(write)
+            source.wait(timeout=duration)
+            source.stop()
+    except Exception as e:
+        print(f"❌ 錄製失敗: {e}")
         return None
+    
+    print(f"✅ 錄製完成！音頻已保存到: {output_file}")
+    print(f"📊 錄製時長: {written[0] / 2 / RATE:.1f} 秒")
+    return output_file
 
 def main():
     print("🎙️  音頻錄製工具")
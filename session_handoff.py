@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+跨會話交接的共用邏輯
+流式識別每 5 分鐘必須重新連接；交接時新會話會重播最近一段音頻，
+因此同一段話可能由新舊兩個會話各送出一次最終結果，這裡依結果的音頻區間與重疊單詞去重
+"""
+
+import threading
+
+DUPLICATE_TOLERANCE_SECONDS = 0.1  # 跨會話去重的時間容差
+STRIP_MIN_WORDS = 2                # 沒有單詞時間時，至少這麼多個單詞重複才視為重播的重疊
+EMITTED_HISTORY_SECONDS = 60.0     # 保留已輸出區間的長度（遠大於交接重播的音頻）
+SESSION_HISTORY = 8                # 保留各會話上一個結果結尾的會話數
+
+
+def offset_seconds(offset):
+    """將結果偏移（timedelta 或 Duration）轉為秒數"""
+    if offset is None:
+        return 0.0
+    if hasattr(offset, "total_seconds"):
+        return offset.total_seconds()
+    return offset.seconds + offset.nanos / 1e9
+
+
+def _normalize_word(word):
+    return word.strip(".,!?;:\"'").lower()
+
+
+def overlap_words(previous, current, min_words=1):
+    """previous 結尾與 current 開頭重複的單詞數（至少 min_words 個才算，否則為 0）"""
+    prev_words = [_normalize_word(w) for w in previous.split()]
+    cur_words = [_normalize_word(w) for w in current.split()]
+    for k in range(min(len(prev_words), len(cur_words)), min_words - 1, -1):
+        if k and prev_words[-k:] == cur_words[:k]:
+            return k
+    return 0
+
+
+def strip_overlap(previous, current, min_words=1):
+    """移除 current 開頭與 previous 結尾重複的單詞（跨會話重播或分段重疊造成的重疊）"""
+    k = overlap_words(previous, current, min_words)
+    return " ".join(current.split()[k:]) if k else current
+
+
+class FinalDeduplicator:
+    """
+    最終結果去重器（依音頻區間）
+    每個輸出過的最終結果記下它在整體時間軸上的區間；新結果的區間已完全輸出過時丟棄，
+    只有部分重疊（重播區段）時移除重疊的單詞：有單詞時間時依時間判斷，否則以文字比對（至少 STRIP_MIN_WORDS 個單詞）。
+    結果的開頭為第一個單詞的時間，沒有單詞時間時為同一會話上一個結果的結尾（會話第一個結果為會話音頻的開頭），
+    因此新舊會話的結果以任何順序到達都不會丟失文字
+    """
+
+    def __init__(self, tolerance=DUPLICATE_TOLERANCE_SECONDS):
+        self.tolerance = tolerance
+        self.duplicates = 0
+        self._lock = threading.Lock()
+        self._emitted = []       # [(開始, 結束, 文字)]，依開始排序
+        self._session_ends = {}  # 會話編號 → 該會話上一個最終結果的結尾
+
+    def accept(self, session_number, audio_start, result, transcript):
+        """回傳去重後的文字；整段重複時回傳 None"""
+        return self.accept_span(session_number, audio_start, result, transcript)[0]
+
+    def accept_span(self, session_number, audio_start, result, transcript):
+        """
+        回傳 (去重後的文字, 開頭移除的單詞數, 結尾移除的單詞數)；整段重複時文字為 None
+        單詞數以 transcript 的單詞計算
+        """
+        end_offset = offset_seconds(getattr(result, "result_end_offset", None))
+        alternatives = getattr(result, "alternatives", None)
+        words = list(alternatives[0].words) if alternatives else []
+        tokens = transcript.split()
+
+        with self._lock:
+            previous_end = self._session_ends.get(session_number, audio_start)
+            if end_offset <= 0:
+                # 沒有結束偏移：無法定位，原樣輸出
+                return transcript, 0, 0
+            end = audio_start + end_offset
+            self._session_ends[session_number] = end
+            if len(self._session_ends) > SESSION_HISTORY:
+                del self._session_ends[min(self._session_ends)]
+            timed = bool(words) and len(words) == len(tokens)
+            start = audio_start + offset_seconds(words[0].start_offset) if timed else previous_end
+
+            if self._uncovered(start, end) <= self.tolerance:
+                self.duplicates += 1
+                return None, len(tokens), 0
+
+            head = tail = 0
+            if timed:
+                # 單詞的中點落在已輸出的區間內即為重播的重複單詞
+                covered = [self._covered_at(audio_start + (offset_seconds(w.start_offset)
+                                                           + offset_seconds(w.end_offset)) / 2) for w in words]
+                while head < len(covered) and covered[head]:
+                    head += 1
+                while tail < len(covered) - head and covered[len(covered) - 1 - tail]:
+                    tail += 1
+            else:
+                before = self._containing(start)
+                if before is not None:
+                    head = overlap_words(before[2], transcript, STRIP_MIN_WORDS)
+                after = self._containing(end - self.tolerance, starting_after=start)
+                if after is not None:
+                    tail = overlap_words(" ".join(reversed(after[2].split())),
+                                         " ".join(reversed(tokens[head:])), STRIP_MIN_WORDS)
+
+            kept = tokens[head:len(tokens) - tail]
+            if not kept:
+                self.duplicates += 1
+                return None, head, tail
+            text = " ".join(kept)
+            self._record(start, end, text)
+            return text, head, tail
+
+    def _uncovered(self, start, end):
+        """[start, end] 中尚未輸出的長度"""
+        uncovered = max(0.0, end - start)
+        position = start
+        for emitted_start, emitted_end, _ in self._emitted:
+            if emitted_end <= position or emitted_start >= end:
+                continue
+            uncovered -= max(0.0, min(end, emitted_end) - max(position, emitted_start))
+            position = max(position, emitted_end)
+        return uncovered
+
+    def _covered_at(self, seconds):
+        return any(start - self.tolerance <= seconds <= end + self.tolerance for start, end, _ in self._emitted)
+
+    def _containing(self, seconds, starting_after=None):
+        """包含某個時間點的已輸出結果（starting_after 時只找在該時間之後開始的）"""
+        for emitted in self._emitted:
+            if starting_after is not None and emitted[0] <= starting_after + self.tolerance:
+                continue
+            if emitted[0] - self.tolerance <= seconds < emitted[1]:
+                return emitted
+        return None
+
+    def _record(self, start, end, text):
+        self._emitted.append((start, end, text))
+        self._emitted.sort(key=lambda emitted: emitted[0])
+        # 只保留最近的區間（重播只涵蓋最近幾秒）
+        horizon = max(emitted[1] for emitted in self._emitted) - EMITTED_HISTORY_SECONDS
+        self._emitted = [emitted for emitted in self._emitted if emitted[1] > horizon]
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Speech-to-Text V2 連線管理
+共用一個帶 keepalive 的 gRPC 通道，並在背景預先開啟、送出配置的下一個流式呼叫，
+重新連接時只需要接上音頻；同時記錄每個會話的首個中間結果延遲
+
+設定環境變數 SPEECH_EMULATOR_HOST=localhost:50051 時改連本地模擬伺服器（fake_speech_server.py）
+"""
+
+import os
+import threading
+import time
+from functools import lru_cache
+
+import grpc
+from google.cloud.speech_v2 import SpeechAsyncClient, SpeechClient
+from google.cloud.speech_v2.services.speech.transports import SpeechGrpcAsyncIOTransport, SpeechGrpcTransport
+from google.cloud.speech_v2.types import cloud_speech
+
+DEFAULT_REGION = "us-central1"
+
+# 本地模擬伺服器位址（不加密、不需要認證）
+EMULATOR_HOST_ENV = "SPEECH_EMULATOR_HOST"
+
+# gRPC keepalive：定期 ping 保持通道溫熱，避免閒置後重新握手
+KEEPALIVE_TIME_MS = 30000
+KEEPALIVE_TIMEOUT_MS = 10000
+
+# 預先開啟的流式呼叫閒置太久會被伺服器以「長時間沒有音頻」關閉，超過此時間就重新開啟
+MAX_PREPARED_IDLE_SECONDS = 8
+
+
+def _channel_options(keepalive_time_ms, keepalive_timeout_ms):
+    return [
+        ("grpc.keepalive_time_ms", keepalive_time_ms),
+        ("grpc.keepalive_timeout_ms", keepalive_timeout_ms),
+        ("grpc.keepalive_permit_without_calls", 1),
+        ("grpc.http2.max_pings_without_data", 0),
+        ("grpc.max_send_message_length", -1),
+        ("grpc.max_receive_message_length", -1),
+    ]
+
+
+def create_speech_client(region=DEFAULT_REGION, keepalive_time_ms=KEEPALIVE_TIME_MS,
+                         keepalive_timeout_ms=KEEPALIVE_TIMEOUT_MS, emulator_host=None):
+    """建立使用 keepalive gRPC 通道的 SpeechClient（有設定模擬伺服器時連到本地）"""
+    options = _channel_options(keepalive_time_ms, keepalive_timeout_ms)
+    emulator_host = emulator_host or os.environ.get(EMULATOR_HOST_ENV)
+    if emulator_host:
+        api_endpoint = emulator_host
+        channel = grpc.insecure_channel(emulator_host, options=options)
+    else:
+        api_endpoint = f"{region}-speech.googleapis.com"
+        channel = SpeechGrpcTransport.create_channel(api_endpoint, options=options)
+    transport = SpeechGrpcTransport(host=api_endpoint, channel=channel)
+    return SpeechClient(transport=transport)
+
+
+def create_speech_async_client(region=DEFAULT_REGION, keepalive_time_ms=KEEPALIVE_TIME_MS,
+                               keepalive_timeout_ms=KEEPALIVE_TIMEOUT_MS, emulator_host=None):
+    """建立 asyncio 版的 SpeechAsyncClient（必須在事件迴圈中呼叫）"""
+    options = _channel_options(keepalive_time_ms, keepalive_timeout_ms)
+    emulator_host = emulator_host or os.environ.get(EMULATOR_HOST_ENV)
+    if emulator_host:
+        api_endpoint = emulator_host
+        channel = grpc.aio.insecure_channel(emulator_host, options=options)
+    else:
+        api_endpoint = f"{region}-speech.googleapis.com"
+        channel = SpeechGrpcAsyncIOTransport.create_channel(api_endpoint, options=options)
+    transport = SpeechGrpcAsyncIOTransport(host=api_endpoint, channel=channel)
+    return SpeechAsyncClient(transport=transport)
+
+
+@lru_cache(maxsize=None)
+def get_speech_client(region=DEFAULT_REGION):
+    """取得行程內共用的 SpeechClient（每個區域一個）"""
+    return create_speech_client(region)
+
+
+class StreamTimings:
+    """單一流式會話的時間紀錄"""
+
+    def __init__(self, number):
+        self.number = number
+        self.opened_at = time.time()
+        self.attached_at = None
+        self.first_audio_at = None
+        self.first_response_at = None
+        self.first_interim_at = None
+        self.prewarmed = False
+        self.config_bytes = 0  # 第一個請求（識別器與配置）的大小
+
+    def _ms(self, start, end):
+        if start is None or end is None:
+            return None
+        return (end - start) * 1000
+
+    @property
+    def setup_ms(self):
+        """開啟呼叫到接上音頻之間的時間（預熱時為預先完成的設定時間）"""
+        return self._ms(self.opened_at, self.attached_at)
+
+    @property
+    def time_to_first_interim_ms(self):
+        """接上音頻到收到第一個中間結果的時間"""
+        return self._ms(self.attached_at, self.first_interim_at)
+
+    def summary(self):
+        ttfi = self.time_to_first_interim_ms
+        ttfi_text = f"{ttfi:.0f} ms" if ttfi is not None else "—"
+        size_text = f"，配置請求 {self.config_bytes / 1024:.1f} KB"
+        if self.prewarmed:
+            return (f"會話 #{self.number} (預熱，設定已提前 {self.setup_ms:.0f} ms 完成): "
+                    f"首個中間結果 {ttfi_text}{size_text}")
+        return f"會話 #{self.number} (即時開啟): 首個中間結果 {ttfi_text}{size_text}"
+
+
+class PreparedStream:
+    """
+    預先開啟的流式識別呼叫
+    建立時即在背景送出配置請求（含詞彙適應），之後以 attach() 接上音頻
+    """
+
+    def __init__(self, client, config_request, number):
+        self.client = client
+        self.config_request = config_request
+        self.timings = StreamTimings(number)
+        self.timings.config_bytes = cloud_speech.StreamingRecognizeRequest.pb(config_request).ByteSize()
+        self._audio = None
+        self._attached = threading.Event()
+        self._opened = threading.Event()
+        self._cancelled = False
+        self._responses = None
+        self._error = None
+
+        # streaming_recognize 會等待第一個響應才返回，因此在背景執行緒中開啟
+        thread = threading.Thread(target=self._open)
+        thread.daemon = True
+        thread.start()
+
+    def _requests(self):
+        """請求生成器：先送配置，等待接上音頻後再送音頻"""
+        yield self.config_request
+        self._attached.wait()
+        if self._cancelled:
+            return
+        for chunk in self._audio:
+            if self.timings.first_audio_at is None:
+                self.timings.first_audio_at = time.time()
+            if not isinstance(chunk, bytes):
+                chunk = bytes(chunk)
+            yield cloud_speech.StreamingRecognizeRequest(audio=chunk)
+
+    def _open(self):
+        try:
+            self._responses = self.client.streaming_recognize(requests=self._requests())
+        except Exception as e:
+            self._error = e
+        finally:
+            self._opened.set()
+
+    def idle_seconds(self):
+        return time.time() - self.timings.opened_at
+
+    def attach(self, audio):
+        """接上音頻來源（可迭代的音頻塊），回傳響應迭代器"""
+        self._audio = audio
+        self.timings.attached_at = time.time()
+        self._attached.set()
+        return self._iter_responses()
+
+    def _iter_responses(self):
+        self._opened.wait()
+        if self._error is not None:
+            raise self._error
+
+        for response in self._responses:
+            now = time.time()
+            if self.timings.first_response_at is None:
+                self.timings.first_response_at = now
+            if self.timings.first_interim_at is None and any(
+                result.alternatives and not result.is_final for result in response.results
+            ):
+                self.timings.first_interim_at = now
+            yield response
+
+    def cancel(self):
+        """取消尚未使用的預開呼叫"""
+        self._cancelled = True
+        self._attached.set()
+        responses = self._responses
+        if responses is not None and hasattr(responses, "cancel"):
+            responses.cancel()
+
+
+class SpeechConnectionManager:
+    """
+    連線管理器
+    - 所有會話共用一個 keepalive gRPC 通道
+    - prewarm() 在背景預開下一個流式呼叫，open_stream() 優先使用已預熱的呼叫
+    - 記錄每個會話的首個中間結果延遲
+    """
+
+    def __init__(self, project_id, region=DEFAULT_REGION, client=None,
+                 max_idle_seconds=MAX_PREPARED_IDLE_SECONDS):
+        self.client = client or get_speech_client(region)
+        self.project_id = project_id
+        self.region = region
+        # 預設使用不需建立的 "_" 識別器（配置全部隨第一個請求送出）；
+        # speech_resources.use_server_resources() 會改成伺服器端已建立的識別器
+        self.recognizer = f"projects/{project_id}/locations/{region}/recognizers/_"
+        self.max_idle_seconds = max_idle_seconds
+        self.sessions = []
+        self._next = None
+        self._next_config = None
+        self._lock = threading.Lock()
+
+    def warm_up(self, timeout=10):
+        """先建立 gRPC 連線，讓第一個會話不必等待握手"""
+        try:
+            grpc.channel_ready_future(self.client.transport.grpc_channel).result(timeout=timeout)
+            return True
+        except Exception as e:
+            print(f"⚠️ gRPC 通道預熱失敗: {e}")
+            return False
+
+    def config_request(self, streaming_config):
+        """第一個請求：識別器與流式配置"""
+        return cloud_speech.StreamingRecognizeRequest(
+            recognizer=self.recognizer,
+            streaming_config=streaming_config,
+        )
+
+    def _new_stream(self, streaming_config):
+        return PreparedStream(self.client, self.config_request(streaming_config), len(self.sessions) + 1)
+
+    def prewarm(self, streaming_config):
+        """在背景預開下一個流式呼叫（已有新鮮的預開呼叫時不重複開啟）"""
+        with self._lock:
+            if self._next is not None:
+                if self._next_config is streaming_config and self._next.idle_seconds() < self.max_idle_seconds:
+                    return
+                self._next.cancel()
+            self._next = self._new_stream(streaming_config)
+            self._next_config = streaming_config
+
+    def open_stream(self, streaming_config, audio):
+        """開啟流式識別並接上音頻，回傳響應迭代器"""
+        with self._lock:
+            stream = None
+            if self._next is not None:
+                if self._next_config is streaming_config and self._next.idle_seconds() < self.max_idle_seconds:
+                    stream = self._next
+                    stream.timings.prewarmed = True
+                else:
+                    self._next.cancel()
+                self._next = None
+                self._next_config = None
+            if stream is None:
+                stream = self._new_stream(streaming_config)
+            stream.timings.number = len(self.sessions) + 1
+            self.sessions.append(stream.timings)
+        return stream.attach(audio)
+
+    def report(self):
+        """每個會話的首個中間結果延遲"""
+        return [timings.summary() for timings in self.sessions]
+
+    def close(self):
+        """取消預開呼叫"""
+        with self._lock:
+            if self._next is not None:
+                self._next.cancel()
+                self._next = None
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+伺服器端詞彙資源
+每個流式會話的第一個請求原本都內嵌全部 PhraseSet（數千個詞彙），每 5 分鐘重新連接時重送一次。
+這裡把詞彙與識別配置建立成 Speech V2 的持久資源，會話只以名稱引用：
+- 每組內嵌 PhraseSet 建立成一個 PhraseSet 資源，ID 取自內容雜湊（<前綴>-vocab-<雜湊>），內容改變時換新資源
+- 識別配置（改為引用上述 PhraseSet）建立成 Recognizer 資源，ID 取自不含詞彙的配置雜湊，詞彙改變時原地更新
+- 內容雜湊記在資源的 annotations，同步時只建立、更新或還原雜湊不同的資源
+- 同步結果記在 RESOURCES_FILE；之後啟動時配置未變就直接使用記錄，不發出任何請求
+- 第一個請求只剩識別器名稱與流式功能
+
+    python speech_resources.py sync      # 依 custom_vocabulary.json 同步連續轉錄使用的資源
+    python speech_resources.py status    # 檢查記錄的資源是否仍存在且內容一致
+    python speech_resources.py prune     # 刪除記錄中沒有引用的資源
+
+設定 SPEECH_EMULATOR_HOST 時對本地模擬伺服器（fake_speech_server.py）操作
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+
+from google.api_core.exceptions import GoogleAPICallError, NotFound
+from google.cloud.speech_v2.types import cloud_speech
+from google.protobuf import field_mask_pb2
+
+from speech_connection import DEFAULT_REGION, get_speech_client
+
+RESOURCES_FILE = "speech_resources.json"
+RESOURCE_PREFIX = "realtime-stt"
+HASH_ANNOTATION = "content-hash"
+HASH_LENGTH = 12            # 資源 ID 使用的雜湊長度
+OPERATION_TIMEOUT = 120     # 等待建立 / 更新完成的秒數
+
+# 資源類型：(訊息類別, 集合名稱, 更新時覆寫的欄位)
+RESOURCE_KINDS = {
+    "phrase_set": (cloud_speech.PhraseSet, "phraseSets", ("phrases", "boost")),
+    "recognizer": (cloud_speech.Recognizer, "recognizers", ("default_recognition_config",)),
+}
+
+
+def content_hash(message):
+    """proto 訊息的內容雜湊（序列化後取 SHA-1）"""
+    return hashlib.sha1(type(message).serialize(message)).hexdigest()
+
+
+def _copy(message):
+    return type(message).deserialize(type(message).serialize(message))
+
+
+def referenced_streaming_config(streaming_config):
+    """引用識別器時的流式配置：識別配置由識別器提供，只保留流式功能"""
+    return cloud_speech.StreamingRecognitionConfig(streaming_features=streaming_config.streaming_features)
+
+
+class ResourceManager:
+    """
+    同步並記錄伺服器端的 PhraseSet / Recognizer
+    lookup() 只查本地記錄；sync() 依內容雜湊建立或更新資源後更新記錄
+    """
+
+    def __init__(self, client, project_id, region=DEFAULT_REGION, prefix=RESOURCE_PREFIX,
+                 state_path=RESOURCES_FILE):
+        self.client = client
+        self.parent = f"projects/{project_id}/locations/{region}"
+        self.prefix = prefix
+        self.state_path = state_path
+        self.state = self._load_state()
+        self.actions = []  # 本次同步的 (類型, 名稱, 動作)
+
+    def _load_state(self):
+        state = None
+        if self.state_path and os.path.exists(self.state_path):
+            try:
+                with open(self.state_path, "r", encoding="utf-8") as f:
+                    state = json.load(f)
+            except ValueError:
+                state = None
+        if not state or state.get("parent") != self.parent:
+            # 換了專案或區域時，之前的記錄不適用
+            state = {"parent": self.parent, "recognizers": {}}
+        return state
+
+    def _save_state(self):
+        if not self.state_path:
+            return
+        # 先寫入暫存檔再改名，中斷時不會留下半個記錄
+        temporary = self.state_path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        os.replace(temporary, self.state_path)
+
+    def lookup(self, recognition_config):
+        """配置與上次同步相同時回傳識別器名稱，否則回傳 None（不發出請求）"""
+        entry = self.state["recognizers"].get(content_hash(recognition_config))
+        return entry["name"] if entry else None
+
+    def sync(self, recognition_config):
+        """把內嵌的 PhraseSet 與識別配置同步成伺服器端資源，回傳識別器名稱"""
+        digest = content_hash(recognition_config)
+        default_config = _copy(recognition_config)
+
+        phrase_sets = []
+        if "adaptation" in default_config:
+            references = []
+            for item in default_config.adaptation.phrase_sets:
+                if "inline_phrase_set" in item:
+                    phrase_set = cloud_speech.PhraseSet(phrases=item.inline_phrase_set.phrases,
+                                                        boost=item.inline_phrase_set.boost)
+                    phrase_set_hash = content_hash(phrase_set)
+                    name = self._ensure("phrase_set", f"{self.prefix}-vocab-{phrase_set_hash[:HASH_LENGTH]}",
+                                        phrase_set, phrase_set_hash)
+                    item = cloud_speech.SpeechAdaptation.AdaptationPhraseSet(phrase_set=name)
+                phrase_sets.append(item.phrase_set)
+                references.append(item)
+            default_config.adaptation.phrase_sets = references
+
+        # 識別器 ID 不含詞彙：詞彙改變時更新同一個識別器，不同功能設定的入口各有自己的識別器
+        base_config = _copy(default_config)
+        base_config.adaptation = None
+        recognizer_id = f"{self.prefix}-{content_hash(base_config)[:HASH_LENGTH]}"
+        recognizer = cloud_speech.Recognizer(default_recognition_config=default_config)
+        name = self._ensure("recognizer", recognizer_id, recognizer, content_hash(default_config))
+
+        # 同一個識別器的舊記錄已不符合伺服器上的內容
+        recognizers = {key: entry for key, entry in self.state["recognizers"].items() if entry["name"] != name}
+        recognizers[digest] = {"name": name, "phrase_sets": phrase_sets, "synced_at": time.time()}
+        self.state["recognizers"] = recognizers
+        self._save_state()
+        return name
+
+    def _ensure(self, kind, resource_id, resource, digest):
+        """確保資源存在且內容雜湊為 digest，回傳資源名稱"""
+        message_class, collection, fields = RESOURCE_KINDS[kind]
+        name = f"{self.parent}/{collection}/{resource_id}"
+        resource.annotations = {HASH_ANNOTATION: digest}
+
+        try:
+            existing = getattr(self.client, f"get_{kind}")(name=name)
+        except NotFound:
+            existing = None
+
+        if existing is None:
+            operation = getattr(self.client, f"create_{kind}")(
+                parent=self.parent, **{kind: resource, f"{kind}_id": resource_id})
+            action = "建立"
+        else:
+            restored = existing.state == message_class.State.DELETED
+            if restored:
+                # 刪除後仍在保留期內的資源不能以相同 ID 重新建立，只能還原
+                getattr(self.client, f"undelete_{kind}")(name=name).result(timeout=OPERATION_TIMEOUT)
+            if existing.annotations.get(HASH_ANNOTATION) == digest:
+                if restored:
+                    self.actions.append((kind, name, "還原"))
+                return name
+            resource.name = name
+            operation = getattr(self.client, f"update_{kind}")(
+                **{kind: resource, "update_mask": field_mask_pb2.FieldMask(paths=[*fields, "annotations"])})
+            action = "更新"
+        operation.result(timeout=OPERATION_TIMEOUT)
+        self.actions.append((kind, name, action))
+        return name
+
+    def status(self):
+        """檢查記錄中的每個資源，回傳 (名稱, 狀態說明) 列表"""
+        results = []
+        for entry in self.state["recognizers"].values():
+            for kind, name in [("recognizer", entry["name"])] + [("phrase_set", n) for n in entry["phrase_sets"]]:
+                try:
+                    resource = getattr(self.client, f"get_{kind}")(name=name)
+                except NotFound:
+                    results.append((name, "不存在"))
+                    continue
+                if resource.state == RESOURCE_KINDS[kind][0].State.DELETED:
+                    results.append((name, "已刪除"))
+                elif kind == "phrase_set":
+                    results.append((name, f"{len(resource.phrases)} 個詞彙"))
+                else:
+                    results.append((name, "正常"))
+        return results
+
+    def prune(self, dry_run=False):
+        """刪除以本前綴建立、但記錄中沒有引用的資源，回傳刪除的名稱"""
+        referenced = set()
+        for entry in self.state["recognizers"].values():
+            referenced.add(entry["name"])
+            referenced.update(entry["phrase_sets"])
+
+        removed = []
+        # 先刪除識別器，再刪除可能被它們引用的 PhraseSet
+        for kind, listing in (("recognizer", "recognizers"), ("phrase_set", "phrase_sets")):
+            collection = RESOURCE_KINDS[kind][1]
+            for resource in getattr(self.client, f"list_{listing}")(parent=self.parent):
+                if resource.name in referenced or not resource.name.startswith(f"{self.parent}/{collection}/{self.prefix}-"):
+                    continue
+                if not dry_run:
+                    getattr(self.client, f"delete_{kind}")(name=resource.name).result(timeout=OPERATION_TIMEOUT)
+                removed.append(resource.name)
+        return removed
+
+    def report(self):
+        labels = {"phrase_set": "PhraseSet", "recognizer": "Recognizer"}
+        return [f"{action} {labels[kind]} {name.rsplit('/', 1)[-1]}" for kind, name, action in self.actions]
+
+
+def resolve_recognizer(client, project_id, region, recognition_config, state_path=RESOURCES_FILE, emit=print):
+    """
+    取得與 recognition_config 內容相同的伺服器端識別器名稱：記錄相符時直接使用，否則先同步
+    同步失敗時輸出警告並回傳 None（呼叫端繼續使用內嵌配置）；emit 為接收一行文字的函數
+    """
+    manager = ResourceManager(client, project_id, region, state_path=state_path)
+    recognizer = manager.lookup(recognition_config)
+    if recognizer:
+        return recognizer
+    try:
+        recognizer = manager.sync(recognition_config)
+    except GoogleAPICallError as e:
+        emit(f"⚠️ 伺服器端資源同步失敗，改用內嵌配置: {e}")
+        return None
+    for line in manager.report():
+        emit(f"☁️ {line}")
+    return recognizer
+
+
+def use_server_resources(connection, streaming_config, state_path=RESOURCES_FILE, emit=print):
+    """
+    讓 SpeechConnectionManager 以名稱引用伺服器端識別器
+    回傳之後開啟會話使用的 streaming_config（同步失敗時為原配置）
+    """
+    recognizer = resolve_recognizer(connection.client, connection.project_id, connection.region,
+                                    streaming_config.config, state_path, emit)
+    if recognizer is None:
+        return streaming_config
+    connection.recognizer = recognizer
+    emit(f"☁️ 使用伺服器端識別器 {recognizer.rsplit('/', 1)[-1]}（詞彙不再隨每個會話送出）")
+    return referenced_streaming_config(streaming_config)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="同步 Speech V2 伺服器端的 PhraseSet 與 Recognizer")
+    parser.add_argument("command", choices=("sync", "status", "prune"))
+    parser.add_argument("--project", default=os.environ.get("GOOGLE_CLOUD_PROJECT"), help="GCP 項目 ID")
+    parser.add_argument("--region", default=DEFAULT_REGION)
+    parser.add_argument("--state", default=RESOURCES_FILE, help="本地同步記錄")
+    parser.add_argument("--word-timestamps", action="store_true",
+                        help="sync：同步開啟單詞時間戳記時使用的配置")
+    parser.add_argument("--dry-run", action="store_true", help="prune：只列出不刪除")
+    args = parser.parse_args()
+    if not args.project:
+        parser.error("請設置 GOOGLE_CLOUD_PROJECT 或使用 --project")
+
+    manager = ResourceManager(get_speech_client(args.region), args.project, args.region, state_path=args.state)
+    if args.command == "sync":
+        from realtime_chirp2_continuous import build_recognition_config, load_custom_vocabulary
+
+        vocabulary = load_custom_vocabulary()
+        recognition_config = build_recognition_config(vocabulary, args.word_timestamps)
+        started = time.perf_counter()
+        recognizer = manager.sync(recognition_config)
+        elapsed = (time.perf_counter() - started) * 1000
+        for line in manager.report() or ["所有資源內容未變"]:
+            print(f"☁️ {line}")
+        print(f"✅ 識別器 {recognizer}（耗時 {elapsed:.0f} ms）")
+    elif args.command == "status":
+        results = manager.status()
+        if not results:
+            print("ℹ️ 沒有同步記錄，請先執行 sync")
+        for name, state in results:
+            print(f"{'✅' if state not in ('不存在', '已刪除') else '❌'} {name}: {state}")
+    else:
+        removed = manager.prune(dry_run=args.dry_run)
+        for name in removed:
+            print(f"🗑️ {'將刪除' if args.dry_run else '已刪除'} {name}")
+        print(f"共 {len(removed)} 個未引用的資源")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+專有名詞模糊修正
+大小寫修正只處理寫法正確、大小寫不同的詞彙；這裡修正識別成相近拼寫或讀音的詞彙，
+例如 "hon high" → "Hon Hai"、"auto core AI" → "AutoCore.Ai"：
+- 詞彙與轉錄中的連續英文單詞都壓成緊湊鍵（小寫、只留英數字），因此斷詞與標點不同也能比對
+- 三種比對依序嘗試：緊湊鍵相同 → 編輯距離在預算內（字元三元組倒排索引找候選）→ 讀音鍵相同且只多一點編輯
+- 每個最終結果只掃描一次：對每個起點嘗試 1..MAX_SPAN_TOKENS 個單詞，取最長的匹配
+- 避免改寫一般英文：片段的單詞數不能超過詞彙的組成部分（"a firestone" 不會變成 Firestore，
+  逐字母拼出的縮寫例外），只由常見單詞組成的片段不做模糊修正（"at the"、"open a"；系統字典為選用），只差字尾的不算（"pandas"、"networks"），
+  讀音比對只用在逐詞對應的多詞詞彙（"hon high" → "Hon Hai"）
+- 片段的比對結果有快取，常見單詞不必重複查索引
+- 只處理含英文字母的詞彙；中文詞彙仍只由大小寫修正器處理
+"""
+
+import os
+import re
+
+from capitalization import PhraseCorrector
+
+MAX_SPAN_TOKENS = 6      # 一個片段最多包含的單詞數
+MIN_FUZZY_CHARS = 5      # 緊湊鍵少於此長度時只接受完全相同
+MAX_EDITS = 2            # 編輯距離上限
+EDIT_RATIO = 0.2         # 每個字元允許的編輯數（長度 5 允許 1 個、10 以上允許 2 個）
+PHONETIC_EXTRA_EDITS = 2  # 讀音鍵相同時比編輯預算多允許的編輯數
+MATCH_CACHE_SIZE = 20000  # 片段比對結果快取的數量
+
+TOKEN_PATTERN = re.compile(r"[A-Za-z0-9]+(?:['.][A-Za-z0-9]+)*")
+GAP_PATTERN = re.compile(r"[\s\-.]*")  # 同一片段中單詞之間可以出現的字元
+NON_ALNUM = re.compile(r"[^0-9a-z]")
+LATIN = re.compile(r"^[\x00-\x7f]+$")
+PART_PATTERN = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+")  # 詞彙的組成部分（AutoCore.Ai → Auto Core Ai）
+
+USE_SYSTEM_DICTIONARY = False  # 另外以系統字典判斷一般單詞（結果會依機器上安裝的字典而不同，預設不用）
+DICTIONARY_FILE = "/usr/share/dict/words"
+INFLECTION_SUFFIXES = ("s", "es", "er", "ers", "ed", "d", "ing")  # 只差這些字尾的是另一個詞形，不是識別錯誤
+
+# 常見英文單詞：片段只由這些詞組成時不做模糊修正（只接受寫法完全相同）
+COMMON_WORDS = frozenset("""
+a about above after again all also always an and another any app are around as ask at away back
+bad be because been before being best better between big bill board book both box bring build
+but buy by call came can car case cause change check city close code come coming common could
+count course cover crew cut data day deal did different do does doing done door down
+drop during each early end engineer engineers even every face fact fall far feel few file find
+fine fire first five flow for form found four free from full game gave general get give go going
+good got great group had hand happen has have he head hear help her here high him his hold home
+hot how idea if in inside interface interfaces into is it item its job just keep key kind know
+large last late later lead learn left less let level life light like line list little live long
+look lot low made make man many market may me mean meet might mind more most move much must my
+name near need network networks never new next nice night no not note now number of off offer
+office often old on once one only open or order other our out over own page paper
+part pass past pay people person pick piece place plan play point post power price problem
+product program public put question quite rather read ready real really report rest right road
+room run said same saw say school see seem send set several she short should show side simple
+since small so some something soon sound speech stand start state stay still stock stop story
+study such sure system table take talk team tell test text than that the their them then there
+these they thing think this those though three through time to today together told too
+took top total toward tried true try turn two under until up upon us use used user users very
+view wait walk want was watch water way we week well went were what when where which while who
+whole why will with word work world would write year yes yet you your
+""".split())
+
+# 讀音鍵：相近的拼寫對應到同一個音，去掉首字母以外的母音與半母音後合併重複字母
+PHONETIC_RULES = [(re.compile(pattern), replacement) for pattern, replacement in (
+    (r"ph", "f"), (r"gh", ""), (r"ck", "k"), (r"sh", "s"), (r"qu", "kw"),
+    (r"c(?=[eiy])", "s"), (r"x", "ks"),
+)]
+PHONETIC_MAP = str.maketrans("bcdgjqvz", "pktkkkfs")
+SILENT = set("aeiouhwy")
+
+
+def compact_key(text):
+    """小寫、只留英數字"""
+    return NON_ALNUM.sub("", text.lower())
+
+
+def phonetic_key(key):
+    """緊湊鍵的讀音鍵（簡化的 Metaphone，不需額外套件）"""
+    if not key:
+        return ""
+    for pattern, replacement in PHONETIC_RULES:
+        key = pattern.sub(replacement, key)
+    key = key.translate(PHONETIC_MAP)
+    if not key:
+        return ""
+    result = "a" if key[0] in "aeiou" else key[0]
+    for char in key[1:]:
+        if char not in SILENT and char != result[-1]:
+            result += char
+    return result
+
+
+def edit_budget(length):
+    """緊湊鍵長度允許的編輯距離"""
+    if length < MIN_FUZZY_CHARS:
+        return 0
+    return min(MAX_EDITS, int(length * EDIT_RATIO))
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein 距離；超過 limit 時提早結束並回傳 limit + 1"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        best = i
+        for j, char_b in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+            current.append(cost)
+            if cost < best:
+                best = cost
+        if best > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+_dictionary = None
+
+
+def is_dictionary_word(word):
+    """是否為一般英文單詞（常見單詞表；USE_SYSTEM_DICTIONARY 時加上系統字典）"""
+    global _dictionary
+    word = word.lower()
+    if word in COMMON_WORDS:
+        return True
+    if not USE_SYSTEM_DICTIONARY:
+        return False
+    if _dictionary is None:
+        _dictionary = frozenset()
+        if os.path.exists(DICTIONARY_FILE):
+            try:
+                with open(DICTIONARY_FILE, encoding="utf-8", errors="ignore") as f:
+                    _dictionary = frozenset(line.strip().lower() for line in f if line.strip())
+            except OSError:
+                pass
+    return word in _dictionary
+
+
+def has_inflection(key, other):
+    """兩個緊湊鍵是否只差一個詞形字尾（"panda" / "pandas"、"engineer" / "engine"）"""
+    if len(key) < len(other):
+        key, other = other, key
+    return key.startswith(other) and key[len(other):] in INFLECTION_SUFFIXES
+
+
+def term_parts(term):
+    """詞彙的組成部分數（空白、標點與大小寫交界都算分隔）"""
+    return max(1, len(PART_PATTERN.findall(term)))
+
+
+def _trigrams(key):
+    padded = "^" + key + "$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class FuzzyCorrector:
+    """
+    已編譯的模糊修正器 - 建立一次，對每個最終結果單次掃描
+    corrections 為累計修正次數
+    """
+
+    def __init__(self, phrases, max_span_tokens=MAX_SPAN_TOKENS):
+        self.terms = []       # 詞彙的原始寫法
+        self._keys = []       # 詞彙的緊湊鍵
+        self._grams = []      # 詞彙緊湊鍵的三元組集合
+        self._parts = []      # 詞彙的組成部分數
+        self._exact = {}      # 緊湊鍵 → 詞彙編號
+        self._phonetic = {}   # 讀音鍵 → [詞彙編號]
+        self._postings = {}   # 三元組 → [詞彙編號]
+        self._cache = {}
+        self.corrections = 0
+
+        max_words = 0
+        max_length = 0
+        for phrase in phrases:
+            key = compact_key(phrase)
+            if len(key) < 2 or key in self._exact or not LATIN.match(phrase):
+                continue
+            term_id = len(self.terms)
+            self.terms.append(phrase)
+            self._keys.append(key)
+            self._grams.append(_trigrams(key))
+            self._parts.append(term_parts(phrase))
+            self._exact[key] = term_id
+            max_words = max(max_words, len(TOKEN_PATTERN.findall(phrase)))
+            max_length = max(max_length, len(key))
+            if len(key) >= MIN_FUZZY_CHARS:
+                self._phonetic.setdefault(phonetic_key(key), []).append(term_id)
+                for gram in _trigrams(key):
+                    self._postings.setdefault(gram, []).append(term_id)
+
+        # 口語常把一個詞拆成多個單詞（例如 AutoCore.Ai → auto core AI），多留兩個單詞的餘裕
+        self.max_span_tokens = min(max_span_tokens, max_words + 2)
+        self.max_key_length = max_length + MAX_EDITS
+
+    def __len__(self):
+        return len(self.terms)
+
+    def match(self, key):
+        """緊湊鍵的最佳匹配 (詞彙編號, 編輯距離, 是否只靠讀音)；沒有時回傳 None"""
+        cached = self._cache.get(key, False)
+        if cached is not False:
+            return cached
+        result = self._match(key)
+        if len(self._cache) >= MATCH_CACHE_SIZE:
+            self._cache.clear()
+        self._cache[key] = result
+        return result
+
+    def _match(self, key):
+        term_id = self._exact.get(key)
+        if term_id is not None:
+            return term_id, 0, False
+        length = len(key)
+        if length < MIN_FUZZY_CHARS:
+            return None
+
+        best = None
+        budget = edit_budget(length)
+        if budget:
+            # 前綴過濾：k 個編輯最多讓 3k 個不同的三元組消失，所以距離在 k 以內的詞彙
+            # 必定出現在任意 3k + 1 個三元組的倒排列表之一；取最稀有的（不在索引中的最先）
+            grams = _trigrams(key)
+            postings = sorted((self._postings.get(gram, ()) for gram in grams), key=len)
+            candidates = set()
+            for posting in postings[:3 * budget + 1]:
+                candidates.update(posting)
+            for term_id in candidates:
+                other = self._keys[term_id]
+                if abs(len(other) - length) > budget:
+                    continue
+                # 計數過濾：雙方都最多有 3k 個三元組不在對方之中
+                term_grams = self._grams[term_id]
+                if len(grams & term_grams) < max(len(grams), len(term_grams)) - 3 * budget:
+                    continue
+                distance = edit_distance(key, other, budget)
+                if distance <= budget and (best is None or distance < best[1]):
+                    best = (term_id, distance, False)
+
+        if best is None:
+            limit = budget + PHONETIC_EXTRA_EDITS
+            sound = phonetic_key(key)
+            if len(sound) >= 2:
+                for term_id in self._phonetic.get(sound, ()):
+                    distance = edit_distance(key, self._keys[term_id], limit)
+                    if distance <= limit and (best is None or distance < best[1]):
+                        best = (term_id, distance, True)
+        return best
+
+    def accept(self, found, key, words):
+        """匹配是否可信（words 為片段的單詞）；過濾會改寫一般英文的匹配"""
+        term_id, distance, phonetic = found
+        parts = self._parts[term_id]
+        # 多個單詞只能對應到由同樣多部分組成的詞彙（"a firestone" ≠ Firestore），逐字母拼出的縮寫例外（"a p i"）
+        if len(words) > parts and not all(len(word) == 1 for word in words):
+            return False
+        if distance == 0:
+            return True
+        # 全部由一般單詞組成的片段是正常的英文（"at the" ≠ OAuth、"open a" ≠ OpenAI）
+        if all(is_dictionary_word(word) for word in words):
+            return False
+        # 只差詞形字尾（複數、-er 等）是另一個詞，不是識別錯誤（"pandas"、"networks"、"app engineer"）
+        if has_inflection(key, self._keys[term_id]):
+            return False
+        # 讀音比對只用於逐詞對應的多詞詞彙（"hon high" → "Hon Hai"）
+        if phonetic and (len(words) < 2 or len(words) != parts):
+            return False
+        return True
+
+    def find(self, text):
+        """找出要修正的片段，回傳 [(開始, 結束, 詞彙), ...]（不重疊、依位置排列）"""
+        if not self.terms or not text:
+            return []
+        tokens = [(match.start(), match.end(), match.group(0)) for match in TOKEN_PATTERN.finditer(text)]
+        spans = []
+        index = 0
+        while index < len(tokens):
+            best = None
+            key = ""
+            words = []
+            for end in range(index, min(len(tokens), index + self.max_span_tokens)):
+                if end > index and not GAP_PATTERN.fullmatch(text, tokens[end - 1][1], tokens[end][0]):
+                    break
+                key += compact_key(tokens[end][2])
+                words.append(tokens[end][2])
+                if len(key) > self.max_key_length:
+                    break
+                found = self.match(key)
+                if found is not None and not self.accept(found, key, words):
+                    found = None
+                # 較長的片段只在編輯距離不變大時取代較短的匹配（避免把後面的單詞吃進來）
+                if found is not None and (best is None or found[1] <= best[1]):
+                    best = (found[0], found[1], end)
+            if best is None:
+                index += 1
+                continue
+            term_id, _, end = best
+            start, stop = tokens[index][0], tokens[end][1]
+            if " ".join(text[start:stop].split()) != self.terms[term_id]:
+                spans.append((start, stop, self.terms[term_id]))
+            index = end + 1
+        return spans
+
+    def fix(self, text):
+        """把識別錯誤的詞彙換成詞彙表中的寫法"""
+        spans = self.find(text)
+        if not spans:
+            return text
+        self.corrections += len(spans)
+        parts = []
+        position = 0
+        for start, stop, term in spans:
+            parts.append(text[position:start])
+            parts.append(term)
+            position = stop
+        parts.append(text[position:])
+        return "".join(parts)
+
+
+class TermCorrector:
+    """先模糊修正拼寫，再修正大小寫（介面與 PhraseCorrector 相同）"""
+
+    def __init__(self, phrases):
+        phrases = list(phrases)
+        self.fuzzy = FuzzyCorrector(phrases)
+        self.exact = PhraseCorrector(phrases)
+
+    def __len__(self):
+        return len(self.exact)
+
+    def fix(self, text):
+        return self.exact.fix(self.fuzzy.fix(text))
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+增量終端顯示
+中間結果每秒更新好幾次，整行以 \\r 重寫再補空白既浪費輸出，補白長度也因中文與 emoji 佔兩格而算錯：
+- 與上一次顯示的內容比較，游標退回到第一個不同的字元，只重寫改變的尾段，多餘部分以 \\033[K 清除
+- 以 East Asian Width 計算顯示寬度（中文、全形、emoji 佔兩格，組合字元與 ANSI 控制碼不佔寬度）
+- 超過終端寬度時只顯示結尾（前面以 … 表示），確保中間結果永遠在同一行內，不會因換行而殘留
+- 重繪頻率不超過 max_fps，之間的更新只記錄最新內容，下次重繪或最終結果時一起顯示
+- stats() 回傳重繪次數、略過次數與輸出字節數，可用來衡量輸出量
+"""
+
+import re
+import shutil
+import sys
+import threading
+import time
+import unicodedata
+from functools import lru_cache
+
+GREY = "\033[90m"
+GREEN = "\033[92m"
+MAGENTA = "\033[95m"
+RESET = "\033[0m"
+CLEAR_TO_END = "\033[K"
+
+MAX_FPS = 30  # 中間結果最多每秒重繪次數
+ELLIPSIS = "…"
+ANSI_PATTERN = re.compile(r"\033\[[0-9;]*[A-Za-z]")
+
+
+@lru_cache(maxsize=4096)
+def char_width(char):
+    """單一字元的顯示寬度（0、1 或 2）"""
+    if " " <= char < "\x7f":
+        return 1
+    if unicodedata.combining(char) or unicodedata.category(char) in ("Mn", "Me", "Cf"):
+        # 組合字元、變體選擇符、零寬連接符
+        return 0
+    if unicodedata.east_asian_width(char) in ("W", "F"):
+        return 2
+    return 1
+
+
+def display_width(text):
+    """字串的顯示寬度（忽略 ANSI 控制碼）"""
+    if "\033" in text:
+        text = ANSI_PATTERN.sub("", text)
+    if text.isascii():
+        return len(text)
+    return sum(char_width(char) for char in text)
+
+
+def fit_tail(text, width):
+    """保留 text 的結尾使其顯示寬度不超過 width，被截掉的開頭以 … 表示"""
+    if display_width(text) <= width:
+        return text
+    budget = width - char_width(ELLIPSIS)
+    start = len(text)
+    while start > 0 and char_width(text[start - 1]) <= budget:
+        budget -= char_width(text[start - 1])
+        start -= 1
+    return ELLIPSIS + text[start:]
+
+
+def _common_prefix_length(a, b):
+    """兩字串共同開頭的長度（以切片比較二分搜尋，比逐字迴圈快）"""
+    low, high = 0, min(len(a), len(b))
+    if a[:high] == b[:high]:
+        return high
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[:middle] == b[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+class TerminalRenderer:
+    """
+    中間結果增量顯示器（執行緒安全）
+    interim() 覆寫同一行，final() 把該行換成最終結果並換行；
+    print_line() 在中間結果之上插入一般訊息
+    """
+
+    def __init__(self, stream=None, max_fps=MAX_FPS, columns=None, interim_prefix="🔘 ", final_prefix="✅ "):
+        self.stream = stream or sys.stdout
+        self.min_interval = 1.0 / max_fps if max_fps else 0.0
+        self._columns = columns
+        self._terminal_columns = 100
+        self._columns_checked = float("-inf")
+        self.interim_prefix = interim_prefix
+        self.final_prefix = final_prefix
+        self._lock = threading.Lock()
+
+        self._shown = ("", [])  # 目前畫面上這一行的文字與顏色區段（不含前綴）
+        self._offset = 0        # 超過一行時，顯示起點在完整文字中的位置
+        self._line_open = False
+        self._pending = None  # 因限速而尚未顯示的中間結果
+        self._flush_timer = None
+        self._last_draw = 0.0
+
+        self.draws = 0
+        self.full_redraws = 0
+        self.skipped = 0
+        self.bytes_written = 0
+
+    @property
+    def columns(self):
+        if self._columns:
+            return self._columns
+        now = time.monotonic()
+        if now - self._columns_checked > 1.0:
+            # 終端大小每秒最多查詢一次
+            self._columns_checked = now
+            self._terminal_columns = shutil.get_terminal_size((100, 24)).columns
+        return self._terminal_columns
+
+    def _write(self, data):
+        self.stream.write(data)
+        self.bytes_written += len(data.encode("utf-8"))
+
+    @staticmethod
+    def _color_at(spans, index):
+        for start, end, color in spans:
+            if start <= index < end:
+                return color
+        return None
+
+    @staticmethod
+    def _styled(text, spans, start):
+        """text[start:] 加上顏色控制碼"""
+        output = []
+        for span_start, span_end, color in spans:
+            if span_end <= start:
+                continue
+            output.append((color or RESET) + text[max(start, span_start):span_end])
+        if output:
+            output.append(RESET)
+        return "".join(output)
+
+    def interim(self, text, extra="", extra_color=MAGENTA):
+        """顯示中間結果（extra 為接在後面、以另一種顏色顯示的文字，例如預覽譯文）"""
+        segments = [(text, GREY)]
+        if extra:
+            segments += [(" ", None), (extra, extra_color)]
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_draw < self.min_interval:
+                self._pending = segments
+                self.skipped += 1
+                if self._flush_timer is None:
+                    # 之後沒有新的中間結果時，仍在下一個重繪時間點顯示最新內容
+                    self._flush_timer = threading.Timer(self._last_draw + self.min_interval - now, self.flush)
+                    self._flush_timer.daemon = True
+                    self._flush_timer.start()
+                return
+            self._pending = None
+            self._draw(segments)
+            self._last_draw = now
+            self.stream.flush()
+
+    def _draw(self, segments):
+        width = max(10, self.columns - display_width(self.interim_prefix) - 1)
+        plain = "".join(text for text, _ in segments)
+
+        # 超過一行時只顯示結尾；起點以半行為單位跳動，讓相鄰兩次顯示的開頭保持相同，增量重寫才有效
+        offset = self._offset if self._offset <= len(plain) else 0
+        if display_width(plain[offset:]) > width - (1 if offset else 0):
+            kept = fit_tail(plain, width // 2)
+            offset = len(plain) - len(kept) + 1
+        elif offset and display_width(plain) <= width:
+            offset = 0
+        self._offset = offset
+
+        text = (ELLIPSIS + plain[offset:]) if offset else plain
+        shift = offset - 1 if offset else 0  # plain 的位置對應到 text 的位置
+        spans = [(0, 1, GREY)] if offset else []
+        lower = 1 if offset else 0
+        position = 0
+        for segment, color in segments:
+            start, end = max(position - shift, lower), position + len(segment) - shift
+            if end > start:
+                spans.append((start, end, color))
+            position += len(segment)
+
+        if not self._line_open:
+            self._write("\r" + self.interim_prefix + self._styled(text, spans, 0) + CLEAR_TO_END)
+            self._line_open = True
+            self.full_redraws += 1
+        else:
+            old_text, old_spans = self._shown
+            if text == old_text and spans == old_spans:
+                return
+            common = _common_prefix_length(old_text, text)
+            # 顏色不同也算改變
+            for start in sorted({span[0] for span in old_spans + spans}):
+                if start >= common:
+                    break
+                if self._color_at(old_spans, start) != self._color_at(spans, start):
+                    common = start
+                    break
+            back = display_width(old_text[common:])
+            output = f"\033[{back}D" if back else ""
+            output += self._styled(text, spans, common)
+            if common < len(old_text):
+                output += CLEAR_TO_END
+            self._write(output)
+        self._shown = (text, spans)
+        self.draws += 1
+
+    def flush(self):
+        """顯示因限速而延後的中間結果"""
+        with self._lock:
+            self._flush_timer = None
+            if self._pending is not None:
+                self._draw(self._pending)
+                self._pending = None
+                self._last_draw = time.monotonic()
+                self.stream.flush()
+
+    def final(self, text, color=GREEN):
+        """以最終結果取代中間結果並換行"""
+        with self._lock:
+            self._pending = None
+            self._write("\r" + self.final_prefix + color + text + RESET + CLEAR_TO_END + "\n")
+            self._reset_line()
+            self.draws += 1
+            self.stream.flush()
+
+    def print_line(self, text=""):
+        """輸出一般訊息：先清除中間結果那一行，訊息之後中間結果從新的一行重新顯示"""
+        with self._lock:
+            if self._line_open:
+                self._write("\r" + CLEAR_TO_END)
+            self._write(text + "\n")
+            self._reset_line()
+            self.stream.flush()
+
+    def clear(self):
+        with self._lock:
+            if self._line_open:
+                self._write("\r" + CLEAR_TO_END)
+                self.stream.flush()
+            self._reset_line()
+
+    def _reset_line(self):
+        self._shown = ("", [])
+        self._offset = 0
+        self._line_open = False
+        self._pending = None
+        self._last_draw = 0.0
+
+    def stats(self):
+        return {"draws": self.draws, "full_redraws": self.full_redraws, "skipped": self.skipped,
+                "bytes_written": self.bytes_written}
+
+    def report(self):
+        return (f"畫面更新 {self.draws} 次（整行重繪 {self.full_redraws} 次），"
+                f"限速略過 {self.skipped} 次，輸出 {self.bytes_written / 1024:.1f} KB")
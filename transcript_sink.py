@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+轉錄結果保存
+識別結果原本只以彩色文字印在終端，這裡把最終結果（可選中間結果）保存成結構化記錄：
+- jsonl: 每行一筆 JSON，適合 grep、jq 與後續處理
+- sqlite: transcripts 資料表，可依會話、時間查詢
+- rotate: 依大小或時間切換新檔案的 JSONL，長時間錄音不會產生單一巨大檔案
+寫入由背景執行緒批次完成，每 FSYNC_INTERVAL 秒才 fsync 一次；
+呼叫端（gRPC 響應迴圈）只把記錄放進佇列，不會被磁碟 I/O 阻塞，佇列滿時丟棄並計數
+"""
+
+import glob
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+FSYNC_INTERVAL = 1.0        # 多久 fsync 一次（秒）
+MAX_QUEUE_RECORDS = 10000   # 背景寫入佇列上限，滿時丟棄新記錄
+MAX_BATCH_RECORDS = 500     # 每批最多寫入的記錄數
+ROTATE_BYTES = 10 * 1024 * 1024  # rotate: 單一檔案最大字節數
+ROTATE_SECONDS = 3600            # rotate: 單一檔案最長涵蓋時間（秒）
+ROTATE_KEEP = 24                 # rotate: 最多保留的檔案數（0 表示全部保留）
+
+# 記錄欄位與 SQLite 欄位型別（依此順序）
+COLUMNS = (
+    ("type", "TEXT NOT NULL"), ("session", "INTEGER"), ("text", "TEXT NOT NULL"), ("raw_text", "TEXT"),
+    ("language", "TEXT"), ("confidence", "REAL"), ("stability", "REAL"),
+    ("audio_start", "REAL"), ("audio_end", "REAL"), ("received_at", "REAL NOT NULL"), ("time", "TEXT"),
+    ("latency_ms", "REAL"), ("audio_latency_ms", "REAL"), ("words", "TEXT"),
+)
+FIELDS = tuple(name for name, _ in COLUMNS)
+
+
+def make_record(kind, session, text, received_at, raw_text=None, language="", confidence=None,
+                stability=None, audio_start=None, audio_end=None, latency_ms=None, audio_latency_ms=None,
+                words=None):
+    """
+    建立一筆轉錄記錄；audio_start / audio_end 為整體音頻時間軸上的秒數，
+    words 為對齊後的單詞列表（word、start、end、captured_at），audio_latency_ms 為語音結尾到收到結果的延遲
+    """
+    return {
+        "type": kind,
+        "session": session,
+        "text": text,
+        "raw_text": raw_text if raw_text is not None else text,
+        "language": language,
+        "confidence": confidence,
+        "stability": stability,
+        "audio_start": audio_start,
+        "audio_end": audio_end,
+        "received_at": received_at,
+        "time": datetime.fromtimestamp(received_at).isoformat(timespec="milliseconds"),
+        "latency_ms": latency_ms,
+        "audio_latency_ms": audio_latency_ms,
+        "words": words,
+    }
+
+
+def _ensure_directory(path):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+
+class JsonlSink:
+    """追加寫入 JSONL 檔"""
+
+    def __init__(self, path):
+        self.path = path
+        _ensure_directory(path)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write_batch(self, records):
+        self._file.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+
+    def flush(self, sync=False):
+        self._file.flush()
+        if sync:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self.flush(sync=True)
+        self._file.close()
+
+
+class RotatingJsonlSink:
+    """
+    依大小或時間輪替的 JSONL 檔
+    path 為基本檔名，例如 transcripts/meeting.jsonl 會寫成 transcripts/meeting-20250101-093000.jsonl
+    """
+
+    def __init__(self, path, max_bytes=ROTATE_BYTES, max_seconds=ROTATE_SECONDS, keep=ROTATE_KEEP):
+        self.base, self.extension = os.path.splitext(path)
+        self.extension = self.extension or ".jsonl"
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.keep = keep
+        self.rotations = 0
+        _ensure_directory(path)
+        self._file = None
+        self._open()
+
+    def _open(self):
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.path = f"{self.base}-{stamp}{self.extension}"
+        suffix = 1
+        while os.path.exists(self.path):
+            # 同一秒內輪替兩次
+            self.path = f"{self.base}-{stamp}-{suffix}{self.extension}"
+            suffix += 1
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._opened_at = time.time()
+        self._bytes = 0
+
+    def _rotate(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self.rotations += 1
+        self._open()
+        if self.keep:
+            files = sorted(glob.glob(glob.escape(self.base) + "-*" + glob.escape(self.extension)),
+                           key=os.path.getmtime)
+            for old in files[:-self.keep]:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+
+    def write_batch(self, records):
+        if self._bytes and (self._bytes >= self.max_bytes or time.time() - self._opened_at >= self.max_seconds):
+            self._rotate()
+        data = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        self._file.write(data)
+        self._bytes += len(data.encode("utf-8"))
+
+    def flush(self, sync=False):
+        self._file.flush()
+        if sync:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self.flush(sync=True)
+        self._file.close()
+
+
+class SqliteSink:
+    """寫入 SQLite 的 transcripts 資料表（WAL 模式，每批一次交易）"""
+
+    def __init__(self, path):
+        self.path = path
+        _ensure_directory(path)
+        # 連線由背景寫入執行緒使用
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS transcripts (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            + ", ".join(f"{name} {column_type}" for name, column_type in COLUMNS) + ")"
+        )
+        # 舊版建立的資料表補上新增的欄位
+        existing = {row[1] for row in self._db.execute("PRAGMA table_info(transcripts)")}
+        for name, column_type in COLUMNS:
+            if name not in existing:
+                self._db.execute(f"ALTER TABLE transcripts ADD COLUMN {name} {column_type.replace(' NOT NULL', '')}")
+        self._db.execute("CREATE INDEX IF NOT EXISTS transcripts_session ON transcripts (session, received_at)")
+        self._db.commit()
+        self._insert = (f"INSERT INTO transcripts ({', '.join(FIELDS)}) "
+                        f"VALUES ({', '.join('?' for _ in FIELDS)})")
+        self._words_index = FIELDS.index("words")
+
+    def write_batch(self, records):
+        rows = []
+        for record in records:
+            row = [record.get(field) for field in FIELDS]
+            if row[self._words_index] is not None:
+                # 單詞列表以 JSON 字串保存
+                row[self._words_index] = json.dumps(row[self._words_index], ensure_ascii=False)
+            rows.append(row)
+        self._db.executemany(self._insert, rows)
+        self._db.commit()
+
+    def flush(self, sync=False):
+        if sync:
+            # synchronous=NORMAL 下交易只寫入 WAL，檢查點時才同步到主檔
+            self._db.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def close(self):
+        self.flush(sync=True)
+        self._db.close()
+
+
+SINKS = {
+    "jsonl": JsonlSink,
+    "sqlite": SqliteSink,
+    "rotate": RotatingJsonlSink,
+}
+
+SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+
+
+def _parse_spec(spec):
+    """拆解「類型:路徑」，回傳 (類型, 路徑)"""
+    kind, separator, path = spec.partition(":")
+    if not separator or kind not in SINKS:
+        path = spec
+        kind = "sqlite" if os.path.splitext(spec)[1].lower() in SQLITE_EXTENSIONS else "jsonl"
+    return kind, path
+
+
+def create_sink(spec):
+    """
+    依描述建立輸出目標：「類型:路徑」，例如 sqlite:transcripts.db、rotate:logs/meeting.jsonl；
+    省略類型時依副檔名判斷（.db / .sqlite / .sqlite3 為 SQLite，其餘為 JSONL）
+    """
+    kind, path = _parse_spec(spec)
+    if not path:
+        raise ValueError(f"轉錄輸出缺少路徑: {spec}（可用類型: {', '.join(SINKS)}）")
+    return SINKS[kind](path)
+
+
+def sink_files(spec):
+    """輸出描述對應的現有檔案（rotate 為所有輪替檔，依時間排序）"""
+    kind, path = _parse_spec(spec)
+    if kind == "rotate":
+        base, extension = os.path.splitext(path)
+        pattern = glob.escape(base) + "-*" + glob.escape(extension or ".jsonl")
+        return sorted(glob.glob(pattern), key=os.path.getmtime)
+    return [path] if os.path.exists(path) else []
+
+
+def read_records(spec, kinds=("final",), since=None):
+    """
+    讀回已保存的記錄（依寫入順序）；kinds 為要讀取的類型，since 為 received_at 下限（epoch 秒）
+    讀不到的檔案與損壞的行略過
+    """
+    kind, _ = _parse_spec(spec)
+    for path in sink_files(spec):
+        if kind == "sqlite":
+            db = sqlite3.connect(path)
+            try:
+                marks = ", ".join("?" for _ in kinds)
+                rows = db.execute(
+                    f"SELECT {', '.join(FIELDS)} FROM transcripts WHERE type IN ({marks}) AND received_at >= ? "
+                    "ORDER BY id", (*kinds, since or 0))
+                for row in rows:
+                    record = dict(zip(FIELDS, row))
+                    if record["words"]:
+                        record["words"] = json.loads(record["words"])
+                    yield record
+            except sqlite3.Error:
+                pass
+            finally:
+                db.close()
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 寫到一半中斷的最後一行
+                    continue
+                if record.get("type") in kinds and (since is None or record.get("received_at", 0) >= since):
+                    yield record
+
+
+class TranscriptWriter:
+    """
+    背景批次寫入器（執行緒安全）
+    write() 只把記錄放進佇列並立即返回；背景執行緒一次取出佇列中所有記錄寫入各輸出目標，
+    每 fsync_interval 秒 fsync 一次，close() 寫完剩餘記錄後關閉檔案
+    """
+
+    def __init__(self, sinks, fsync_interval=FSYNC_INTERVAL, max_queue=MAX_QUEUE_RECORDS,
+                 max_batch=MAX_BATCH_RECORDS):
+        self.sinks = list(sinks)
+        self.fsync_interval = fsync_interval
+        self.max_batch = max_batch
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._closed = False
+
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.syncs = 0
+        self.errors = 0
+        self.last_error = None
+        self.max_write_ms = 0.0
+
+        self._thread = threading.Thread(target=self._run, name="transcript-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, record):
+        """放入一筆記錄（不阻塞）；關閉後或佇列已滿時丟棄"""
+        if self._closed:
+            self.dropped += 1
+            return False
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _run(self):
+        last_sync = time.monotonic()
+        dirty = False
+        stopping = False
+        while not stopping:
+            timeout = max(0.0, last_sync + self.fsync_interval - time.monotonic()) if dirty else None
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+                # 取出佇列中已有的記錄一起寫入
+                while len(batch) < self.max_batch:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if None in batch:
+                # 結束標記之後的記錄（close() 與 write() 競爭時）仍一併寫入
+                stopping = True
+                batch.remove(None)
+
+            if batch:
+                self._call("write_batch", batch)
+                self.written += len(batch)
+                self.batches += 1
+                dirty = True
+
+            if dirty and (stopping or time.monotonic() - last_sync >= self.fsync_interval):
+                self._call("flush", sync=True)
+                self.syncs += 1
+                last_sync = time.monotonic()
+                dirty = False
+
+        for sink in self.sinks:
+            try:
+                sink.close()
+            except Exception as e:
+                self.errors += 1
+                self.last_error = e
+
+    def _call(self, method, *args, **kwargs):
+        """呼叫每個輸出目標；單一目標出錯不影響其他目標"""
+        started = time.perf_counter()
+        for sink in self.sinks:
+            try:
+                getattr(sink, method)(*args, **kwargs)
+            except Exception as e:
+                self.errors += 1
+                self.last_error = e
+        self.max_write_ms = max(self.max_write_ms, (time.perf_counter() - started) * 1000)
+
+    @property
+    def pending(self):
+        return self._queue.qsize()
+
+    def close(self, timeout=5.0):
+        """寫完佇列中的記錄、fsync 後關閉所有輸出目標"""
+        if self._closed:
+            return
+        self._closed = True
+        while True:
+            try:
+                # 佇列滿時等背景執行緒騰出空間，確保結束標記能放入
+                self._queue.put(None, timeout=0.1)
+                break
+            except queue.Full:
+                if not self._thread.is_alive():
+                    break
+        self._thread.join(timeout)
+
+    def report(self):
+        targets = ", ".join(getattr(sink, "path", type(sink).__name__) for sink in self.sinks)
+        line = (f"保存 {self.written} 筆記錄到 {targets}（{self.batches} 批，fsync {self.syncs} 次，"
+                f"最長寫入 {self.max_write_ms:.1f} ms）")
+        if self.dropped:
+            line += f"，丟棄 {self.dropped} 筆"
+        if self.errors:
+            line += f"，寫入錯誤 {self.errors} 次（最後: {self.last_error}）"
+        return line
@@ -0,0 +1,603 @@
+#!/usr/bin/env python3
+"""
+多串流實時轉錄服務（asyncio + WebSocket）
+一台主機同時轉錄多路會議室音頻：
+- 每一路音頻以 WebSocket 上傳 16-bit 16kHz 單聲道 PCM，對應一個 Speech V2 流式識別
+- 沿用 ContinuousTranscriber 的連續轉錄邏輯：接近 5 分鐘時先開新會話、重播最近音頻再關閉舊會話，
+  會話異常結束時自動重連，跨會話的最終結果去重
+- 結果以 JSON 扇出給所有訂閱者
+- 每一路的記憶體有上限：音頻佇列、會話佇列與訂閱者佇列都是固定容量；
+  佇列滿時暫停讀取 WebSocket（背壓傳回上傳端），或設定為丟棄最舊音頻
+
+端點：
+    ws://host:8765/ingest/<stream_id>      上傳音頻（二進位訊息）
+    ws://host:8765/subscribe/<stream_id>   訂閱結果（stream_id 為 * 時訂閱全部）
+    http://host:8765/stats                 各串流統計（JSON）
+
+需要安裝 websockets: pip install websockets
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import deque
+from http import HTTPStatus
+
+from google.cloud.speech_v2.types import cloud_speech
+
+from audio_buffer import BLOCK, DROP_OLDEST
+from capitalization import PhraseCorrector
+from vocabulary_store import get_vocabulary_store
+from session_handoff import FinalDeduplicator
+from speech_connection import DEFAULT_REGION, create_speech_async_client, get_speech_client
+from speech_resources import referenced_streaming_config, resolve_recognizer
+
+RATE = 16000
+CHUNK = int(RATE / 10)  # 100ms
+CHUNK_BYTES = CHUNK * 2
+
+DEFAULT_HOST = "0.0.0.0"
+DEFAULT_PORT = 8765
+MAX_STREAMS = 64  # 同時轉錄的串流上限
+MAX_FRAME_BYTES = 64 * 1024  # 單一 WebSocket 訊息上限
+
+# 每一路的記憶體上限
+INGEST_QUEUE_CHUNKS = 100  # 待分發音頻（約 10 秒）
+SESSION_QUEUE_CHUNKS = 100  # 每個會話待送出的音頻（約 10 秒）
+SUBSCRIBER_QUEUE_MESSAGES = 200  # 每個訂閱者待送出的結果
+OVERFLOW_POLICY = BLOCK  # 音頻佇列滿時: block（背壓給上傳端）/ drop_oldest
+SERVER_RESOURCES = False  # 詞彙同步成伺服器端 PhraseSet / Recognizer，以名稱引用（見 speech_resources.py）
+
+# 會話交接參數（與 realtime_chirp2_continuous.py 相同）
+SESSION_ROLLOVER_SECONDS = 280
+HANDOFF_OVERLAP_SECONDS = 2.0
+
+
+class Subscriber:
+    """結果訂閱者：固定容量佇列，跟不上時丟棄最舊的訊息"""
+
+    def __init__(self, stream_id, maxsize=SUBSCRIBER_QUEUE_MESSAGES):
+        self.stream_id = stream_id
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def offer(self, message):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+
+class StreamSession:
+    """單一流式會話（最多 5 分鐘）"""
+
+    def __init__(self, number, audio_start):
+        self.number = number
+        self.audio_start = audio_start  # 此會話第一個音頻在整體時間軸上的位置（秒）
+        self.queue = asyncio.Queue(maxsize=SESSION_QUEUE_CHUNKS)
+        self.closed = False
+        self.finished = asyncio.Event()
+        self.started_at = time.monotonic()
+        self.dropped_chunks = 0
+
+    def age(self):
+        return time.monotonic() - self.started_at
+
+    async def send(self, data, block):
+        """送入音頻塊；最新會話等待空間（背壓），正在關閉的會話滿了就丟棄"""
+        if not block:
+            try:
+                self.queue.put_nowait(data)
+            except asyncio.QueueFull:
+                self.dropped_chunks += 1
+            return
+        while not self.closed:
+            try:
+                await asyncio.wait_for(self.queue.put(data), timeout=0.1)
+                return
+            except asyncio.TimeoutError:
+                continue
+
+    async def chunks(self):
+        """依序產生音頻塊，關閉後送完剩餘音頻即結束"""
+        while True:
+            try:
+                data = await asyncio.wait_for(self.queue.get(), timeout=0.1)
+            except asyncio.TimeoutError:
+                if self.closed:
+                    return
+                continue
+            yield data
+
+    def close(self):
+        self.closed = True
+
+
+class TranscriptionStream:
+    """
+    一路音頻的連續轉錄
+    分發工作把音頻送給所有活躍會話並保留最近的尾段；監督工作負責會話輪替與重連
+    """
+
+    def __init__(self, stream_id, service, overflow=OVERFLOW_POLICY):
+        self.stream_id = stream_id
+        self.service = service
+        self.overflow = overflow
+        self.audio = asyncio.Queue(maxsize=INGEST_QUEUE_CHUNKS)
+        self.finals = FinalDeduplicator()
+        self.sessions = []
+        self.current = None
+        self.session_count = 0
+        self.publisher_connected = True
+
+        self._pending = bytearray()
+        self._tail = deque()
+        self._tail_bytes = 0
+        self._audio_bytes = 0
+        self._ended = False
+        self._pump_done = False
+        self._task = None
+
+        # 統計
+        self.started_at = time.time()
+        self.received_bytes = 0
+        self.dropped_chunks = 0
+        self.interim_count = 0
+        self.final_count = 0
+        self.errors = 0
+
+    # ---- 上傳端 ----
+
+    async def feed(self, data):
+        """接收上傳的 PCM，切成固定大小的音頻塊放入佇列（佇列滿時等待或丟棄最舊）"""
+        self.received_bytes += len(data)
+        self._pending += data
+        while len(self._pending) >= CHUNK_BYTES:
+            chunk = bytes(self._pending[:CHUNK_BYTES])
+            del self._pending[:CHUNK_BYTES]
+            await self._enqueue(chunk)
+
+    async def _enqueue(self, chunk):
+        if self.overflow == DROP_OLDEST and self.audio.full():
+            self.audio.get_nowait()
+            self.dropped_chunks += 1
+        await self.audio.put(chunk)
+
+    async def end(self):
+        """上傳端斷線：送出剩餘音頻並讓最後一個會話結束"""
+        if self._ended:
+            return
+        self._ended = True
+        self.publisher_connected = False
+        usable = len(self._pending) - len(self._pending) % 2
+        if usable:
+            await self._enqueue(bytes(self._pending[:usable]))
+        self._pending.clear()
+        await self.audio.put(None)
+
+    # ---- 分發與會話 ----
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def _pump(self):
+        overlap_bytes = int(HANDOFF_OVERLAP_SECONDS * RATE) * 2
+        try:
+            while True:
+                data = await self.audio.get()
+                if data is None:
+                    return
+                self._audio_bytes += len(data)
+                self._tail.append(data)
+                self._tail_bytes += len(data)
+                while self._tail and self._tail_bytes - len(self._tail[0]) >= overlap_bytes:
+                    self._tail_bytes -= len(self._tail.popleft())
+                for session in list(self.sessions):
+                    await session.send(data, block=session is self.current)
+        finally:
+            self._pump_done = True
+            for session in self.sessions:
+                session.close()
+
+    def _open_session(self, replay):
+        self.session_count += 1
+        tail = list(self._tail) if replay else []
+        replay_bytes = sum(len(data) for data in tail)
+        session = StreamSession(self.session_count, (self._audio_bytes - replay_bytes) / (RATE * 2))
+        for data in tail:
+            session.queue.put_nowait(data)
+        if self._pump_done:
+            # 音頻已結束：只送出重播的尾段
+            session.close()
+        self.sessions.append(session)
+        self.current = session
+        asyncio.create_task(self._run_session(session))
+        return session
+
+    def _close_session(self, session):
+        if session in self.sessions:
+            self.sessions.remove(session)
+        session.close()
+
+    async def _run_session(self, session):
+        service = self.service
+
+        async def requests():
+            yield service.config_request()
+            async for chunk in session.chunks():
+                yield cloud_speech.StreamingRecognizeRequest(audio=chunk)
+
+        try:
+            responses = await service.client.streaming_recognize(requests=requests())
+            async for response in responses:
+                self._handle_response(response, session)
+        except Exception as e:
+            if "Max duration of 5 minutes" not in str(e):
+                self.errors += 1
+                print(f"❌ [{self.stream_id}] 會話 #{session.number} 錯誤: {e}")
+        finally:
+            self._close_session(session)
+            session.finished.set()
+
+    def _handle_response(self, response, session):
+        for result in response.results:
+            if not result.alternatives:
+                continue
+            transcript = result.alternatives[0].transcript.strip()
+            if not transcript:
+                continue
+            if result.is_final:
+                transcript = self.finals.accept(session.number, session.audio_start, result, transcript)
+                if transcript:
+                    self.final_count += 1
+                    self.publish("final", self.service.corrector.fix(transcript), session)
+            elif session is self.current:
+                # 交接期間只轉發最新會話的中間結果
+                self.interim_count += 1
+                self.publish("interim", transcript, session)
+
+    def publish(self, kind, text=None, session=None):
+        message = {"stream": self.stream_id, "type": kind, "time": time.time()}
+        if text is not None:
+            message["text"] = text
+        if session is not None:
+            message["session"] = session.number
+        self.service.fan_out(self.stream_id, message)
+
+    async def run(self):
+        """監督會話：接近時長上限時交接，會話提前結束時重連，音頻結束後收尾"""
+        pump = asyncio.create_task(self._pump())
+        current = self._open_session(replay=False)
+        self.publish("start")
+        try:
+            while True:
+                remaining = max(0.0, SESSION_ROLLOVER_SECONDS - current.age())
+                try:
+                    await asyncio.wait_for(current.finished.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    if pump.done():
+                        # 音頻已結束，等最後的會話送完即可
+                        await current.finished.wait()
+                        continue
+                    # 接近 5 分鐘限制：先開新會話並重播尾段，再關閉目前會話
+                    print(f"🔄 [{self.stream_id}] 交接到會話 #{self.session_count + 1}")
+                    previous = current
+                    current = self._open_session(replay=True)
+                    self._close_session(previous)
+                    continue
+
+                if pump.done():
+                    # 上傳端已結束且最後的會話已送完音頻
+                    break
+                # 會話提前結束（錯誤或伺服器關閉）：太快結束時稍等再重連
+                if current.age() < 1:
+                    await asyncio.sleep(1)
+                current = self._open_session(replay=HANDOFF_OVERLAP_SECONDS > 0)
+        finally:
+            pump.cancel()
+            for session in list(self.sessions):
+                self._close_session(session)
+            self.publish("end")
+            self.service.remove_stream(self)
+
+    def stats(self):
+        return {
+            "stream": self.stream_id,
+            "publisher_connected": self.publisher_connected,
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "received_seconds": round(self.received_bytes / (RATE * 2), 1),
+            "sessions": self.session_count,
+            "interim_results": self.interim_count,
+            "final_results": self.final_count,
+            "duplicate_finals": self.finals.duplicates,
+            "errors": self.errors,
+            "queued_chunks": self.audio.qsize(),
+            "dropped_chunks": self.dropped_chunks + sum(s.dropped_chunks for s in self.sessions),
+        }
+
+
+class TranscriptionService:
+    """串流註冊表：共用一個 Speech V2 非同步客戶端、識別配置與大小寫修正器"""
+
+    def __init__(self, project_id, region=DEFAULT_REGION, language_code="en-US",
+                 max_streams=MAX_STREAMS, overflow=OVERFLOW_POLICY, client=None,
+                 server_resources=SERVER_RESOURCES):
+        self.client = client or create_speech_async_client(region)
+        self.recognizer = f"projects/{project_id}/locations/{region}/recognizers/_"
+        self.max_streams = max_streams
+        self.overflow = overflow
+        self.streams = {}
+        self.subscribers = {}
+
+        self.project_id = project_id
+        self.region = region
+        self.language_code = language_code
+        self.server_resources = server_resources
+        self.corrector = PhraseCorrector([])
+        self._config_request = None
+
+        # 共用詞彙庫：詞彙檔改變時在監看執行緒換上新版本，之後開啟的會話使用新的詞彙
+        self.vocabulary_store = get_vocabulary_store()
+        self.vocabulary_store.subscribe(self._apply_vocabulary)
+        self._apply_vocabulary(self.vocabulary_store.current)
+
+    def _apply_vocabulary(self, snapshot):
+        streaming_config = self._streaming_config(snapshot.vocabulary, self.language_code)
+        recognizer = self.recognizer
+        if self.server_resources:
+            # 同步在監看執行緒中進行（使用同步客戶端）；每一路的每個會話都只帶識別器名稱
+            resolved = resolve_recognizer(get_speech_client(self.region), self.project_id, self.region,
+                                          streaming_config.config)
+            if resolved:
+                recognizer = resolved
+                streaming_config = referenced_streaming_config(streaming_config)
+        self.corrector = snapshot.corrector
+        # 識別器與配置包在同一個請求中一次換上，開啟中的會話不會拿到不一致的一組
+        self._config_request = cloud_speech.StreamingRecognizeRequest(
+            recognizer=recognizer,
+            streaming_config=streaming_config,
+        )
+        if snapshot.version > 1:
+            print(f"🔄 詞彙已更新（第 {snapshot.version} 版）: {snapshot.vocabulary.report()}")
+
+    def _streaming_config(self, vocabulary, language_code):
+        recognition_config = cloud_speech.RecognitionConfig(
+            explicit_decoding_config=cloud_speech.ExplicitDecodingConfig(
+                encoding=cloud_speech.ExplicitDecodingConfig.AudioEncoding.LINEAR16,
+                sample_rate_hertz=RATE,
+                audio_channel_count=1,
+            ),
+            language_codes=[language_code],
+            model="chirp_2",
+        )
+        adaptation = vocabulary.adaptation()
+        if adaptation:
+            recognition_config.adaptation = adaptation
+        return cloud_speech.StreamingRecognitionConfig(
+            config=recognition_config,
+            streaming_features=cloud_speech.StreamingRecognitionFeatures(interim_results=True),
+        )
+
+    def config_request(self):
+        return self._config_request
+
+    # ---- 串流 ----
+
+    def open_stream(self, stream_id):
+        """為上傳端建立串流；同一 stream_id 只能有一個上傳端"""
+        if stream_id in self.streams:
+            raise ValueError(f"串流 {stream_id} 已經有上傳端")
+        if len(self.streams) >= self.max_streams:
+            raise OverflowError(f"已達串流上限 {self.max_streams}")
+        stream = TranscriptionStream(stream_id, self, overflow=self.overflow)
+        self.streams[stream_id] = stream
+        stream.start()
+        print(f"🎙️ 串流開始: {stream_id}（目前 {len(self.streams)} 路）")
+        return stream
+
+    def remove_stream(self, stream):
+        if self.streams.get(stream.stream_id) is stream:
+            del self.streams[stream.stream_id]
+            print(f"⏹️ 串流結束: {stream.stream_id}（{stream.final_count} 個最終結果，"
+                  f"{stream.session_count} 個會話）")
+
+    # ---- 訂閱 ----
+
+    def subscribe(self, stream_id):
+        subscriber = Subscriber(stream_id)
+        self.subscribers.setdefault(stream_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        subscribers = self.subscribers.get(subscriber.stream_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self.subscribers[subscriber.stream_id]
+
+    def fan_out(self, stream_id, message):
+        for key in (stream_id, "*"):
+            for subscriber in self.subscribers.get(key, ()):
+                subscriber.offer(message)
+
+    def stats(self):
+        return {
+            "streams": [stream.stats() for stream in self.streams.values()],
+            "subscribers": sum(len(s) for s in self.subscribers.values()),
+            "dropped_messages": sum(sub.dropped for s in self.subscribers.values() for sub in s),
+        }
+
+    # ---- WebSocket ----
+
+    async def handle_connection(self, connection):
+        parts = connection.request.path.split("?")[0].strip("/").split("/")
+        if len(parts) != 2 or parts[0] not in ("ingest", "subscribe") or not parts[1]:
+            await connection.close(1008, "路徑必須是 /ingest/<id> 或 /subscribe/<id>")
+            return
+        if parts[0] == "ingest":
+            await self._handle_ingest(connection, parts[1])
+        else:
+            await self._handle_subscribe(connection, parts[1])
+
+    async def _handle_ingest(self, connection, stream_id):
+        try:
+            stream = self.open_stream(stream_id)
+        except (ValueError, OverflowError) as e:
+            await connection.close(1013, str(e))
+            return
+        try:
+            # 逐一讀取訊息：feed() 在佇列滿時等待，暫停讀取即把背壓傳回上傳端
+            async for message in connection:
+                if isinstance(message, bytes):
+                    await stream.feed(message)
+        except Exception as e:
+            print(f"⚠️ [{stream_id}] 上傳連線中斷: {e}")
+        finally:
+            await stream.end()
+
+    async def _handle_subscribe(self, connection, stream_id):
+        subscriber = self.subscribe(stream_id)
+        closed = asyncio.create_task(connection.wait_closed())
+        try:
+            while True:
+                getter = asyncio.create_task(subscriber.queue.get())
+                done, _ = await asyncio.wait({getter, closed}, return_when=asyncio.FIRST_COMPLETED)
+                if getter not in done:
+                    getter.cancel()
+                    return
+                await connection.send(json.dumps(getter.result(), ensure_ascii=False))
+        except Exception:
+            pass
+        finally:
+            closed.cancel()
+            self.unsubscribe(subscriber)
+
+    def process_request(self, connection, request):
+        """非 WebSocket 的 HTTP 請求：/stats 回傳統計"""
+        if request.path.split("?")[0] == "/stats":
+            body = json.dumps(self.stats(), ensure_ascii=False, indent=2)
+            response = connection.respond(HTTPStatus.OK, body + "\n")
+            response.headers["Content-Type"] = "application/json; charset=utf-8"
+            return response
+        return None
+
+
+def _import_websockets():
+    try:
+        import websockets.asyncio.client
+        import websockets.asyncio.server
+    except ImportError:
+        raise ImportError("多串流服務需要安裝 websockets: pip install websockets")
+    return websockets
+
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, project_id=None, region=DEFAULT_REGION,
+                language_code="en-US", max_streams=MAX_STREAMS, overflow=OVERFLOW_POLICY,
+                server_resources=SERVER_RESOURCES):
+    websockets = _import_websockets()
+    service = TranscriptionService(project_id or os.environ["GOOGLE_CLOUD_PROJECT"], region,
+                                   language_code, max_streams, overflow, server_resources=server_resources)
+    async with websockets.asyncio.server.serve(service.handle_connection, host, port,
+                                               process_request=service.process_request,
+                                               max_size=MAX_FRAME_BYTES, max_queue=16):
+        print(f"🚀 多串流轉錄服務已啟動: ws://{host}:{port}")
+        print(f"   上傳: /ingest/<id>   訂閱: /subscribe/<id>   統計: http://{host}:{port}/stats")
+        print(f"   串流上限 {max_streams}，溢出策略 {overflow}")
+        await asyncio.Future()
+
+
+# ---- 命令列工具：上傳與訂閱 ----
+
+async def publish(url, source):
+    """把音頻來源上傳到 /ingest/<id>"""
+    websockets = _import_websockets()
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=INGEST_QUEUE_CHUNKS)
+
+    def offer(data):
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(data)
+
+    def on_audio(data):
+        if source.live:
+            # 即時來源不能阻塞回調：滿了丟棄最舊
+            loop.call_soon_threadsafe(offer, data)
+        else:
+            asyncio.run_coroutine_threadsafe(queue.put(data), loop).result()
+
+    async with websockets.asyncio.client.connect(url, max_size=MAX_FRAME_BYTES) as connection:
+        source.start(on_audio, on_end=lambda: loop.call_soon_threadsafe(queue.put_nowait, None))
+        print(f"📤 上傳 {source.describe()} → {url}")
+        try:
+            while True:
+                data = await queue.get()
+                if data is None:
+                    break
+                await connection.send(data)
+        finally:
+            source.stop()
+    print("✅ 上傳結束")
+
+
+async def subscribe(url):
+    """訂閱 /subscribe/<id> 並顯示結果"""
+    websockets = _import_websockets()
+    async with websockets.asyncio.client.connect(url) as connection:
+        print(f"📥 訂閱 {url}")
+        async for message in connection:
+            event = json.loads(message)
+            if event["type"] == "interim":
+                sys.stdout.write(f"\r🔘 \033[90m[{event['stream']}] {event['text']}\033[0m\033[K")
+                sys.stdout.flush()
+            elif event["type"] == "final":
+                print(f"\r✅ \033[92m[{event['stream']}] {event['text']}\033[0m\033[K")
+            else:
+                print(f"\r📡 [{event['stream']}] {event['type']}\033[K")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多串流實時轉錄服務")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="啟動服務")
+    serve_parser.add_argument("--host", default=DEFAULT_HOST)
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve_parser.add_argument("--region", default=DEFAULT_REGION)
+    serve_parser.add_argument("--language", default="en-US")
+    serve_parser.add_argument("--max-streams", type=int, default=MAX_STREAMS)
+    serve_parser.add_argument("--overflow", choices=(BLOCK, DROP_OLDEST), default=OVERFLOW_POLICY,
+                              help="音頻佇列滿時阻塞上傳端或丟棄最舊音頻")
+    serve_parser.add_argument("--server-resources", action="store_true", default=SERVER_RESOURCES,
+                              help="把詞彙同步成伺服器端 PhraseSet / Recognizer，會話以名稱引用")
+
+    publish_parser = commands.add_parser("publish", help="上傳音頻來源")
+    publish_parser.add_argument("url", help="ws://host:8765/ingest/<id>")
+    from audio_sources import add_source_arguments
+    add_source_arguments(publish_parser)
+
+    subscribe_parser = commands.add_parser("subscribe", help="訂閱結果")
+    subscribe_parser.add_argument("url", help="ws://host:8765/subscribe/<id>（* 表示全部）")
+
+    args = parser.parse_args()
+    try:
+        if args.command == "serve":
+            asyncio.run(serve(args.host, args.port, region=args.region, language_code=args.language,
+                              max_streams=args.max_streams, overflow=args.overflow,
+                              server_resources=args.server_resources))
+        elif args.command == "publish":
+            from audio_sources import open_source
+            source = open_source(args.source, RATE, CHUNK, speed=args.speed, loop=args.loop)
+            asyncio.run(publish(args.url, source))
+        else:
+            asyncio.run(subscribe(args.url))
+    except KeyboardInterrupt:
+        print("\n⏹️ 已停止")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+翻譯結果快取
+問候語、議程項目、詞彙表中的術語在會議中反覆出現，重複翻譯只會浪費時間與 API 呼叫：
+- 以正規化後的原文、目標語言與模型為鍵
+- 記憶體中為 LRU，背後以本地 SQLite 檔保存，重新啟動後仍可命中
+- 記憶體與磁碟都有容量上限，超過時淘汰最久未使用的項目
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+CACHE_FILE = "translation_cache.sqlite3"
+MEMORY_CAPACITY = 2000   # 記憶體 LRU 最多項目數
+DISK_CAPACITY = 50000    # SQLite 最多項目數
+PRUNE_EVERY = 200        # 每寫入多少筆檢查一次磁碟容量
+
+
+def normalize_text(text):
+    """正規化原文：統一 Unicode 形式、合併空白、忽略大小寫（保留標點，問句與直述句譯法不同）"""
+    text = unicodedata.normalize("NFKC", text)
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+class TranslationCache:
+    """
+    LRU + SQLite 翻譯快取（執行緒安全）
+    path 為 None 時只使用記憶體
+    """
+
+    def __init__(self, path=CACHE_FILE, memory_capacity=MEMORY_CAPACITY, disk_capacity=DISK_CAPACITY):
+        self.path = path
+        self.memory_capacity = memory_capacity
+        self.disk_capacity = disk_capacity
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._db = None
+        if path:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                " source TEXT NOT NULL, target TEXT NOT NULL, model TEXT NOT NULL,"
+                " translation TEXT NOT NULL, used_at REAL NOT NULL,"
+                " PRIMARY KEY (source, target, model))"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS translations_used_at ON translations (used_at)")
+            self._db.commit()
+
+    @staticmethod
+    def key(text, target, model):
+        return normalize_text(text), target, model
+
+    def get(self, text, target, model):
+        """回傳快取的譯文，沒有時回傳 None"""
+        key = self.key(text, target, model)
+        with self._lock:
+            translation = self._memory.get(key)
+            if translation is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return translation
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT translation FROM translations WHERE source = ? AND target = ? AND model = ?", key
+                ).fetchone()
+                if row:
+                    self._db.execute(
+                        "UPDATE translations SET used_at = ? WHERE source = ? AND target = ? AND model = ?",
+                        (time.time(),) + key)
+                    self._db.commit()
+                    self._remember(key, row[0])
+                    self.disk_hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def put_many(self, items, target, model):
+        """寫入多筆 (原文, 譯文)；一批只提交一次"""
+        rows = []
+        now = time.time()
+        with self._lock:
+            for text, translation in items:
+                if not translation:
+                    continue
+                key = self.key(text, target, model)
+                self._remember(key, translation)
+                rows.append((key[0], key[1], key[2], translation, now))
+
+            if self._db is None or not rows:
+                return
+            self._db.executemany("INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?)", rows)
+            self._writes += len(rows)
+            if self._writes >= PRUNE_EVERY:
+                self._writes = 0
+                self._prune()
+            self._db.commit()
+
+    def put(self, text, target, model, translation):
+        self.put_many([(text, translation)], target, model)
+
+    def _remember(self, key, translation):
+        self._memory[key] = translation
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_capacity:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _prune(self):
+        """磁碟項目超過上限時刪除最久未使用的"""
+        count = self._db.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+        excess = count - self.disk_capacity
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM translations WHERE rowid IN "
+                "(SELECT rowid FROM translations ORDER BY used_at LIMIT ?)", (excess,))
+            self.evictions += excess
+
+    def __len__(self):
+        with self._lock:
+            if self._db is not None:
+                return self._db.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+            return len(self._memory)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return (self.hits + self.disk_hits) / lookups if lookups else 0.0
+
+    def report(self):
+        return (f"翻譯快取: 命中 {self.hits + self.disk_hits} 次（記憶體 {self.hits}、磁碟 {self.disk_hits}），"
+                f"未命中 {self.misses} 次，命中率 {self.hit_rate:.0%}，淘汰 {self.evictions} 筆")
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.commit()
+                self._db.close()
+                self._db = None
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+並行批次翻譯管線
+最終結果依序進入佇列，由調度線程合併成小批次（一次請求翻譯多句），
+以有限的並行請求數送出，並依原本順序輸出譯文：
+- 不丟棄任何文字：模型忙碌時句子留在佇列中，下一批一起送出
+- 批次結果無法對應時，改為逐句翻譯
+- 記錄每句的排隊時間（進入佇列到送出請求）與模型延遲
+- 可接上 translation_cache.TranslationCache：命中的句子不進佇列，直接依序輸出
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from queue import Empty, Queue
+
+from translators import join_translations
+
+MAX_IN_FLIGHT = 3       # 同時進行的翻譯請求數
+MAX_BATCH_SIZE = 6      # 每批最多句數
+MAX_BATCH_CHARS = 1200  # 每批最多字元數
+BATCH_WINDOW_SECONDS = 0.0  # 取得名額後再等待更多句子的時間（0 表示只合併已在佇列中的句子）
+STATS_WINDOW = 1000  # 延遲統計保留的最近句數
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+class TranslationItem:
+    """一句待翻譯的文字"""
+
+    def __init__(self, seq, text, prefix_text="", prefix_translation=""):
+        self.seq = seq
+        self.text = text
+        self.prefix_text = prefix_text                # 已在中間結果階段翻譯好的開頭
+        self.prefix_translation = prefix_translation
+        self.enqueued_at = time.time()
+        self.sent_at = None
+        self.completed_at = None
+        self.translation = None
+        self.error = None
+        self.batch_size = 1
+        self.cached = False
+
+    @property
+    def full_text(self):
+        return " ".join(part for part in (self.prefix_text, self.text) if part)
+
+    @property
+    def full_translation(self):
+        if self.translation is None:
+            return None
+        return join_translations([self.prefix_translation, self.translation])
+
+    @property
+    def queue_ms(self):
+        return (self.sent_at - self.enqueued_at) * 1000
+
+    @property
+    def model_ms(self):
+        return (self.completed_at - self.sent_at) * 1000
+
+
+class TranslationPipeline:
+    """
+    並行批次翻譯管線
+    translator 為 translators.Translator：translate_batch(texts) -> 譯文列表（或 None 表示無法對應），
+    translate_tail(prefix, prefix_translation, tail) 翻譯接在已譯開頭之後的尾段，target、model_name 屬性作為快取鍵
+    on_result(item) 依提交順序呼叫，item.translation 為譯文，失敗時 item.error 為錯誤訊息
+    """
+
+    def __init__(self, translator, on_result, max_in_flight=MAX_IN_FLIGHT, max_batch_size=MAX_BATCH_SIZE,
+                 max_batch_chars=MAX_BATCH_CHARS, batch_window=BATCH_WINDOW_SECONDS, cache=None):
+        self.translator = translator
+        self.on_result = on_result
+        self.cache = cache
+        self.max_in_flight = max_in_flight
+        self.max_batch_size = max_batch_size
+        self.max_batch_chars = max_batch_chars
+        self.batch_window = batch_window
+
+        self._queue = Queue()
+        self._slots = threading.Semaphore(max_in_flight)
+        self._pool = ThreadPoolExecutor(max_workers=max_in_flight)
+        self._lock = threading.Lock()
+        self._next_seq = 0
+        self._next_emit = 0
+        self._done = {}
+        self._carry = None  # 因批次字元上限而留到下一批的句子
+        self._idle = threading.Condition(self._lock)
+        self._closed = False
+
+        self.recent = deque(maxlen=STATS_WINDOW)  # 最近輸出的項目（供統計）
+        self.translated = 0
+        self.cache_hits = 0
+        self.failed = 0
+        self.batches = 0
+        self.fallbacks = 0
+
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, text, prefix_text="", prefix_translation=""):
+        """
+        提交一句文字，回傳序號
+        prefix_text / prefix_translation 為已經翻譯好的開頭，只翻譯其後的 text
+        """
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+        item = TranslationItem(seq, text, prefix_text, prefix_translation)
+
+        if not text:
+            # 整句都已翻譯好
+            self._complete_now(item, "")
+            return seq
+        if self.cache is not None and not prefix_text:
+            # 尾段不查快取：快取中的是獨立句子的譯文
+            translation = self.cache.get(text, self.translator.target, self.translator.model_name)
+            if translation is not None:
+                # 快取命中：不佔用請求名額，等前面的句子完成後即輸出
+                item.cached = True
+                self._complete_now(item, translation)
+                return seq
+
+        self._queue.put(item)
+        return seq
+
+    def _complete_now(self, item, translation):
+        item.translation = translation
+        item.sent_at = item.completed_at = item.enqueued_at
+        self._emit([item])
+
+    @property
+    def pending(self):
+        """尚未輸出的句數"""
+        with self._lock:
+            return self._next_seq - self._next_emit
+
+    def _next_item(self, timeout=None):
+        if self._carry is not None:
+            item, self._carry = self._carry, None
+            return item
+        return self._queue.get(timeout=timeout)
+
+    def _dispatch(self):
+        while True:
+            item = self._next_item()
+            if item is None:
+                return
+            # 先等待空出的請求名額；等待期間新到的句子會併入同一批
+            self._slots.acquire()
+            batch = [item]
+            chars = len(item.text)
+            deadline = time.time() + self.batch_window
+            while len(batch) < self.max_batch_size:
+                try:
+                    more = self._next_item(timeout=max(0.0, deadline - time.time()))
+                except Empty:
+                    break
+                if more is None:
+                    self._queue.put(None)  # 送完這批後再結束
+                    break
+                if chars + len(more.text) > self.max_batch_chars:
+                    self._carry = more
+                    break
+                batch.append(more)
+                chars += len(more.text)
+            self._pool.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch):
+        try:
+            sent_at = time.time()
+            for item in batch:
+                item.sent_at = sent_at
+                item.batch_size = len(batch)
+            # 接在已譯開頭之後的尾段要附上前文翻譯，不能當成獨立的句子批次送出
+            sentences = [item for item in batch if not item.prefix_text]
+            for item in batch:
+                if item.prefix_text:
+                    item.translation = self._translate_tail(item)
+                    item.completed_at = time.time()
+            if sentences:
+                self._translate_sentences(sentences)
+            if self.cache is not None:
+                try:
+                    # 只快取完整的句子；尾段的譯文依賴前文，不能給之後的整句查詢使用
+                    self.cache.put_many([(item.text, item.translation) for item in sentences],
+                                        self.translator.target, self.translator.model_name)
+                except Exception as e:
+                    # 快取寫入失敗只少了快取，譯文照常輸出
+                    print(f"⚠️ 翻譯快取寫入失敗: {e}")
+            with self._lock:
+                self.batches += 1
+        except Exception as e:
+            for item in batch:
+                if item.translation is None and item.error is None:
+                    item.error = f"{type(e).__name__}: {e}"
+        finally:
+            self._slots.release()
+            # 一定要輸出這一批，否則後面的句子會一直卡在重新排序緩衝區
+            for item in batch:
+                if item.completed_at is None:
+                    item.completed_at = time.time()
+            self._emit(batch)
+
+    def _translate_sentences(self, batch):
+        try:
+            # 同一批中重複的句子只送一次
+            texts = list(dict.fromkeys(item.text for item in batch))
+            unique = self.translator.translate_batch(texts)
+            translations = [dict(zip(texts, unique))[item.text] for item in batch] if unique else None
+        except Exception as e:
+            translations = None
+            if len(batch) == 1:
+                batch[0].error = f"{type(e).__name__}: {e}"
+        if translations is None and len(batch) > 1:
+            # 批次回應無法對應到各句：逐句重送
+            with self._lock:
+                self.fallbacks += 1
+            translations = [self._translate_one(item) for item in batch]
+        completed_at = time.time()
+        for item, translation in zip(batch, translations or [None] * len(batch)):
+            item.translation = translation
+            item.completed_at = completed_at
+
+    def _translate_tail(self, item):
+        try:
+            return self.translator.translate_tail(item.prefix_text, item.prefix_translation, item.text)
+        except Exception as e:
+            item.error = f"{type(e).__name__}: {e}"
+            return None
+
+    def _translate_one(self, item):
+        try:
+            return self.translator.translate_batch([item.text])[0]
+        except Exception as e:
+            item.error = f"{type(e).__name__}: {e}"
+            return None
+
+    def _emit(self, batch):
+        """依序號輸出：只有前面的句子都完成時才輸出"""
+        with self._lock:
+            for item in batch:
+                self._done[item.seq] = item
+            while self._next_emit in self._done:
+                item = self._done.pop(self._next_emit)
+                self._next_emit += 1
+                self.recent.append(item)
+                self.translated += 1
+                self.cache_hits += item.cached
+                self.failed += item.translation is None
+                try:
+                    self.on_result(item)
+                except Exception as e:
+                    print(f"⚠️ 翻譯輸出錯誤: {e}")
+            self._idle.notify_all()
+
+    def close(self, timeout=10.0):
+        """停止接收新句子，等待已提交的句子翻譯完成（最多 timeout 秒）"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        deadline = time.time() + timeout
+        with self._idle:
+            while self._next_emit < self._next_seq and time.time() < deadline:
+                self._idle.wait(max(0.0, deadline - time.time()))
+        self._pool.shutdown(wait=False)
+
+    def report(self):
+        """排隊時間與模型延遲的統計行"""
+        if not self.translated:
+            return []
+        sent = self.translated - self.cache_hits
+        lines = [
+            f"翻譯 {self.translated} 句（快取命中 {self.cache_hits} 句），{self.batches} 批"
+            f"（平均每批 {sent / max(1, self.batches):.1f} 句），逐句重送 {self.fallbacks} 批，失敗 {self.failed} 句",
+        ]
+        items = [item for item in self.recent if not item.cached]
+        if items:
+            queue_ms = [item.queue_ms for item in items]
+            model_ms = [item.model_ms for item in items]
+            lines.append(f"排隊時間 p50 {percentile(queue_ms, 50):.0f} ms / p95 {percentile(queue_ms, 95):.0f} ms，"
+                         f"模型延遲 p50 {percentile(model_ms, 50):.0f} ms / p95 {percentile(model_ms, 95):.0f} ms")
+        if self.cache is not None:
+            lines.append(self.cache.report())
+        unfinished = self._next_seq - self._next_emit
+        if unfinished:
+            lines.append(f"尚有 {unfinished} 句未完成翻譯")
+        return lines
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+翻譯後端
+翻譯管線只依賴 Translator 介面，後端可替換：
+- gemini: Google Gemini（需要 google-generativeai 與 API 金鑰）
+- local: 本地詞組表（離線、無網路延遲），可模擬模型延遲以便在沒有網路時測試與比較管線
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+
+from translation_cache import normalize_text
+
+GEMINI_MODEL = "gemini-2.5-flash-lite-preview-06-17"
+TARGET_LANGUAGE = "繁體中文"
+PHRASE_TABLE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "translation_phrases.json")
+
+# 英文標點對應的全形標點
+PUNCTUATION = {".": "。", ",": "，", "?": "？", "!": "！", ";": "；", ":": "："}
+
+
+class Translator:
+    """
+    翻譯後端介面
+    model_name 與 target 作為快取鍵；translate_batch 回傳與輸入等長的列表，無法對應時回傳 None
+    """
+
+    model_name = ""
+    target = TARGET_LANGUAGE
+
+    def translate(self, text):
+        raise NotImplementedError
+
+    def translate_batch(self, texts):
+        return [self.translate(text) for text in texts]
+
+    def translate_tail(self, prefix, prefix_translation, tail):
+        """翻譯句子的後半段（預設不參考前文）"""
+        return self.translate(tail)
+
+
+class GeminiTranslator(Translator):
+    """以 Gemini 翻譯；多句時放在同一個提示中，要求回傳 JSON 陣列"""
+
+    def __init__(self, model_name=GEMINI_MODEL, target=TARGET_LANGUAGE):
+        try:
+            import google.generativeai as genai
+        except ImportError:
+            raise ImportError("Gemini 翻譯需要安裝 google-generativeai: pip install google-generativeai")
+        self.model = genai.GenerativeModel(model_name)
+        self.model_name = model_name
+        self.target = target
+
+    def translate(self, text):
+        prompt = f"請將以下英文翻譯成{self.target}，只要一個最佳翻譯結果，不要解釋：{text}"
+        return self.model.generate_content(prompt).text.strip()
+
+    def translate_batch(self, texts):
+        if len(texts) == 1:
+            return [self.translate(texts[0])]
+        prompt = (
+            f"請將以下 JSON 陣列中的每一句英文翻譯成{self.target}。"
+            f"只回傳一個長度為 {len(texts)} 的 JSON 字串陣列，順序與輸入相同，不要解釋：\n"
+            + json.dumps(texts, ensure_ascii=False)
+        )
+        return parse_batch_response(self.model.generate_content(prompt).text, len(texts))
+
+    def translate_tail(self, prefix, prefix_translation, tail):
+        """翻譯句子的後半段，附上已翻譯的前半段讓譯文能接上"""
+        prompt = (
+            f"一句英文的前半段「{prefix}」已譯為「{prefix_translation}」。"
+            f"請把緊接著的後半段翻譯成{self.target}，只回傳後半段的譯文，使其能直接接在前半段譯文之後，不要解釋：{tail}"
+        )
+        return self.model.generate_content(prompt).text.strip()
+
+
+def parse_batch_response(text, count):
+    """解析批次翻譯回應；句數不符時回傳 None"""
+    text = text.strip()
+    # 模型有時會把 JSON 包在 ```json ... ``` 中
+    text = re.sub(r"^```(?:json)?\s*|\s*```$", "", text)
+    try:
+        items = json.loads(text)
+    except ValueError:
+        items = [re.sub(r"^\s*\d+[.)、:]\s*", "", line) for line in text.splitlines() if line.strip()]
+    if not isinstance(items, list) or len(items) != count:
+        return None
+    return [str(item).strip() for item in items]
+
+
+def _strip_word(word):
+    return word.strip(".,!?;:\"'()").casefold()
+
+
+class PhraseTableTranslator(Translator):
+    """
+    本地詞組表翻譯
+    先查整句，再以最長匹配逐段替換詞組；查不到的單詞保留原文，自定義詞彙（專有名詞）不翻譯
+    latency_ms / per_sentence_ms 可模擬模型延遲，用於離線測試管線
+    """
+
+    def __init__(self, path=PHRASE_TABLE_FILE, sentences=None, phrases=None, terms=None,
+                 latency_ms=0.0, per_sentence_ms=0.0, target=TARGET_LANGUAGE):
+        table = {"sentences": {}, "phrases": {}}
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                loaded = json.load(f)
+            table["sentences"].update(loaded.get("sentences", {}))
+            table["phrases"].update(loaded.get("phrases", {}))
+        table["sentences"].update(sentences or {})
+        table["phrases"].update(phrases or {})
+        if terms is None:
+            # 唯讀地使用行程內共用的詞彙庫，不開啟（或建立）詞彙索引資料庫
+            from vocabulary_store import get_vocabulary_store
+            terms = get_vocabulary_store(watch=False).vocabulary.terms
+        for term in terms:
+            # 專有名詞保留原文，但仍以詞組方式匹配以免被拆開翻譯
+            table["phrases"].setdefault(term, term)
+
+        self.sentences = {normalize_text(k): v for k, v in table["sentences"].items()}
+        self.phrases = {}
+        for source, translation in table["phrases"].items():
+            key = tuple(_strip_word(w) for w in source.split())
+            if key:
+                self.phrases[key] = translation
+        self.max_words = max((len(key) for key in self.phrases), default=1)
+
+        self.latency_ms = latency_ms
+        self.per_sentence_ms = per_sentence_ms
+        self.target = target
+        # 詞組表內容改變時快取鍵也要改變
+        digest = hashlib.sha1(json.dumps(table, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+        self.model_name = f"phrase-table:{digest[:12]}"
+
+    def translate_batch(self, texts):
+        if self.latency_ms or self.per_sentence_ms:
+            time.sleep((self.latency_ms + self.per_sentence_ms * len(texts)) / 1000)
+        return [self._translate(text) for text in texts]
+
+    def translate(self, text):
+        return self.translate_batch([text])[0]
+
+    def _translate(self, text):
+        sentence = self.sentences.get(normalize_text(text))
+        if sentence is not None:
+            return sentence
+
+        words = text.split()
+        keys = [_strip_word(w) for w in words]
+        parts = []
+        i = 0
+        while i < len(words):
+            for n in range(min(self.max_words, len(words) - i), 0, -1):
+                translation = self.phrases.get(tuple(keys[i:i + n]))
+                if translation is not None:
+                    break
+            else:
+                n, translation = 1, words[i].rstrip(".,!?;:")
+            parts.append(translation)
+            ending = words[i + n - 1][-1:]
+            if ending in PUNCTUATION:
+                parts.append(PUNCTUATION[ending])
+            i += n
+        return join_translations(parts)
+
+
+def join_translations(parts):
+    """拼接譯文片段：中文片段直接相接，兩個英文片段之間才加空格"""
+    result = ""
+    for part in parts:
+        if not part:
+            continue
+        if result and result[-1].isascii() and result[-1].isalnum() and part[0].isascii() and part[0].isalnum():
+            result += " "
+        result += part
+    return result
+
+
+TRANSLATORS = {
+    "gemini": GeminiTranslator,
+    "local": PhraseTableTranslator,
+}
+
+
+def create_translator(name="gemini", **kwargs):
+    """依名稱建立翻譯後端"""
+    if name not in TRANSLATORS:
+        raise ValueError(f"未知的翻譯後端: {name}（可用: {', '.join(TRANSLATORS)}）")
+    return TRANSLATORS[name](**kwargs)
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+本地語音活動檢測（VAD）
+在上傳前過濾長時間靜音，節省頻寬與 API 費用：
+- 檢測器可替換：能量 + 過零率（NumPy）或 WebRTC VAD（需安裝 webrtcvad）
+- 靜音超過 hangover 後停止上傳，語音開始時先補送一小段 pre-roll
+"""
+
+from collections import deque
+
+import numpy as np
+
+RATE = 16000
+SAMPLE_WIDTH = 2  # 16-bit PCM
+
+
+class VoiceActivityDetector:
+    """檢測器介面：判斷一段 16-bit 單聲道 PCM 是否包含語音"""
+
+    def is_speech(self, pcm):
+        raise NotImplementedError
+
+    def reset(self):
+        """重設內部狀態（例如雜訊基準）"""
+
+
+class EnergyZCRDetector(VoiceActivityDetector):
+    """
+    能量 + 過零率檢測器
+    以 RMS 能量（dBFS）相對於自適應雜訊基準判斷，再以過零率排除寬頻雜訊
+    """
+
+    def __init__(self, rate=RATE, frame_ms=20, margin_db=10.0, min_db=-55.0,
+                 strong_margin_db=20.0, max_zcr=0.35, noise_adapt=0.05):
+        self.frame_samples = int(rate * frame_ms / 1000)
+        self.margin_db = margin_db
+        self.min_db = min_db
+        self.strong_margin_db = strong_margin_db
+        self.max_zcr = max_zcr
+        self.noise_adapt = noise_adapt
+        self.noise_floor_db = None
+
+    def reset(self):
+        self.noise_floor_db = None
+
+    def _frame_features(self, pcm):
+        """回傳每個分析幀的能量（dBFS）與過零率"""
+        samples = np.frombuffer(pcm, dtype=np.int16)
+        frames = len(samples) // self.frame_samples
+        if frames == 0:
+            frames = 1
+            samples = np.pad(samples, (0, self.frame_samples - len(samples)))
+        samples = samples[:frames * self.frame_samples].reshape(frames, self.frame_samples).astype(np.float32)
+
+        rms = np.sqrt(np.mean(samples * samples, axis=1))
+        energy_db = 20 * np.log10(rms / 32768.0 + 1e-10)
+        signs = np.signbit(samples)
+        zcr = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+        return energy_db, zcr
+
+    def is_speech(self, pcm):
+        energy_db, zcr = self._frame_features(pcm)
+
+        if self.noise_floor_db is None:
+            self.noise_floor_db = float(np.min(energy_db))
+
+        threshold = max(self.noise_floor_db + self.margin_db, self.min_db)
+        strong = energy_db > self.noise_floor_db + self.strong_margin_db
+        speech_frames = (energy_db > threshold) & ((zcr < self.max_zcr) | strong)
+
+        # 以非語音幀緩慢更新雜訊基準
+        quiet = energy_db[~speech_frames]
+        if len(quiet):
+            level = float(np.mean(quiet))
+            self.noise_floor_db += self.noise_adapt * (level - self.noise_floor_db)
+
+        return bool(np.any(speech_frames))
+
+
+class WebRTCDetector(VoiceActivityDetector):
+    """WebRTC VAD（需要 pip install webrtcvad），aggressiveness 0-3"""
+
+    def __init__(self, rate=RATE, aggressiveness=2, frame_ms=30):
+        try:
+            import webrtcvad
+        except ImportError:
+            raise ImportError("WebRTC VAD 需要安裝 webrtcvad: pip install webrtcvad")
+        if rate not in (8000, 16000, 32000, 48000):
+            raise ValueError(f"WebRTC VAD 不支持 {rate} Hz 採樣率")
+        if frame_ms not in (10, 20, 30):
+            raise ValueError("WebRTC VAD 的幀長度必須是 10、20 或 30 ms")
+        self.rate = rate
+        self.frame_bytes = int(rate * frame_ms / 1000) * SAMPLE_WIDTH
+        self._vad = webrtcvad.Vad(aggressiveness)
+
+    def is_speech(self, pcm):
+        pcm = bytes(pcm)
+        for start in range(0, len(pcm) - self.frame_bytes + 1, self.frame_bytes):
+            if self._vad.is_speech(pcm[start:start + self.frame_bytes], self.rate):
+                return True
+        return False
+
+
+DETECTORS = {
+    "energy": EnergyZCRDetector,
+    "webrtc": WebRTCDetector,
+}
+
+
+def create_detector(name="energy", rate=RATE, **kwargs):
+    """依名稱建立檢測器"""
+    if name not in DETECTORS:
+        raise ValueError(f"未知的 VAD 檢測器: {name}（可用: {', '.join(DETECTORS)}）")
+    return DETECTORS[name](rate=rate, **kwargs)
+
+
+class VADGate:
+    """
+    VAD 閘門：包裝音頻塊生成器，只放行語音與其後的 hangover
+    - 靜音期間保留最近 pre_roll_ms 的音頻，語音開始時先補送
+    - 每 keepalive_ms 仍放行一塊音頻，避免串流因長時間沒有音頻被伺服器關閉
+    """
+
+    def __init__(self, detector=None, rate=RATE, hangover_ms=1000, pre_roll_ms=300, keepalive_ms=5000):
+        self.detector = detector or EnergyZCRDetector(rate=rate)
+        self.bytes_per_ms = rate * SAMPLE_WIDTH / 1000
+        self.hangover_bytes = hangover_ms * self.bytes_per_ms
+        self.pre_roll_bytes = pre_roll_ms * self.bytes_per_ms
+        self.keepalive_bytes = keepalive_ms * self.bytes_per_ms if keepalive_ms else None
+
+        self._pre_roll = deque()
+        self._pre_roll_size = 0
+        self._since_speech = float("inf")
+        self._since_sent = 0
+
+        self.total_bytes = 0
+        self.sent_bytes = 0
+        self.speech_onsets = 0
+
+    @property
+    def suppressed_fraction(self):
+        """被過濾掉的音頻比例"""
+        if not self.total_bytes:
+            return 0.0
+        return 1 - self.sent_bytes / self.total_bytes
+
+    def stats(self):
+        return {
+            "total_seconds": self.total_bytes / self.bytes_per_ms / 1000,
+            "sent_seconds": self.sent_bytes / self.bytes_per_ms / 1000,
+            "suppressed_fraction": self.suppressed_fraction,
+            "speech_onsets": self.speech_onsets,
+        }
+
+    def _remember(self, chunk):
+        """靜音期間保留最近的音頻作為 pre-roll（複製，因為來源可能是會被覆寫的 memoryview）"""
+        data = bytes(chunk)
+        self._pre_roll.append(data)
+        self._pre_roll_size += len(data)
+        while self._pre_roll and self._pre_roll_size - len(self._pre_roll[0]) >= self.pre_roll_bytes:
+            self._pre_roll_size -= len(self._pre_roll.popleft())
+
+    def process(self, chunk):
+        """處理一個音頻塊，回傳要上傳的音頻塊列表（可能為空）"""
+        size = len(chunk)
+        self.total_bytes += size
+
+        if self.detector.is_speech(chunk):
+            if self._since_speech > self.hangover_bytes:
+                self.speech_onsets += 1
+            self._since_speech = 0
+        else:
+            self._since_speech += size
+
+        if self._since_speech <= self.hangover_bytes:
+            output = list(self._pre_roll)
+            output.append(chunk)
+            self._pre_roll.clear()
+            self._pre_roll_size = 0
+        elif self.keepalive_bytes is not None and self._since_sent + size >= self.keepalive_bytes:
+            # 保活塊之前的 pre-roll 已經過時，清除以維持音頻順序
+            output = [chunk]
+            self._pre_roll.clear()
+            self._pre_roll_size = 0
+        else:
+            self._since_sent += size
+            self._remember(chunk)
+            return []
+
+        self._since_sent = 0
+        self.sent_bytes += sum(len(data) for data in output)
+        return output
+
+    def filter(self, chunks):
+        """音頻塊生成器包裝"""
+        for chunk in chunks:
+            yield from self.process(chunk)
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+自定義詞彙編譯器
+把 custom_vocabulary.json 編譯成識別請求用的詞彙適應配置：
+- 正規化（NFKC、合併空白）並以不分大小寫的方式去除重複，過長或空白的詞彙略過
+- 依最近轉錄結果中的命中次數排序，常出現的詞彙優先；沒有命中資料時依分類加權與原本順序
+- 依 API 配額切成多個 PhraseSet（每組詞數、總詞數、總字元數），超出配額的低排名詞彙捨棄並計數
+- 每個分類有各自的加權值（custom_vocabulary.json 的 "boosts" 可覆寫 CATEGORY_BOOSTS），
+  個別詞彙可在 "phrase_boosts" 中指定自己的加權
+- 編譯結果依詞彙檔、轉錄檔與參數的雜湊快取在 VOCABULARY_CACHE_FILE，啟動時不必重建
+
+    python vocabulary_compiler.py                              # 編譯並顯示摘要
+    python vocabulary_compiler.py --transcripts meeting.jsonl sqlite:transcripts.db --show
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+import unicodedata
+
+from capitalization import PhraseCorrector
+from custom_vocabulary import VOCABULARY_FILE
+from transcript_sink import read_records, sink_files
+
+VOCABULARY_CACHE_FILE = "custom_vocabulary.compiled.json"
+
+# Speech-to-Text V2 的詞彙適應配額（配額調整時修改這裡）
+MAX_PHRASES_PER_SET = 1000   # 每個 PhraseSet 的詞數
+MAX_PHRASE_SETS = 10         # 每個請求的 PhraseSet 數
+MAX_TOTAL_PHRASES = 5000     # 每個請求的總詞數
+MAX_TOTAL_CHARS = 100000     # 每個請求所有詞彙的總字元數
+MAX_PHRASE_CHARS = 100       # 單一詞彙的字元數
+MIN_BOOST, MAX_BOOST = 1.0, 20.0
+
+DEFAULT_BOOST = 10.0
+UNCATEGORIZED = "未分類"
+CATEGORY_BOOSTS = {
+    "技術": 10.0,
+    "商業": 8.0,
+    "Google Cloud": 12.0,
+    UNCATEGORIZED: DEFAULT_BOOST,
+}
+HIT_WINDOW_DAYS = 30  # 只統計最近多少天的轉錄結果
+
+
+def normalize_phrase(phrase):
+    """統一 Unicode 形式並合併空白（保留大小寫，作為送出的寫法）"""
+    phrase = unicodedata.normalize("NFKC", str(phrase))
+    return re.sub(r"\s+", " ", phrase).strip()
+
+
+def phrase_key(phrase):
+    """去重與命中統計用的鍵：不分大小寫、合併空白（與大小寫修正器相同）"""
+    return " ".join(phrase.lower().split())
+
+
+def collect_entries(vocab_data):
+    """
+    從詞彙資料取出 (詞彙, 分類) 列表，依不分大小寫的正規化鍵去除重複
+    只讀 "phrases" 與 "categories"，其他欄位（例如 last_updated）不是詞彙
+    """
+    category_of = {}
+    for category, phrases in (vocab_data.get("categories") or {}).items():
+        for phrase in phrases:
+            category_of.setdefault(phrase_key(normalize_phrase(phrase)), category)
+
+    entries = []
+    seen = set()
+    skipped = 0
+    candidates = list(vocab_data.get("phrases") or [])
+    for phrases in (vocab_data.get("categories") or {}).values():
+        candidates.extend(phrases)
+    for phrase in candidates:
+        phrase = normalize_phrase(phrase)
+        key = phrase_key(phrase)
+        if not key or len(phrase) > MAX_PHRASE_CHARS:
+            skipped += 1
+            continue
+        if key in seen:
+            continue
+        seen.add(key)
+        entries.append((phrase, category_of.get(key, UNCATEGORIZED)))
+    return entries, skipped
+
+
+def count_hits(phrases, transcripts, since=None):
+    """統計每個詞彙在已保存的最終結果中出現的次數（以正規化鍵計）"""
+    corrector = PhraseCorrector(phrases)
+    hits = {}
+    if corrector.pattern is None:
+        return hits
+    for spec in transcripts:
+        for record in read_records(spec, since=since):
+            for match in corrector.pattern.finditer(record.get("raw_text") or record.get("text") or ""):
+                key = phrase_key(match.group(0))
+                hits[key] = hits.get(key, 0) + 1
+    return hits
+
+
+class CompiledVocabulary:
+    """
+    編譯後的詞彙
+    phrase_sets 為 [[(詞彙, 加權), ...], ...]，terms 為去重後依排名排列的所有詞彙（大小寫修正器使用），
+    dropped 為超出配額而未送出的詞彙數
+    """
+
+    def __init__(self, phrase_sets, terms, dropped=0, skipped=0, hits=None, key="", cached=False):
+        self.phrase_sets = phrase_sets
+        self.terms = terms
+        self.dropped = dropped
+        self.skipped = skipped
+        self.hits = hits or {}
+        self.key = key
+        self.cached = cached
+
+    @property
+    def phrases(self):
+        return [phrase for phrase_set in self.phrase_sets for phrase, _ in phrase_set]
+
+    def __len__(self):
+        return sum(len(phrase_set) for phrase_set in self.phrase_sets)
+
+    def adaptation(self):
+        """建立 SpeechAdaptation（每組一個內嵌 PhraseSet）；沒有詞彙時回傳 None"""
+        if not self.phrase_sets:
+            return None
+        from google.cloud.speech_v2.types import cloud_speech
+
+        adaptation = cloud_speech.SpeechAdaptation()
+        for phrase_set in self.phrase_sets:
+            adaptation.phrase_sets.append(cloud_speech.SpeechAdaptation.AdaptationPhraseSet(
+                inline_phrase_set=cloud_speech.PhraseSet(
+                    phrases=[{"value": phrase, "boost": boost} for phrase, boost in phrase_set])
+            ))
+        return adaptation
+
+    def to_dict(self):
+        return {"key": self.key, "phrase_sets": self.phrase_sets, "terms": self.terms,
+                "dropped": self.dropped, "skipped": self.skipped, "hits": self.hits}
+
+    @classmethod
+    def from_dict(cls, data, cached=False):
+        phrase_sets = [[(phrase, boost) for phrase, boost in phrase_set] for phrase_set in data["phrase_sets"]]
+        return cls(phrase_sets, data["terms"], data.get("dropped", 0), data.get("skipped", 0),
+                   data.get("hits"), data.get("key", ""), cached)
+
+    def report(self):
+        line = f"{len(self)} 個詞彙分成 {len(self.phrase_sets)} 組 PhraseSet"
+        if self.hits:
+            line += f"，{len(self.hits)} 個在最近的轉錄中出現過"
+        if self.dropped:
+            line += f"，超出配額捨棄 {self.dropped} 個"
+        if self.skipped:
+            line += f"，略過 {self.skipped} 個空白或過長的詞彙"
+        return line + ("（快取）" if self.cached else "")
+
+
+def pack_phrase_sets(ranked, max_per_set=MAX_PHRASES_PER_SET, max_sets=MAX_PHRASE_SETS,
+                     max_phrases=MAX_TOTAL_PHRASES, max_chars=MAX_TOTAL_CHARS):
+    """依排名把 (詞彙, 加權) 裝進多個 PhraseSet，回傳 (phrase_sets, 捨棄數)"""
+    limit = min(max_phrases, max_per_set * max_sets)
+    phrase_sets = []
+    chars = 0
+    count = 0
+    for index, (phrase, boost) in enumerate(ranked):
+        if count >= limit or chars + len(phrase) > max_chars:
+            return phrase_sets, len(ranked) - index
+        if not phrase_sets or len(phrase_sets[-1]) >= max_per_set:
+            phrase_sets.append([])
+        phrase_sets[-1].append((phrase, boost))
+        chars += len(phrase)
+        count += 1
+    return phrase_sets, 0
+
+
+def _cache_key(vocab_data, transcripts, since_days, boosts):
+    """詞彙內容、轉錄檔（路徑、大小、修改時間）與參數的雜湊；任一改變都需要重建"""
+    files = []
+    for spec in transcripts:
+        for path in sink_files(spec):
+            stat = os.stat(path)
+            files.append((path, stat.st_size, stat.st_mtime_ns))
+    content = {
+        "phrases": vocab_data.get("phrases"), "categories": vocab_data.get("categories"),
+        "phrase_boosts": vocab_data.get("phrase_boosts"), "files": files, "since_days": since_days, "boosts": boosts,
+        "limits": [MAX_PHRASES_PER_SET, MAX_PHRASE_SETS, MAX_TOTAL_PHRASES, MAX_TOTAL_CHARS, MAX_PHRASE_CHARS],
+    }
+    return hashlib.sha1(json.dumps(content, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def compile_vocabulary(path=VOCABULARY_FILE, transcripts=(), cache_path=VOCABULARY_CACHE_FILE,
+                       since_days=HIT_WINDOW_DAYS, rebuild=False):
+    """
+    編譯詞彙；transcripts 為 transcript_sink 的輸出描述（用於統計命中次數）
+    cache_path 為 None 時不使用快取；詞彙檔不存在時回傳空的結果
+    """
+    vocab_data = {}
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            vocab_data = json.load(f)
+    boosts = dict(CATEGORY_BOOSTS)
+    boosts.update(vocab_data.get("boosts") or {})
+
+    key = _cache_key(vocab_data, transcripts, since_days, boosts)
+    if cache_path and not rebuild and os.path.exists(cache_path):
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached.get("key") == key:
+                return CompiledVocabulary.from_dict(cached, cached=True)
+        except (ValueError, KeyError, TypeError):
+            pass
+
+    entries, skipped = collect_entries(vocab_data)
+    since = time.time() - since_days * 86400 if since_days else None
+    hits = count_hits([phrase for phrase, _ in entries], transcripts, since) if transcripts else {}
+
+    phrase_boosts = {phrase_key(normalize_phrase(phrase)): boost
+                     for phrase, boost in (vocab_data.get("phrase_boosts") or {}).items()}
+
+    def boost_of(entry):
+        phrase, category = entry
+        boost = phrase_boosts.get(phrase_key(phrase))
+        if boost is None:
+            boost = boosts.get(category, DEFAULT_BOOST)
+        return min(MAX_BOOST, max(MIN_BOOST, float(boost)))
+
+    # 命中次數多的優先，其次是加權高的詞彙，最後維持原本順序（sorted 為穩定排序）
+    ranked = sorted(entries, key=lambda entry: (-hits.get(phrase_key(entry[0]), 0), -boost_of(entry)))
+    phrase_sets, dropped = pack_phrase_sets([(entry[0], boost_of(entry)) for entry in ranked])
+    compiled = CompiledVocabulary(phrase_sets, [phrase for phrase, _ in ranked], dropped, skipped, hits, key)
+
+    if cache_path:
+        # 先寫入暫存檔再改名，中斷時不會留下半個快取
+        temporary = cache_path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(compiled.to_dict(), f, ensure_ascii=False)
+        os.replace(temporary, cache_path)
+    return compiled
+
+
+def main():
+    parser = argparse.ArgumentParser(description="編譯自定義詞彙為識別用的 PhraseSet")
+    parser.add_argument("--vocabulary", default=VOCABULARY_FILE, help="詞彙檔")
+    parser.add_argument("--transcripts", nargs="*", default=[], metavar="[類型:]路徑",
+                        help="用於統計命中次數的轉錄輸出（與 --transcript 相同格式）")
+    parser.add_argument("--days", type=float, default=HIT_WINDOW_DAYS, help="只統計最近幾天的結果（0 表示全部）")
+    parser.add_argument("--rebuild", action="store_true", help="忽略快取重新編譯")
+    parser.add_argument("--show", action="store_true", help="列出每組的詞彙與加權")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    compiled = compile_vocabulary(args.vocabulary, args.transcripts, since_days=args.days, rebuild=args.rebuild)
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f"📚 {compiled.report()}，耗時 {elapsed:.1f} ms")
+    if args.show:
+        for index, phrase_set in enumerate(compiled.phrase_sets, 1):
+            print(f"📁 PhraseSet #{index}（{len(phrase_set)} 個）")
+            for phrase, boost in phrase_set:
+                hits = compiled.hits.get(phrase_key(phrase), 0)
+                print(f"   • {phrase}  (boost {boost:g}{f'，命中 {hits} 次' if hits else ''})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+共用詞彙庫與熱更新
+行程內只解析、編譯一次 custom_vocabulary.json，之後監看檔案變化：
+- 監看器可替換：Linux 使用 inotify（以 ctypes 呼叫 libc，不需額外套件），其他平台輪詢修改時間
+- 監看檔案所在的目錄，編輯器以「寫入暫存檔再改名」保存時也能察覺
+- 變化後稍等 DEBOUNCE_SECONDS 合併連續寫入，在背景執行緒重新編譯；內容雜湊沒變時不更新
+- 新的編譯結果與詞彙修正器（大小寫修正，開啟時加上模糊修正）包成一個快照，以單一屬性指派換上，讀取端永遠看到一致的一組
+- 檔案寫到一半（JSON 不完整）時保留舊版本，等下一次變化
+- subscribe() 註冊的回調在背景執行緒收到新快照，例如換上下一個會話使用的詞彙適應配置；
+  進行中的串流與響應迴圈都不中斷
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+from capitalization import PhraseCorrector
+from custom_vocabulary import VOCABULARY_FILE
+from term_correction import TermCorrector
+from vocabulary_compiler import CompiledVocabulary, compile_vocabulary
+
+POLL_INTERVAL_SECONDS = 1.0  # 輪詢監看器檢查修改時間的間隔
+DEBOUNCE_SECONDS = 0.2       # 察覺變化後等待連續寫入結束的時間
+WATCHER = "auto"             # auto（Linux 用 inotify，否則輪詢）/ inotify / poll
+FUZZY_CORRECTION = False     # 最終結果先模糊修正識別錯誤的詞彙（"hon high" → "Hon Hai"），再修正大小寫；
+                             # 預設關閉，開啟前先用 benchmark_term_correction.py 檢查自己詞彙的誤修正
+
+
+class VocabularySnapshot:
+    """某一版詞彙：編譯結果與詞彙修正器（建立後不再修改，可在執行緒間共用）"""
+
+    def __init__(self, vocabulary, version=1, fuzzy=FUZZY_CORRECTION):
+        self.vocabulary = vocabulary
+        self.corrector = TermCorrector(vocabulary.terms) if fuzzy else PhraseCorrector(vocabulary.terms)
+        self.version = version
+        self.loaded_at = time.time()
+
+
+class FileWatcher:
+    """監看器介面：wait() 在檔案可能改變時回傳 True，逾時回傳 False"""
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+
+    def wait(self, timeout):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class PollingWatcher(FileWatcher):
+    """比較修改時間、大小與 inode（改名替換時 inode 會變）"""
+
+    def __init__(self, path, interval=POLL_INTERVAL_SECONDS):
+        super().__init__(path)
+        self.interval = interval
+        self._signature = self._stat()
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def wait(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            signature = self._stat()
+            if signature != self._signature:
+                self._signature = signature
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(self.interval, remaining))
+
+
+class InotifyWatcher(FileWatcher):
+    """Linux inotify：監看所在目錄，只回報與目標檔名相同的事件"""
+
+    IN_MODIFY = 0x002
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+    def __init__(self, path):
+        super().__init__(path)
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify 只支援 Linux")
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失敗")
+        directory = os.path.dirname(self.path).encode()
+        mask = (self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_FROM | self.IN_MOVED_TO
+                | self.IN_CREATE | self.IN_DELETE)
+        if libc.inotify_add_watch(self._fd, directory, mask) < 0:
+            error = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(error, f"無法監看 {directory.decode()}")
+        self._name = os.path.basename(self.path).encode()
+
+    def wait(self, timeout):
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return False
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return False
+        offset = 0
+        changed = False
+        while offset + self.EVENT_HEADER.size <= len(data):
+            _, _, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if name == self._name:
+                changed = True
+        return changed
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+WATCHERS = {
+    "inotify": InotifyWatcher,
+    "poll": PollingWatcher,
+}
+
+
+def create_watcher(name, path, **kwargs):
+    """依名稱建立監看器；auto 時優先使用 inotify，無法使用時改為輪詢"""
+    if name == "auto":
+        try:
+            return InotifyWatcher(path)
+        except (OSError, AttributeError):
+            return PollingWatcher(path, **kwargs)
+    if name not in WATCHERS:
+        raise ValueError(f"未知的監看器: {name}（可用: auto, {', '.join(WATCHERS)}）")
+    return WATCHERS[name](path, **kwargs)
+
+
+class VocabularyStore:
+    """
+    共用詞彙庫
+    current 為目前的 VocabularySnapshot；vocabulary / corrector 為其捷徑
+    start() 後在背景監看詞彙檔，變化時重新編譯並換上新快照
+    """
+
+    def __init__(self, path=VOCABULARY_FILE, transcripts=(), watcher=WATCHER, debounce=DEBOUNCE_SECONDS):
+        self.path = path
+        self.transcripts = tuple(transcripts)
+        self.watcher_name = watcher
+        self.debounce = debounce
+        self.reloads = 0
+        self.errors = 0
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+        self._thread = None
+        self.current = VocabularySnapshot(self._compile(initial=True))
+
+    @property
+    def vocabulary(self):
+        return self.current.vocabulary
+
+    @property
+    def corrector(self):
+        return self.current.corrector
+
+    def _compile(self, initial=False):
+        try:
+            return compile_vocabulary(self.path, self.transcripts)
+        except Exception as e:
+            self.errors += 1
+            if initial:
+                print(f"⚠️ 載入詞彙時出錯: {e}")
+                return CompiledVocabulary([], [])
+            raise
+
+    def subscribe(self, callback):
+        """註冊詞彙更新回調 callback(snapshot)（在監看執行緒中呼叫）"""
+        with self._lock:
+            self._listeners.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def reload(self):
+        """重新編譯；內容改變時換上新快照並通知訂閱者，回傳是否更新"""
+        try:
+            vocabulary = self._compile()
+        except Exception as e:
+            # 常見於檔案寫到一半：保留舊版本，等下一次變化
+            print(f"⚠️ 詞彙檔更新失敗，繼續使用目前的詞彙: {e}")
+            return False
+        if vocabulary.key == self.current.vocabulary.key:
+            return False
+        snapshot = VocabularySnapshot(vocabulary, self.current.version + 1)
+        self.current = snapshot
+        self.reloads += 1
+        with self._lock:
+            listeners = list(self._listeners)
+        for callback in listeners:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                print(f"⚠️ 詞彙更新回調出錯: {e}")
+        return True
+
+    def start(self):
+        """在背景監看詞彙檔（重複呼叫無作用）"""
+        with self._lock:
+            if self._thread is not None:
+                return self
+            self._watcher = create_watcher(self.watcher_name, self.path)
+
+            def run():
+                while not self._stop.is_set():
+                    if not self._watcher.wait(0.5):
+                        continue
+                    # 合併連續寫入（例如先清空再寫入、或多次 write）
+                    while self._watcher.wait(self.debounce):
+                        pass
+                    if not self._stop.is_set():
+                        self.reload()
+
+            self._thread = threading.Thread(target=run, name="vocabulary-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        if self._watcher is not None:
+            self._watcher.close()
+
+    def report(self):
+        watcher = type(self._watcher).__name__ if self._watcher else "未監看"
+        return f"詞彙第 {self.current.version} 版（{self.vocabulary.report()}），{watcher}，重新載入 {self.reloads} 次"
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_vocabulary_store(path=VOCABULARY_FILE, transcripts=(), watch=True):
+    """取得行程內共用的詞彙庫（相同詞彙檔與轉錄來源只建立一個），watch 時開始監看"""
+    key = (os.path.abspath(path), tuple(transcripts))
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = VocabularyStore(path, transcripts)
+    if watch:
+        store.start()
+    return store